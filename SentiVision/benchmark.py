@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the SentiCare monitor
+
+Replays a recording (video file, .npz training clips, or an image sequence;
+see frame_sources.py) through the same components Monitor runs:
+
+    Webcam -> MonitoringPipeline (motion gate, preprocess, inference,
+    temporal filter) -> ActivityStateMachine -> FirebaseClient
+
+Firestore is replaced by a LocalFirestore with a simulated round-trip
+latency, so no credentials or network are needed and the numbers do not
+depend on the network. Everything else comes from config.json, so a
+benchmark measures the configuration that is deployed.
+
+Reported per run:
+- latency percentiles (p50/p95/p99) per stage: decode (reading a frame from
+  the source), store (copying or letterboxing it into the ring buffer),
+  motion_gate, preprocess, inference (model and temporal filter), publish
+  (state machine), firestore (write queued -> committed) and end_to_end
+  (clip captured -> prediction published)
+- frames/s captured, clips/s preprocessed, inferences/s and predictions/s
+- CPU% of the process (and of the inference worker process, in process
+  mode) over the run (100% = one core) and peak RSS (likewise including the
+  worker's)
+
+Usage:
+    python benchmark.py --source recordings/ward.mp4
+    python benchmark.py --source data/clips/ --output results/baseline.json
+    python benchmark.py --source data/clips/ --set inference_backend=onnx --baseline results/baseline.json
+    python benchmark.py --source data/clips/ --compare-inference-modes
+
+--output writes the results as JSON for regression tracking; --baseline
+compares the run with an earlier JSON result. --compare-inference-modes runs
+the recording with inference_mode "thread" and then "process", each in a
+fresh Python process so the peak RSS of one run does not carry over into the
+other, and compares the two; run it on the target hardware, since the gain
+from a separate inference process depends on the cores available.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+import numpy as np
+from camera import Webcam
+from firebase_client import FirebaseClient
+from local_firestore import LocalFirestore
+from monitoring import Monitor
+from logging_setup import configure_logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def summarize(samples):
+    """Count, mean and p50/p95/p99/max of latency samples in seconds, reported in milliseconds"""
+    if not samples:
+        return {'count': 0}
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(values.max())
+    }
+
+
+class StageTimer:
+    """Thread-safe collection of latency samples per stage"""
+
+    def __init__(self):
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """Add one sample"""
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def wrap(self, stage, func):
+        """Return func timed as one sample of stage per call"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        """Latency summary per stage"""
+        with self._lock:
+            return {stage: summarize(samples) for stage, samples in self._samples.items()}
+
+
+def peak_rss_mb(worker_pid=None):
+    """Peak resident set size in MB of this process, plus a running worker process's (Linux only), or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    megabytes = peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+    if worker_pid is not None:
+        try:
+            with open(f'/proc/{worker_pid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        # The worker's high-water mark, in kilobytes
+                        megabytes += int(line.split()[1]) / 1024.0
+                        break
+        except (OSError, IndexError, ValueError):
+            pass
+    return megabytes
+
+
+def _cpu_seconds(worker_pid=None):
+    """User + system CPU time of this process, plus a running worker process's (Linux only)"""
+    times = os.times()
+    seconds = times.user + times.system
+    if worker_pid is not None:
+        try:
+            with open(f'/proc/{worker_pid}/stat', 'r') as f:
+                # Fields after the parenthesized command name; utime and stime are the 12th and 13th
+                fields = f.read().rsplit(')', 1)[1].split()
+            seconds += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except (OSError, IndexError, ValueError):
+            pass
+    return seconds
+
+
+def _parse_override(text):
+    """KEY=VALUE with VALUE parsed as JSON where possible (e.g. clip_stride=1, motion_gate=false)"""
+    key, separator, value = text.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got: {text}")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+def _time_firestore_writes(firebase_client, timer):
+    """Time every Firestore write from being queued (or started) until it is committed"""
+    writer = firebase_client.writer
+    if writer is None:
+        # Synchronous writes: the call itself is the round-trip
+        for method in ('write_event', 'write_alert', '_write_patient_status'):
+            setattr(firebase_client, method, timer.wrap('firestore', getattr(firebase_client, method)))
+        return
+
+    submit = writer.submit
+    in_flight = set()  # The writer only keeps weak references to its futures
+    lock = threading.Lock()
+
+    def timed_submit(operation, priority=False):
+        start = time.perf_counter()
+        future = submit(operation, priority)
+        with lock:
+            in_flight.add(future)
+
+        def done(completed):
+            timer.record('firestore', time.perf_counter() - start)
+            with lock:
+                in_flight.discard(completed)
+
+        future.add_done_callback(done)
+        return future
+
+    writer.submit = timed_submit
+
+
+def _instrument(webcam, pipeline, firebase_client, timer):
+    """Wrap the components' stage entry points with timers"""
+    source = webcam.source
+    source._read_frame = timer.wrap('decode', source._read_frame)
+    webcam._store_frame = timer.wrap('store', webcam._store_frame)
+
+    if pipeline.motion_gate is not None:
+        pipeline.motion_gate.should_infer = timer.wrap('motion_gate', pipeline.motion_gate.should_infer)
+    for stage in pipeline.stages:
+        stage.handler = timer.wrap(stage.role, stage.handler)
+
+    on_prediction = pipeline.on_prediction
+
+    def record_prediction(prediction, processing_time):
+        timer.record('end_to_end', processing_time)
+        if on_prediction:
+            on_prediction(prediction, processing_time)
+
+    pipeline.on_prediction = record_prediction
+    _time_firestore_writes(firebase_client, timer)
+
+
+def _wait_for_pipeline(pipeline, timeout=10.0):
+    """Wait until every queued clip has gone through the pipeline"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        depths = pipeline.get_status()['queue_depths']
+        if not any(depths.values()):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run_benchmark(source, config_path="config.json", pace='realtime', loop=False, duration=None,
+                  firestore_latency=0.05, overrides=None):
+    """
+    Replay a recording through the monitor and collect latency, throughput and resource figures
+
+    Args:
+        source: Video file, .npz clip, directory of .npz clips, or image directory
+        config_path: config.json the monitor is configured from
+        pace: 'realtime' (replay at the recording's frame rate) or 'fast'
+        loop: Replay the recording until duration is up
+        duration: Stop after this many seconds (default: at the end of the recording)
+        firestore_latency: Simulated Firestore round-trip in seconds
+        overrides: Dict of config keys to override for this run
+
+    Returns:
+        Results dict (see print_report)
+    """
+    if loop and duration is None:
+        raise ValueError("A looping replay needs a duration")
+
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    config.update(overrides or {})
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Keep the durable write-ahead log (and its fsync cost) but away from the real one
+        if config.get('write_ahead_log_path'):
+            config['write_ahead_log_path'] = os.path.join(work_dir, 'benchmark_wal.sqlite3')
+        run_config_path = os.path.join(work_dir, 'config.json')
+        with open(run_config_path, 'w') as f:
+            json.dump(config, f)
+
+        db = LocalFirestore(latency=firestore_latency)
+        firebase_client = FirebaseClient(run_config_path, db=db)
+        monitor = Monitor(run_config_path, firebase_client=firebase_client)
+
+        capture = dict(config.get('capture') or {}, source=source, pace=pace, loop=loop)
+        webcam = Webcam(stride=config.get('clip_stride', 1), capture=capture,
+                        capture_interval=config.get('capture_interval'))
+        pipeline = monitor.create_pipeline(webcam)
+        _instrument(webcam, pipeline, firebase_client, timer)
+
+        print(f"Benchmarking {source} ({pace} replay)...")
+        worker_pid = monitor.inference_process.get_stats()['pid'] if monitor.inference_process else None
+        cpu_start = _cpu_seconds(worker_pid)
+        start = time.perf_counter()
+        started_at = datetime.now(timezone.utc)
+        webcam.start_capture()
+        pipeline.start()
+        try:
+            while not webcam.is_finished():
+                if duration is not None and time.perf_counter() - start >= duration:
+                    break
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - start
+            _wait_for_pipeline(pipeline)
+        finally:
+            pipeline.stop()
+            webcam.release_camera()
+        cpu_seconds = _cpu_seconds(worker_pid) - cpu_start
+        # Before the worker exits; a restarted worker has a new PID
+        peak_rss = peak_rss_mb(
+            monitor.inference_process.get_stats()['pid'] if monitor.inference_process else None
+        )
+
+        # Let every emitted write reach the (local) Firestore so its latency is counted
+        monitor.state_machine.shutdown()
+        monitor.close_inference()
+        writer = firebase_client.writer
+        committed_operations = writer.committed_operations if writer else None
+        committed_batches = writer.committed_batches if writer else None
+        firebase_client.close()
+
+    stages = {stage.role: stage.processed_count for stage in pipeline.stages}
+    frames = webcam.source.frames_read
+    pipeline_status = pipeline.get_status()
+    model_interface = monitor.model_interface
+    cache_lookups = model_interface.frame_cache_hits + model_interface.frame_cache_misses
+
+    return {
+        'benchmark': {
+            'source': source,
+            'pace': pace,
+            'started_at': started_at.isoformat(),
+            'duration_s': elapsed,
+            'firestore_latency_s': firestore_latency,
+            'config': {
+                key: config.get(key) for key in (
+                    'inference_backend', 'inference_mode', 'inference_threads', 'compile_inference', 'xla_jit',
+                    'clip_stride', 'capture', 'processing_interval', 'motion_gate',
+                    'temporal_filter', 'async_writes', 'coalesce_status_updates'
+                )
+            },
+            'overrides': overrides or {},
+            'platform': {
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'system': platform.system(),
+                'cpu_count': os.cpu_count()
+            }
+        },
+        'throughput': {
+            'frames': frames,
+            'frames_per_s': frames / elapsed,
+            'clips_per_s': stages['preprocess'] / elapsed,
+            'inferences_per_s': stages['inference'] / elapsed,
+            'predictions_per_s': stages['publish'] / elapsed
+        },
+        'latency_ms': timer.summary(),
+        'pipeline': {
+            'processed': stages,
+            'dropped': pipeline_status['dropped'],
+            'motion_gate': pipeline_status['motion_gate'],
+            'frame_cache_hit_rate': model_interface.frame_cache_hits / cache_lookups if cache_lookups else None
+        },
+        'firestore': {
+            'committed_operations': committed_operations,
+            'committed_batches': committed_batches,
+            'round_trips': db.round_trips,
+            'documents_written': db.written_documents
+        },
+        'resources': {
+            'cpu_percent': 100.0 * cpu_seconds / elapsed,
+            'peak_rss_mb': peak_rss
+        }
+    }
+
+
+def _run_in_subprocess(args, **overrides):
+    """Run the benchmark in a fresh Python process and return its results"""
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        '--source', args.source,
+        '--config', args.config,
+        '--pace', args.pace,
+        '--firestore-latency', str(args.firestore_latency)
+    ]
+    if args.duration is not None:
+        command += ['--duration', str(args.duration)]
+    if args.loop:
+        command.append('--loop')
+    if args.verbose:
+        command.append('--verbose')
+    for key, value in list(args.overrides) + list(overrides.items()):
+        command += ['--set', f'{key}={json.dumps(value)}']
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        output = os.path.join(work_dir, 'results.json')
+        subprocess.run(command + ['--output', output], check=True)
+        with open(output, 'r') as f:
+            return json.load(f)
+
+
+def compare_results(results, baseline):
+    """Lines comparing throughput and p95 latencies with a baseline result"""
+    def change(current, previous):
+        if not previous:
+            return "n/a"
+        return f"{100.0 * (current - previous) / previous:+.1f}%"
+
+    lines = []
+    for key in ('frames_per_s', 'inferences_per_s', 'predictions_per_s'):
+        current = results['throughput'][key]
+        previous = baseline.get('throughput', {}).get(key)
+        lines.append(f"{key:<20} {current:10.2f}  vs {previous if previous is not None else 'n/a':>10}  "
+                     f"({change(current, previous)})")
+
+    for stage, stats in results['latency_ms'].items():
+        previous = baseline.get('latency_ms', {}).get(stage, {}).get('p95_ms')
+        if 'p95_ms' in stats and previous is not None:
+            lines.append(f"{stage + ' p95 (ms)':<20} {stats['p95_ms']:10.2f}  vs {previous:10.2f}  "
+                         f"({change(stats['p95_ms'], previous)})")
+    return lines
+
+
+def print_report(results):
+    """Human-readable summary of a results dict"""
+    throughput = results['throughput']
+    resources = results['resources']
+    print("\n" + "=" * 72)
+    print(f"Benchmark: {results['benchmark']['source']} ({results['benchmark']['duration_s']:.1f}s)")
+    print("=" * 72)
+    print(f"{'stage':<14}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for stage, stats in results['latency_ms'].items():
+        if not stats['count']:
+            continue
+        print(f"{stage:<14}{stats['count']:>8}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+    print("-" * 72)
+    print(f"Frames/s: {throughput['frames_per_s']:.1f}   Clips/s: {throughput['clips_per_s']:.2f}   "
+          f"Inferences/s: {throughput['inferences_per_s']:.2f}   "
+          f"Predictions/s: {throughput['predictions_per_s']:.2f}")
+    peak_rss = resources['peak_rss_mb']
+    print(f"CPU: {resources['cpu_percent']:.0f}%   "
+          f"Peak RSS: {f'{peak_rss:.0f} MB' if peak_rss is not None else 'n/a'}   "
+          f"Dropped: {results['pipeline']['dropped']}")
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='SentiCare end-to-end pipeline benchmark')
+    parser.add_argument('--source', required=True,
+                        help='Video file, .npz clip, directory of .npz clips, or image directory')
+    parser.add_argument('--config', default='config.json', help='Configuration file (default: config.json)')
+    parser.add_argument('--pace', choices=('realtime', 'fast'), default='realtime',
+                        help="Replay at the recording's frame rate or as fast as frames are consumed")
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+    parser.add_argument('--loop', action='store_true', help='Replay the recording until --duration is up')
+    parser.add_argument('--firestore-latency', type=float, default=0.05,
+                        help='Simulated Firestore round-trip in seconds (default: 0.05)')
+    parser.add_argument('--set', dest='overrides', action='append', type=_parse_override, default=[],
+                        metavar='KEY=VALUE', help='Override a config.json key for this run (repeatable)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare with an earlier JSON result')
+    parser.add_argument('--compare-inference-modes', action='store_true',
+                        help='Run once with inference in a thread and once in a worker process, and compare')
+    parser.add_argument('--verbose', action='store_true', help='Log every prediction and Firestore commit')
+    args = parser.parse_args()
+    configure_logging(logging.DEBUG if args.verbose else logging.INFO)
+
+    if args.loop and args.duration is None:
+        parser.error("--loop needs --duration")
+
+    if args.compare_inference_modes:
+        # Each child prints its own report
+        thread_results = _run_in_subprocess(args, inference_mode='thread')
+        results = _run_in_subprocess(args, inference_mode='process')
+        print(f"\nProcess mode compared with thread mode ({os.cpu_count()} CPUs):")
+        for line in compare_results(results, thread_results):
+            print(line)
+        results = {'thread': thread_results, 'process': results}
+    else:
+        results = run_benchmark(
+            args.source,
+            config_path=args.config,
+            pace=args.pace,
+            loop=args.loop,
+            duration=args.duration,
+            firestore_latency=args.firestore_latency,
+            overrides=dict(args.overrides)
+        )
+        print_report(results)
+
+    if args.baseline and not args.compare_inference_modes:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline}:")
+        for line in compare_results(results, baseline):
+            print(line)
+
+    if args.output:
+        output_dir = os.path.dirname(os.path.abspath(args.output))
+        os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,91 @@
-from collections import deque
+import logging
 import cv2
 import threading
 import time
 import numpy as np
+from model_interface import letterbox_geometry
+from frame_sources import DEFAULT_CAPTURE_SETTINGS, create_frame_source
+from frame_bus import FrameBus
+from metrics import default_registry
+
+
+logger = logging.getLogger(__name__)
 
 
 class Webcam:
-    def __init__(self, clip_length=20, show_preview=True):
-        self.cap = cv2.VideoCapture(0)
+    def __init__(self, clip_length=20, stride=1, capture=None, source=None,
+                 capture_interval=None, metrics=None, room_id=None):
+        """
+        The capture thread only reads and stores frames; a preview window is a
+        separate consumer (see preview.py).
+
+        Args:
+            clip_length: Number of frames per clip handed out
+            stride: Hand out every stride-th frame, so a clip spans
+                clip_length * stride captured frames (matching the temporal
+                coverage the model was trained on)
+            capture: Capture settings overriding DEFAULT_CAPTURE_SETTINGS
+                (the 'capture' section of config.json)
+            source: FrameSource to read from instead of the one the capture
+                settings describe (see frame_sources.py)
+            capture_interval: Seconds to sleep after each frame (default: the
+                source's default_capture_interval)
+            metrics: MetricsRegistry for the capture interval and frame counts
+                (default: the shared registry)
+            room_id: Room the camera watches, added as a 'room' label to its
+                metrics when several cameras run in one process
+        """
+        self.capture_settings = dict(DEFAULT_CAPTURE_SETTINGS, **(capture or {}))
+        resize_to = self.capture_settings['resize_to']
+        self.resize_to = tuple(resize_to) if resize_to else None
+
+        if source is None:
+            try:
+                source = create_frame_source(self.capture_settings)
+            except RuntimeError as e:
+                logger.error("Cannot open webcam: %s", e)
+                raise RuntimeError("Failed to open webcam")
+        self.source = source
+        self.capture_interval = (
+            source.default_capture_interval if capture_interval is None else capture_interval
+        )
+
         self.clip_length = clip_length
-        self.videoBuffer = deque(maxlen=clip_length)
+        self.stride = stride
+        self.capacity = clip_length * stride  # Captured frames kept in the ring
         self.videoReady = False
-        self.show_preview = show_preview
+
+        # Preallocated ring buffer of shape (capacity, H, W, 3), allocated
+        # on the first frame once the real capture size is known
+        self._ring = None
+        self._write_index = 0  # Slot the next frame is written to
+        self._frame_count = 0  # Number of valid frames in the ring
+        self._generation = 0  # Incremented on every stored frame
+        self._sequence_ring = np.zeros(self.capacity, dtype=np.int64)  # Sequence ID per slot
+        self._read_frame = None  # Reused target for source.read()
+        self._input_shape = None  # Shape of the captured frames the ring was allocated for
+        self._letterbox = None  # (resized size, top, left) for resize_to
+        self._snapshot = None  # Cached read-only clip for self._snapshot_generation
+        self._snapshot_sequence_ids = None
+        self._snapshot_generation = -1
+
+        # Shared-memory bus other processes read the stored frames from (see frame_bus.py)
+        self.frame_bus = None
+        self._frame_bus_name = self.capture_settings['frame_bus']
+
+        self.room_id = room_id
+        labels = {'room': room_id} if room_id else None
+        metrics = metrics or default_registry()
+        self._capture_interval_histogram = metrics.histogram(
+            'senticare_capture_interval_seconds', 'Time between consecutive captured frames', labels)
+        self._frames_counter = metrics.counter('senticare_frames_captured', 'Frames captured', labels)
+        self._capture_errors = metrics.counter('senticare_capture_errors', 'Failed frame reads', labels)
 
         # Thread safety
         self._lock = threading.RLock()  # Reentrant lock
         self._capture_thread = None
         self._running = False
 
-        if not self.cap.isOpened():
-            print("Cannot open webcam")
-            raise RuntimeError("Failed to open webcam")
-        
-        # Set camera properties for better quality
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        self.cap.set(cv2.CAP_PROP_FPS, 20)
-
     def start_capture(self):
         """Start continuous frame capture in background thread"""
         with self._lock:
@@ -47,53 +106,181 @@ class Webcam:
 
     def _capture_loop(self):
         """Internal method - runs in background thread"""
+        last_frame_time = None
         while self._running:
-            ret, frame = self.cap.read()
+            ret, frame = self.source.read(self._read_frame)
 
             if not ret:
-                print("[ERROR] Failed to grab frame.")
+                if self.source.finished:
+                    logger.info("Frame source finished")
+                    break
+                self._capture_errors.inc()
+                logger.error("Failed to grab frame")
                 time.sleep(0.1)  # Brief pause before retry
                 continue
 
-            with self._lock:
-                self.videoBuffer.append(frame.copy())  # Copy frame to avoid reference issues
-                if len(self.videoBuffer) == self.videoBuffer.maxlen:
-                    self.videoReady = True
+            self._read_frame = frame
+            self._store_frame(frame)
 
-            # Show preview window if enabled
-            if self.show_preview:
-                self._show_preview_frame(frame)
+            now = time.perf_counter()
+            if last_frame_time is not None:
+                self._capture_interval_histogram.observe(now - last_frame_time)
+            last_frame_time = now
+            self._frames_counter.inc()
 
-            time.sleep(0.05)  # ~20 FPS
+            if self.capture_interval:
+                time.sleep(self.capture_interval)
 
     def capture_frame(self):
         """Manual frame capture (thread-safe)"""
-        ret, frame = self.cap.read()
+        ret, frame = self.source.read()
 
         if not ret:
-            print("[ERROR] Failed to grab frame.")
+            logger.error("Failed to grab frame")
             return False
 
+        self._store_frame(frame)
+        return True
+
+    def _store_frame(self, frame):
+        """Copy (or letterbox-resize) a frame into the next ring buffer slot (thread-safe)"""
         with self._lock:
-            self.videoBuffer.append(frame.copy())
-            if len(self.videoBuffer) == self.videoBuffer.maxlen:
+            if self._ring is None or self._input_shape != frame.shape:
+                # First frame, or the capture size changed: (re)allocate.
+                # Zeros, so letterbox padding stays black
+                slot_shape = frame.shape if self.resize_to is None else self.resize_to + frame.shape[2:]
+                self._ring = np.zeros((self.capacity,) + slot_shape, dtype=np.uint8)
+                self._input_shape = frame.shape
+                self._letterbox = None
+                self._write_index = 0
+                self._frame_count = 0
+                self.videoReady = False
+
+            # Every stored frame gets a monotonically increasing sequence ID
+            self._generation += 1
+            if self.resize_to is None:
+                np.copyto(self._ring[self._write_index], frame)
+            else:
+                self._resize_into_slot(frame, self._ring[self._write_index])
+            self._sequence_ring[self._write_index] = self._generation
+            self._write_index = (self._write_index + 1) % self.capacity
+            self._frame_count = min(self._frame_count + 1, self.capacity)
+
+            if self._frame_count == self.capacity:
                 self.videoReady = True
 
-        return True
+            stored = self._ring[(self._write_index - 1) % self.capacity]
+
+        # Only the capture thread writes the slot, so it can be published outside the lock
+        if self._frame_bus_name:
+            self._publish_frame(stored)
+
+    def _publish_frame(self, frame):
+        """Publish a stored frame to the frame bus, creating the bus on the first frame"""
+        if self.frame_bus is not None and self.frame_bus.frame_shape != frame.shape:
+            self.frame_bus.close()  # Capture size changed; readers re-attach to the new bus
+            self.frame_bus = None
+        if self.frame_bus is None:
+            try:
+                self.frame_bus = FrameBus.create(self._frame_bus_name, frame.shape,
+                                                 capacity=self.capture_settings['frame_bus_capacity'],
+                                                 force=self.capture_settings['frame_bus_force'])
+            except FileExistsError as e:
+                logger.error("Not publishing frames: %s", e)
+                self._frame_bus_name = None
+                return
+        self.frame_bus.publish(frame)
 
-    def get_frame(self):
-        """Get the latest frame (thread-safe)"""
+    def _resize_into_slot(self, frame, slot):
+        """Letterbox a frame straight into a ring slot, as ModelInterface.preprocess_clip would"""
+        if self._letterbox is None:
+            target_height, target_width = self.resize_to
+            resized_height, resized_width, top, left = letterbox_geometry(
+                frame.shape[0], frame.shape[1], target_height, target_width
+            )
+            self._letterbox = ((resized_width, resized_height), top, left)
+
+        size, top, left = self._letterbox
+        cv2.resize(frame, size, dst=slot[top:top + size[1], left:left + size[0]],
+                   interpolation=cv2.INTER_LINEAR)
+
+    def get_frame(self, out=None):
+        """
+        Get a copy of the latest frame (thread-safe)
+
+        Args:
+            out: Array to copy the frame into if its shape matches (e.g. a
+                display buffer reused for every frame)
+        """
         with self._lock:
-            if self.videoBuffer:
-                return self.videoBuffer[-1].copy()  # Return copy to avoid modification
+            if self._frame_count:
+                latest = (self._write_index - 1) % self.capacity
+                if out is not None and out.shape == self._ring[latest].shape:
+                    np.copyto(out, self._ring[latest])
+                    return out
+                return self._ring[latest].copy()  # Return copy to avoid modification
             return None
 
-    def get_clip(self):
-        """Get current video clip (thread-safe)"""
+    def get_clip_view(self, since_generation=None):
+        """
+        Get the current clip as one contiguous, read-only array (thread-safe)
+
+        The returned array has shape (clip_length, H, W, 3) in capture order,
+        oldest frame first. With a stride > 1 it holds every stride-th frame,
+        on a grid aligned to the sequence IDs (IDs divisible by stride), so
+        consecutive clips share all but one frame and the clip only changes
+        every stride frames. Only the clip_length selected frames are
+        gathered from the ring, and only when the clip has changed; repeated
+        calls in between return the same array without copying.
+
+        Args:
+            since_generation: Generation from a previous call; if nothing has
+                been captured since, 'frames' is None
+
+        Returns:
+            Dict with 'frames' (array or None), 'sequence_ids' (array of the
+            frames' sequence IDs, or None) and 'generation' (int, equal to the
+            sequence ID of the clip's newest frame)
+        """
         with self._lock:
-            if self.videoReady:
-                return [frame.copy() for frame in self.videoBuffer]  # Return copies
+            # Newest frame on the stride grid; it identifies the clip
+            generation = self._generation - self._generation % self.stride
+            if not self.videoReady or generation == since_generation:
+                return {'frames': None, 'sequence_ids': None, 'generation': generation}
+
+            if self._snapshot_generation != generation:
+                # Walk back from the newest grid frame in steps of stride
+                newest_slot = self._write_index - 1 - (self._generation - generation)
+                order = (newest_slot - self.stride * np.arange(self.clip_length - 1, -1, -1)) % self.capacity
+                snapshot = self._ring[order]
+                snapshot.flags.writeable = False
+                sequence_ids = self._sequence_ring[order]
+                sequence_ids.flags.writeable = False
+                self._snapshot = snapshot
+                self._snapshot_sequence_ids = sequence_ids
+                self._snapshot_generation = generation
+
+            return {
+                'frames': self._snapshot,
+                'sequence_ids': self._snapshot_sequence_ids,
+                'generation': generation
+            }
+
+    def get_clip(self):
+        """Get current video clip as a list of frames (thread-safe)"""
+        frames = self.get_clip_view()['frames']
+        if frames is None:
             return []
+        return list(frames)
+
+    def is_finished(self):
+        """True once a replay source has delivered its last frame"""
+        return self.source.finished
+
+    def get_generation(self):
+        """Get the sequence ID of the latest stored frame (thread-safe)"""
+        with self._lock:
+            return self._generation
 
     def is_ready(self):
         """Check if video clip is ready (thread-safe)"""
@@ -103,54 +290,16 @@ class Webcam:
     def get_buffer_size(self):
         """Get current buffer size (thread-safe)"""
         with self._lock:
-            return len(self.videoBuffer)
+            return self._frame_count
     
-    def _show_preview_frame(self, frame):
-        """Show preview frame with AI status overlay"""
-        try:
-            # Create a copy for display
-            display_frame = frame.copy()
-            
-            # Add status overlay
-            height, width = display_frame.shape[:2]
-            
-            # Add SentiCare branding
-            cv2.putText(display_frame, "SentiCare AI Monitor", (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            # Add buffer status
-            buffer_text = f"Buffer: {len(self.videoBuffer)}/{self.clip_length}"
-            cv2.putText(display_frame, buffer_text, (10, height - 60), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
-            # Add ready status
-            status_text = "READY" if self.videoReady else "FILLING..."
-            color = (0, 255, 0) if self.videoReady else (0, 255, 255)
-            cv2.putText(display_frame, status_text, (10, height - 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-            
-            # Show the frame
-            cv2.imshow("SentiCare Camera Feed", display_frame)
-            
-            # Handle window events (non-blocking)
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                print("Preview window closed by user")
-                self.show_preview = False
-                cv2.destroyWindow("SentiCare Camera Feed")
-                
-        except Exception as e:
-            # Silently handle preview errors to not crash the main loop
-            pass
-
     def release_camera(self):
         """Clean shutdown"""
         self.stop_capture()
 
-        if self.cap.isOpened():
-            self.cap.release()
-
-        cv2.destroyAllWindows()
+        self.source.release()
+        if self.frame_bus is not None:
+            self.frame_bus.close()
+            self.frame_bus = None
 
     def __enter__(self):
         """Context manager support"""
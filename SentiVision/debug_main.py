@@ -6,6 +6,8 @@ import os
 import sys
 import cv2
 import time
+import logging
+from logging_setup import configure_logging
 
 def test_camera_basic():
     """Test basic camera functionality"""
@@ -119,7 +121,7 @@ def test_webcam_class():
             print("  - Waiting for camera to be ready...")
             start_time = time.time()
             while not webcam.is_ready() and (time.time() - start_time) < 10:
-                print(f"    Buffer: {webcam.get_buffer_size()}/{webcam.clip_length}")
+                print(f"    Buffer: {webcam.get_buffer_size()}/{webcam.capacity}")
                 time.sleep(0.5)
             
             if webcam.is_ready():
@@ -133,6 +135,7 @@ def test_webcam_class():
         return False
 
 def main():
+    configure_logging(logging.DEBUG)
     print("SentiCare Debug Diagnostic")
     print("=" * 50)
     
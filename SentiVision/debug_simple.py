@@ -1,4 +1,4 @@
-. #!/usr/bin/env python3
+#!/usr/bin/env python3
 """
 Simple test to debug the model and camera integration
 """
@@ -9,6 +9,7 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress TensorFlow logging
 import numpy as np
 from model_interface import ModelInterface
 from camera import Webcam
+from preview import PreviewWindow
 import time
 
 def test_model_only():
@@ -33,7 +34,7 @@ def test_model_only():
 def test_camera_only():
     print("\n=== Testing Camera Interface ===")
     try:
-        with Webcam(show_preview=True) as cam:
+        with Webcam() as cam:
             print("Camera started, waiting for buffer to fill...")
             
             # Wait for buffer to fill
@@ -42,14 +43,13 @@ def test_camera_only():
                 time.sleep(0.5)
             
             print("✅ Camera buffer ready!")
-            print("Camera preview should be visible now. Press any key in the preview window to continue...")
+            print("Camera preview should be visible now for 5 seconds (press Q in the window to close it early)...")
             
             # Keep showing preview for 5 seconds
-            for i in range(50):  # 5 seconds at 0.1s intervals
-                frame = cam.get_frame()
-                if frame is not None:
-                    cam._show_preview_frame(frame)
-                time.sleep(0.1)
+            preview = PreviewWindow(cam)
+            preview.start()
+            time.sleep(5)
+            preview.stop()
             
             return True
             
@@ -64,23 +64,34 @@ def test_integration():
     try:
         model = ModelInterface()
         
-        with Webcam(show_preview=True) as cam:
-            # Wait for camera buffer
-            while not cam.is_ready():
-                print(f"Buffer: {cam.get_buffer_size()}/20")
-                time.sleep(0.5)
-            
-            print("Running AI prediction on camera feed...")
-            
-            # Get video clip and run prediction
-            clip = cam.get_clip()
-            if clip:
-                result = model.predict(clip)
-                print(f"✅ Prediction successful: {result}")
-                return True
-            else:
-                print("❌ No video clip available")
-                return False
+        with Webcam() as cam:
+            # Show the feed with the latest prediction while the model runs
+            last_result = {}
+            preview = PreviewWindow(
+                cam, status=lambda: [f"Prediction: {last_result['state']}"] if last_result.get('state') else []
+            )
+            preview.start()
+            try:
+                # Wait for camera buffer
+                while not cam.is_ready():
+                    print(f"Buffer: {cam.get_buffer_size()}/20")
+                    time.sleep(0.5)
+                
+                print("Running AI prediction on camera feed...")
+                
+                # Get video clip and run prediction
+                clip = cam.get_clip()
+                if clip:
+                    result = model.predict(clip)
+                    last_result.update(result or {})
+                    print(f"✅ Prediction successful: {result}")
+                    time.sleep(3)  # Leave the prediction on screen for a moment
+                    return True
+                else:
+                    print("❌ No video clip available")
+                    return False
+            finally:
+                preview.stop()
                 
     except Exception as e:
         print(f"❌ Integration test failed: {e}")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+SentiVision Model Export Tool
+
+Converts models/SentiVision.keras into TensorFlow Lite or ONNX models that
+the 'tflite' and 'onnx' inference backends can run without loading the
+Keras model.
+
+Usage:
+    python export_model.py --quantization float16
+    python export_model.py --quantization int8 --calibration-dir preprocessed_videos
+    python export_model.py --format onnx
+
+TFLite quantization modes:
+    - float32: plain conversion, no quantization
+    - float16: weights stored as float16 (half the size, near-identical accuracy)
+    - int8: full integer quantization calibrated on preprocessed .npz clips
+      (the files written by preprocess_and_save_videos in hackathon.py)
+"""
+
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Hide INFO and WARNING messages
+
+import sys
+import glob
+import argparse
+import numpy as np
+import tensorflow as tf
+from model_layers import load_keras_model
+
+
+def load_calibration_clips(calibration_dir, max_samples):
+    """Load up to max_samples preprocessed (T, 224, 224, 3) clips from .npz files"""
+    paths = sorted(glob.glob(os.path.join(calibration_dir, "*.npz")))[:max_samples]
+    if not paths:
+        raise FileNotFoundError(f"No .npz calibration clips found in {calibration_dir}")
+
+    clips = []
+    for path in paths:
+        with np.load(path) as data:
+            clips.append(data['frames'].astype(np.float32))
+    print(f"Loaded {len(clips)} calibration clips from {calibration_dir}")
+    return clips
+
+
+def convert_to_tflite(model, quantization, calibration_clips=None):
+    """Convert a Keras model to a TFLite flatbuffer"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if not calibration_clips:
+            raise ValueError("int8 quantization requires calibration clips")
+
+        def representative_dataset():
+            for clip in calibration_clips:
+                yield [clip[np.newaxis, ...]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        # Keep float builtins as a fallback for ops without an int8 kernel;
+        # input and output stay float32 so the runtime preprocessing is unchanged
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.TFLITE_BUILTINS
+        ]
+
+    return converter.convert()
+
+
+def convert_to_onnx(model, output_path, clip_length=20, input_size=(224, 224), opset=17):
+    """Convert a Keras model to ONNX with a dynamic batch dimension"""
+    import tf2onnx
+
+    input_signature = (tf.TensorSpec((None, clip_length) + tuple(input_size) + (3,), tf.float32, name='video'),)
+    try:
+        tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=opset, output_path=output_path)
+    except Exception:
+        # Fall back to tracing the forward pass as a plain function
+        forward = tf.function(lambda video: model(video, training=False), input_signature=input_signature)
+        tf2onnx.convert.from_function(forward, input_signature=input_signature, opset=opset, output_path=output_path)
+
+
+def main():
+    """Main entry point for the export tool"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Export the SentiVision model to TensorFlow Lite or ONNX')
+    parser.add_argument(
+        '--model',
+        default=os.path.join(script_dir, 'models/SentiVision.keras'),
+        help='Path to the Keras model (default: models/SentiVision.keras)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=['tflite', 'onnx'],
+        default='tflite',
+        help='Export format (default: tflite)'
+    )
+    parser.add_argument(
+        '--output',
+        help='Output path (default: models/SentiVision_<quantization>.tflite or models/SentiVision.onnx)'
+    )
+    parser.add_argument(
+        '--quantization',
+        choices=['float32', 'float16', 'int8'],
+        default='float16',
+        help='TFLite quantization mode (default: float16)'
+    )
+    parser.add_argument(
+        '--calibration-dir',
+        default='preprocessed_videos',
+        help='Directory of preprocessed .npz clips for int8 calibration'
+    )
+    parser.add_argument(
+        '--calibration-samples',
+        type=int,
+        default=200,
+        help='Maximum number of calibration clips (default: 200)'
+    )
+
+    args = parser.parse_args()
+    if args.format == 'onnx':
+        default_output = 'models/SentiVision.onnx'
+    else:
+        default_output = f'models/SentiVision_{args.quantization}.tflite'
+    output_path = args.output or os.path.join(script_dir, default_output)
+
+    try:
+        print(f"Loading Keras model from {args.model}...")
+        model = load_keras_model(args.model)
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+        if args.format == 'onnx':
+            print("Converting to ONNX...")
+            convert_to_onnx(model, output_path)
+        else:
+            calibration_clips = None
+            if args.quantization == 'int8':
+                calibration_clips = load_calibration_clips(args.calibration_dir, args.calibration_samples)
+
+            print(f"Converting to TFLite ({args.quantization})...")
+            tflite_model = convert_to_tflite(model, args.quantization, calibration_clips)
+
+            with open(output_path, 'wb') as f:
+                f.write(tflite_model)
+
+        print(f"✅ Exported {os.path.getsize(output_path) / 1e6:.1f} MB model to {output_path}")
+
+    except Exception as e:
+        print(f"❌ Export failed: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,126 @@
+import logging
 import os
 import json
+import time
 import pytz
 from google.cloud import firestore
 from google.oauth2 import service_account
 import threading
 from datetime import datetime
+from firestore_writer import FirestoreWriter
+from write_ahead_log import WriteAheadLog, MemoryLog
+from status_publisher import StatusPublisher
+
+
+logger = logging.getLogger(__name__)
+
+
+# States a camera reports for an empty room; a room in one of these does not
+# take over a shared patient's status from a room that sees the patient
+DEFAULT_IDLE_STATES = ('IDLE', 'NOT_PRESENT')
+
+
+class PatientStatusOwner:
+    """
+    Decides which room writes a patientStatus document several rooms share
+
+    When one patient moves through several rooms, every room's state machine
+    reports a state, but only one room sees the patient. The document is
+    written by the room whose latest non-idle state was confirmed most
+    recently; while every room is idle, by the room whose state changed last.
+    """
+    
+    def __init__(self, patient_id, idle_states=DEFAULT_IDLE_STATES):
+        """
+        Args:
+            patient_id: Patient whose document is arbitrated (for log messages)
+            idle_states: States meaning the room does not see the patient
+        """
+        self.patient_id = patient_id
+        self.idle_states = set(idle_states)
+        self.owner = None
+        self._rooms = {}  # roomId -> [state, changed_at, status_data, publish]
+        self._lock = threading.Lock()
+    
+    def report(self, room_id, status_data, publish):
+        """
+        Record a room's status update and write the document if the room owns it
+        
+        Args:
+            room_id: Reporting room
+            status_data: The room's patientStatus data
+            publish: Callable writing status_data for that room
+        
+        Returns:
+            publish's result if the room wrote the document, else None
+        """
+        state = status_data['currentState']
+        with self._lock:
+            entry = self._rooms.get(room_id)
+            if entry is None or entry[0] != state:
+                self._rooms[room_id] = entry = [state, time.monotonic(), status_data, publish]
+            else:
+                entry[2], entry[3] = status_data, publish
+            
+            previous_owner = self.owner
+            owner = self.owner = self._choose_owner()
+            owner_entry = self._rooms[owner]
+        
+        if owner != previous_owner:
+            logger.info("Patient %s status now written by room %s (%s)", self.patient_id, owner, owner_entry[0])
+            if owner != room_id:
+                # Another room's report handed the document back to a room that is not reporting now
+                owner_entry[3](owner_entry[2])
+        if owner == room_id:
+            return publish(status_data)
+        return None
+    
+    def remove(self, room_id):
+        """Stop considering a room (its client is closing)"""
+        with self._lock:
+            self._rooms.pop(room_id, None)
+            self.owner = self._choose_owner() if self._rooms else None
+    
+    def _choose_owner(self):
+        """Room whose non-idle (else any) state changed most recently (called with the lock held)"""
+        return max(self._rooms, key=lambda room: (self._rooms[room][0] not in self.idle_states,
+                                                  self._rooms[room][1]))
 
 
 class FirebaseClient:
-    def __init__(self, config_path="config.json"):
-        """Initialize Firebase client with authentication"""
+    def __init__(self, config_path="config.json", db=None):
+        """
+        Initialize Firebase client with authentication
+        
+        Args:
+            config_path: Path to config.json
+            db: Firestore client to use instead of connecting with the
+                service account (e.g. a LocalFirestore for tests and benchmarks)
+        """
         self.config = self._load_config(config_path)
-        self.db = self._initialize_firestore()
+        self.db = db if db is not None else self._initialize_firestore()
         self._lock = threading.Lock()
         
         # Set up timezone from config
         self.timezone = pytz.timezone(self.config.get('timezone', 'America/New_York'))
         
+        # Background batched writer; write methods return futures when enabled
+        self.writer = None
+        if self.config.get('async_writes', True):
+            self.writer = FirestoreWriter(
+                self.db,
+                log=self._open_write_log(config_path),
+                batch_size=self.config.get('firestore_batch_size', 50),
+                flush_interval=self.config.get('firestore_flush_interval', 1.0)
+            )
+        
+        # Collapse redundant patientStatus writes into a latest-value-wins slot
+        self.status_publisher = self._create_status_publisher()
+        
+        # Rooms sharing a patient arbitrate its patientStatus document (see for_room)
+        self.status_owner = None
+        self._status_owners = {}
+        
     def _load_config(self, config_path):
         """Load configuration from JSON file"""
         try:
@@ -27,6 +131,52 @@ class FirebaseClient:
         except json.JSONDecodeError:
             raise ValueError(f"Invalid JSON in configuration file {config_path}")
     
+    def _create_status_publisher(self):
+        """StatusPublisher for this client's patientStatus document, or None if coalescing is disabled"""
+        if not self.config.get('coalesce_status_updates', True):
+            return None
+        return StatusPublisher(
+            self._write_patient_status,
+            coalesce_window=self.config.get('status_coalesce_window', 5.0),
+            liveness_interval=self.config.get('status_liveness_interval', 120.0),
+            confidence_epsilon=self.config.get('status_confidence_epsilon', 0.05)
+        )
+    
+    def for_room(self, room_config):
+        """
+        Client writing events, alerts and status for one room of a multi-room setup
+        
+        The room client shares this client's Firestore connection and batched
+        writer (one write-ahead log for the process) and has its own
+        patientStatus publisher. Room clients with the same patientId share a
+        PatientStatusOwner, so only the room that sees the patient writes the
+        patient's status. Close room clients before this one.
+        
+        Args:
+            room_config: Configuration for the room (patientId, roomId, ...)
+        """
+        return RoomFirebaseClient(self, room_config)
+    
+    def _status_owner_for(self, patient_id):
+        """PatientStatusOwner shared by every room client of patient_id"""
+        with self._lock:
+            if patient_id not in self._status_owners:
+                self._status_owners[patient_id] = PatientStatusOwner(
+                    patient_id, idle_states=self.config.get('status_idle_states', DEFAULT_IDLE_STATES)
+                )
+            return self._status_owners[patient_id]
+    
+    def _open_write_log(self, config_path):
+        """Durable write-ahead log if write_ahead_log_path is set, else an in-memory log"""
+        wal_path = self.config.get('write_ahead_log_path')
+        if not wal_path:
+            return MemoryLog()
+        
+        # Relative paths are resolved against the directory of the config file
+        if not os.path.isabs(wal_path):
+            wal_path = os.path.join(os.path.dirname(os.path.abspath(config_path)), wal_path)
+        return WriteAheadLog(wal_path)
+    
     def _initialize_firestore(self):
         """Initialize Firestore client with service account authentication"""
         # Use hardcoded credentials from config
@@ -56,82 +206,178 @@ class FirebaseClient:
             # Initialize Firestore client
             db = firestore.Client(credentials=credentials, project=final_project_id)
             
-            print(f"Successfully connected to Firestore project: {final_project_id}")
+            logger.info("Successfully connected to Firestore project: %s", final_project_id)
             return db
             
         except Exception as e:
             raise RuntimeError(f"Failed to initialize Firestore client: {str(e)}")
     
     def write_event(self, event_type, duration_seconds, confidence_score, metadata=None):
-        """Write event data to the events collection"""
+        """
+        Write event data to the events collection
+        
+        With asynchronous writes enabled this only queues the write and returns
+        a Future; call .result() on it to wait until the event is committed.
+        """
+        event_data = {
+            "patientId": self.config["patientId"],
+            "roomId": self.config["roomId"],
+            "eventType": event_type,
+            "durationSeconds": duration_seconds,
+            "confidenceScore": confidence_score,
+            "timestamp": firestore.SERVER_TIMESTAMP
+        }
+        
+        if metadata:
+            event_data["metadata"] = metadata
+        
+        if self.writer:
+            return self.writer.submit({'type': 'add', 'collection': 'events', 'data': event_data})
+        
         with self._lock:
             try:
-                event_data = {
-                    "patientId": self.config["patientId"],
-                    "roomId": self.config["roomId"],
-                    "eventType": event_type,
-                    "durationSeconds": duration_seconds,
-                    "confidenceScore": confidence_score,
-                    "timestamp": firestore.SERVER_TIMESTAMP
-                }
-                
-                if metadata:
-                    event_data["metadata"] = metadata
-                
                 doc_ref = self.db.collection('events').add(event_data)
-                print(f"Event written to Firestore: {event_type} (duration: {duration_seconds}s)")
+                logger.info("Event written to Firestore: %s (duration: %ss)", event_type, duration_seconds)
                 return doc_ref
                 
             except Exception as e:
-                print(f"Error writing event to Firestore: {str(e)}")
+                logger.error("Error writing event to Firestore: %s", e)
                 raise
     
     def write_alert(self, alert_type, confidence_score):
-        """Write alert data to the alerts collection"""
+        """
+        Write alert data to the alerts collection
+        
+        Alerts bypass batching: with asynchronous writes enabled they are
+        committed immediately, ahead of queued routine writes.
+        """
+        alert_data = {
+            "patientId": self.config["patientId"],
+            "roomId": self.config["roomId"],
+            "alertType": alert_type,
+            "acknowledged": False,
+            "confidenceScore": confidence_score,
+            "timestamp": firestore.SERVER_TIMESTAMP
+        }
+        
+        if self.writer:
+            logger.warning("CRITICAL ALERT queued for Firestore: %s (confidence: %s)", alert_type, confidence_score)
+            return self.writer.submit({'type': 'add', 'collection': 'alerts', 'data': alert_data}, priority=True)
+        
         with self._lock:
             try:
-                alert_data = {
-                    "patientId": self.config["patientId"],
-                    "roomId": self.config["roomId"],
-                    "alertType": alert_type,
-                    "acknowledged": False,
-                    "confidenceScore": confidence_score,
-                    "timestamp": firestore.SERVER_TIMESTAMP
-                }
-                
                 doc_ref = self.db.collection('alerts').add(alert_data)
-                print(f"CRITICAL ALERT written to Firestore: {alert_type} (confidence: {confidence_score})")
+                logger.warning("CRITICAL ALERT written to Firestore: %s (confidence: %s)", alert_type, confidence_score)
                 return doc_ref
                 
             except Exception as e:
-                print(f"Error writing alert to Firestore: {str(e)}")
+                logger.error("Error writing alert to Firestore: %s", e)
                 raise
     
     def update_patient_status(self, current_state, state_start_time, confidence_score):
-        """Update patient status in the patientStatus collection"""
+        """
+        Update patient status in the patientStatus collection
+        
+        With status coalescing enabled the update goes through the status
+        publisher, which writes only the latest of several quick updates and
+        skips updates that change nothing but lastSeen (returns None).
+        """
+        status_data = {
+            "currentState": current_state,
+            "stateStartTime": state_start_time,
+            "lastSeen": firestore.SERVER_TIMESTAMP,
+            "roomId": self.config["roomId"],
+            "confidenceScore": confidence_score
+        }
+        
+        if self.status_owner is not None:
+            return self.status_owner.report(self.config["roomId"], status_data, self._publish_status)
+        return self._publish_status(status_data)
+    
+    def _publish_status(self, status_data):
+        """Hand a patientStatus update to the status publisher, or write it"""
+        if self.status_publisher:
+            self.status_publisher.publish(status_data)
+            return None
+        
+        return self._write_patient_status(status_data)
+    
+    def _write_patient_status(self, status_data):
+        """Write one patientStatus document (queued when asynchronous writes are enabled)"""
+        if self.writer:
+            # Use patientId as document ID for overwrite operation
+            return self.writer.submit({
+                'type': 'set',
+                'collection': 'patientStatus',
+                'document': self.config["patientId"],
+                'data': status_data
+            })
+        
         with self._lock:
             try:
-                status_data = {
-                    "currentState": current_state,
-                    "stateStartTime": state_start_time,
-                    "lastSeen": firestore.SERVER_TIMESTAMP,
-                    "roomId": self.config["roomId"],
-                    "confidenceScore": confidence_score
-                }
-                
                 # Use patientId as document ID for overwrite operation
                 doc_ref = self.db.collection('patientStatus').document(self.config["patientId"])
                 doc_ref.set(status_data)
                 
-                print(f"Patient status updated: {current_state} (confidence: {confidence_score})")
+                logger.debug("Patient status updated: %s (confidence: %s)",
+                             status_data['currentState'], status_data['confidenceScore'])
                 return doc_ref
                 
             except Exception as e:
-                print(f"Error updating patient status in Firestore: {str(e)}")
+                logger.error("Error updating patient status in Firestore: %s", e)
                 raise
     
+    def flush(self, timeout=10.0):
+        """Wait until all queued writes are committed; returns False on timeout"""
+        if self.status_publisher:
+            self.status_publisher.flush(timeout)
+        if self.writer:
+            return self.writer.flush(timeout)
+        return True
+    
+    def close(self):
+        """Flush queued writes and stop the background writer (unsent writes stay in the WAL)"""
+        self._close_status_publisher()
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+    
+    def _close_status_publisher(self):
+        """Write the pending patientStatus update and stop the publisher"""
+        if self.status_publisher:
+            self.status_publisher.close()
+            stats = self.status_publisher.get_stats()
+            self.status_publisher = None
+            logger.info("Patient status writes: %d of %d updates written, %d saved by coalescing",
+                        stats['written'], stats['received'], stats['saved'])
+    
     def get_config(self, key=None):
         """Get configuration value(s)"""
         if key:
             return self.config.get(key)
         return self.config.copy()
+
+
+class RoomFirebaseClient(FirebaseClient):
+    """FirebaseClient for one room, sharing its parent's Firestore connection and writer"""
+    
+    def __init__(self, parent, room_config):
+        """
+        Args:
+            parent: FirebaseClient owning the connection and the writer
+            room_config: Configuration for the room (patientId, roomId, ...)
+        """
+        self.parent = parent
+        self.config = dict(room_config)
+        self.db = parent.db
+        self._lock = parent._lock
+        self.timezone = pytz.timezone(self.config.get('timezone', 'America/New_York'))
+        self.writer = parent.writer
+        self.status_publisher = self._create_status_publisher()
+        self.status_owner = parent._status_owner_for(self.config.get('patientId'))
+    
+    def close(self):
+        """Write this room's pending status update; the parent closes the shared writer"""
+        self.status_owner.remove(self.config["roomId"])
+        self._close_status_publisher()
+        self.writer = None
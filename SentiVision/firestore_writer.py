@@ -0,0 +1,344 @@
+"""
+Asynchronous, batched Firestore writer
+
+FirebaseClient hands write operations to a FirestoreWriter instead of doing
+a network round-trip per write. Each operation is first appended to a log
+(see write_ahead_log.py); a background thread reads pending records from the
+log in order, coalesces them into Firestore WriteBatch commits, and
+acknowledges them once committed. Routine writes are flushed when enough are
+queued or the oldest one has waited long enough. Priority operations
+(critical alerts) skip the wait and are committed immediately, ahead of
+routine writes.
+
+With a durable WriteAheadLog, a commit that fails with a transient error
+(no connectivity, timeouts, Firestore unavailable or overloaded; see
+is_transient_error) leaves the records in the log; the writer backs off and
+replays them in order once Firestore is reachable again, including records
+left over from a previous run. With the in-memory log, failed writes are
+dropped.
+
+Any other error means Firestore rejected the batch itself (invalid data,
+denied permission, an oversized document) and retrying would fail forever,
+blocking every write behind it. The writer then commits the batch's records
+one at a time, and each record Firestore still rejects is logged at ERROR,
+moved out of the pending log (into the WAL's dead_letters table), and its
+future fails; the records around it are committed normally.
+
+Operations are plain dicts:
+
+    {'type': 'add', 'collection': 'events', 'data': {...}}
+    {'type': 'set', 'collection': 'patientStatus', 'document': 'p1', 'data': {...}}
+
+submit() returns a concurrent.futures.Future that resolves to the written
+DocumentReference once the batch containing the operation is committed.
+"""
+
+import logging
+import time
+import threading
+import weakref
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from google.api_core import exceptions as api_exceptions
+from google.auth.exceptions import TransportError
+from google.cloud import firestore
+from write_ahead_log import MemoryLog
+from metrics import default_registry
+
+
+logger = logging.getLogger(__name__)
+
+
+# Firestore rejects WriteBatch commits with more than 500 operations
+MAX_BATCH_OPERATIONS = 500
+
+# Errors after which the same commit can succeed later
+TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.Aborted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.RetryError,
+    TransportError,
+    ConnectionError,
+    TimeoutError
+)
+
+
+def is_transient_error(error):
+    """True if a failed commit should be retried (Firestore unreachable or overloaded)"""
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def apply_operation(db, batch, operation):
+    """Add one operation to a WriteBatch and return its DocumentReference"""
+    collection = db.collection(operation['collection'])
+    if operation['type'] == 'add':
+        # Auto-generated ID like collection.add(), unless the log assigned one
+        doc_ref = collection.document(operation.get('document') or None)
+    elif operation['type'] == 'set':
+        doc_ref = collection.document(operation['document'])
+    else:
+        raise ValueError(f"Unknown Firestore operation type: {operation['type']}")
+
+    batch.set(doc_ref, operation['data'])
+    return doc_ref
+
+
+def _pin_server_timestamps(data, timestamp):
+    """Replace SERVER_TIMESTAMP sentinels with the time the write was originally made"""
+    return {
+        key: timestamp if value is firestore.SERVER_TIMESTAMP else value
+        for key, value in data.items()
+    }
+
+
+class FirestoreWriter:
+    """Background thread committing logged Firestore operations in batches"""
+
+    def __init__(self, db, log=None, batch_size=50, flush_interval=1.0,
+                 retry_interval=1.0, max_retry_interval=60.0, stale_after=30.0, metrics=None):
+        """
+        Args:
+            db: firestore.Client
+            log: WriteAheadLog for durable buffering, or None for a MemoryLog
+            batch_size: Commit as soon as this many routine operations are
+                queued (capped at Firestore's 500-operation batch limit)
+            flush_interval: Maximum seconds a routine operation waits before
+                its batch is committed
+            retry_interval: First back-off delay after a failed commit; doubles
+                on each consecutive failure up to max_retry_interval
+            max_retry_interval: Longest back-off delay
+            stale_after: Records committed more than this many seconds after
+                they were logged get their SERVER_TIMESTAMP fields replaced by
+                the original write time, so replayed events keep their time
+            metrics: MetricsRegistry for commit latency and write counts
+                (default: the shared registry)
+        """
+        self.db = db
+        self.log = log or MemoryLog()
+        self.batch_size = min(batch_size, MAX_BATCH_OPERATIONS)
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.stale_after = stale_after
+
+        self.online = True
+        self.committed_batches = 0
+        self.committed_operations = 0
+        self.failed_operations = 0
+        self.rejected_operations = 0
+
+        metrics = metrics or default_registry()
+        self._commit_seconds = metrics.histogram(
+            'senticare_firestore_commit_seconds', 'Firestore batch commit round-trip time')
+        self._write_latency = metrics.histogram(
+            'senticare_firestore_write_latency_seconds', 'Time from a write being logged to its commit')
+        self._committed_counter = metrics.counter(
+            'senticare_firestore_writes_committed', 'Firestore writes committed')
+        self._failed_counter = metrics.counter(
+            'senticare_firestore_writes_failed', 'Firestore writes in failed batch commits')
+        self._rejected_counter = metrics.counter(
+            'senticare_firestore_writes_rejected', 'Firestore writes rejected permanently and not retried')
+        metrics.gauge('senticare_firestore_writes_pending', 'Firestore writes logged but not yet committed',
+                      callback=self.pending_count)
+
+        # Only futures a caller still holds are kept, so an outage cannot grow memory
+        self._futures = weakref.WeakValueDictionary()
+        self._retry_delay = retry_interval
+        self._flush_requested = False
+        self._condition = threading.Condition()
+        self._running = True
+
+        replay_count = self.log.pending_count()
+        if replay_count:
+            logger.info("Replaying %d buffered Firestore writes from the write-ahead log", replay_count)
+
+        self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation, priority=False):
+        """
+        Log an operation and queue it for the next batch commit
+
+        Args:
+            operation: Operation dict (see module docstring)
+            priority: Commit immediately in its own batch, ahead of routine writes
+
+        Returns:
+            Future resolving to the DocumentReference once committed
+        """
+        future = Future()
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("FirestoreWriter is closed")
+            record_id = self.log.append(operation, priority=priority)
+            self._futures[record_id] = future
+            self._condition.notify()
+        return future
+
+    def pending_count(self):
+        """Number of logged operations not yet committed"""
+        return self.log.pending_count()
+
+    def flush(self, timeout=None):
+        """Commit everything logged now and wait until it is done; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            try:
+                while self.log.pending_count():
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self._flush_requested = False
+        return True
+
+    def close(self, timeout=10.0):
+        """Flush logged operations and stop the writer thread; a durable log keeps the rest"""
+        if not self.flush(timeout) and self.log.durable:
+            logger.warning("%d Firestore writes kept in the write-ahead log for the next start", self.log.pending_count())
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout=2.0)
+        if self._thread.is_alive():
+            # A commit is still waiting on Firestore; it acknowledges through the log when it returns
+            logger.warning("Firestore writer still committing after close, leaving the write-ahead log open")
+            return
+        self.log.close()
+
+    def _next_batch(self):
+        """Wait for the next batch to be due and read it from the log (called with the lock held)"""
+        while self._running:
+            records = self.log.pending(MAX_BATCH_OPERATIONS, priority=True)
+            if records:
+                return records
+
+            count, oldest = self.log.routine_stats()
+            if count:
+                waited = time.time() - oldest
+                if count >= self.batch_size or waited >= self.flush_interval or self._flush_requested:
+                    return self.log.pending(MAX_BATCH_OPERATIONS, priority=False)
+                self._condition.wait(self.flush_interval - waited)
+                continue
+
+            self._condition.wait()
+        return None
+
+    def _back_off(self):
+        """Wait before retrying a failed commit; only close() cuts the wait short (called with the lock held)"""
+        deadline = time.monotonic() + self._retry_delay
+        while self._running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._condition.wait(remaining)
+        self._retry_delay = min(self._retry_delay * 2, self.max_retry_interval)
+
+    def _run(self):
+        """Internal method - runs in the writer thread"""
+        while True:
+            with self._condition:
+                records = self._next_batch()
+                if records is None:
+                    return
+
+            done = self._commit(records)
+
+            with self._condition:
+                self._condition.notify_all()
+                if done or not self.log.durable:
+                    self._retry_delay = self.retry_interval
+                else:
+                    # Records stay in the durable log and are replayed after the back-off
+                    self._back_off()
+
+    def _commit(self, records):
+        """
+        Commit records as one WriteBatch, isolating records Firestore rejects
+
+        Returns:
+            True once every record has left the log (committed or rejected),
+            False if some were kept for a retry
+        """
+        try:
+            doc_refs = self._commit_batch(records)
+        except Exception as e:
+            transient = is_transient_error(e)
+            if not transient and len(records) > 1:
+                # Find the rejected records; the others are committed in order.
+                # Failures are counted by the single-record commits
+                logger.warning("Firestore rejected a batch of %d writes (%s), committing them one by one",
+                               len(records), e)
+                for record in records:
+                    if not self._commit([record]):
+                        return False
+                return True
+
+            self.failed_operations += len(records)
+            self._failed_counter.inc(len(records))
+            if transient and self.log.durable:
+                if self.online:
+                    logger.warning("Firestore unreachable, buffering writes in the write-ahead log: %s", e)
+                self.online = False
+                return False
+
+            if transient:
+                logger.error("Error committing Firestore batch (%d writes): %s", len(records), e)
+                self.log.acknowledge([record['id'] for record in records])
+            else:
+                self._reject(records[0], e)
+            for record in records:
+                future = self._futures.pop(record['id'], None)
+                if future is not None:
+                    future.set_exception(e)
+            return True
+
+        committed_at = time.time()
+        for record in records:
+            self._write_latency.observe(committed_at - record['created_at'])
+        self._committed_counter.inc(len(records))
+
+        self.log.acknowledge([record['id'] for record in records])
+        if not self.online:
+            logger.info("Firestore reachable again, replaying buffered writes")
+            self.online = True
+
+        self.committed_batches += 1
+        self.committed_operations += len(records)
+        logger.debug("Firestore batch committed: %d writes", len(records))
+        for record, doc_ref in zip(records, doc_refs):
+            future = self._futures.pop(record['id'], None)
+            if future is not None:
+                future.set_result(doc_ref)
+        return True
+
+    def _reject(self, record, error):
+        """Take a record Firestore will never accept out of the pending log"""
+        operation = record['operation']
+        logger.error("Firestore rejected %s write to %s/%s, not retrying it: %s",
+                     operation['type'], operation['collection'], operation.get('document'), error)
+        self.log.reject([record['id']], f"{type(error).__name__}: {error}")
+        self.rejected_operations += 1
+        self._rejected_counter.inc()
+
+    def _commit_batch(self, records):
+        """Build and commit one WriteBatch; returns the records' DocumentReferences"""
+        now = time.time()
+        start = time.perf_counter()
+        batch = self.db.batch()
+        doc_refs = []
+        for record in records:
+            operation = record['operation']
+            if now - record['created_at'] > self.stale_after:
+                written_at = datetime.fromtimestamp(record['created_at'], tz=timezone.utc)
+                operation = dict(operation, data=_pin_server_timestamps(operation['data'], written_at))
+            doc_refs.append(apply_operation(self.db, batch, operation))
+        batch.commit()
+        self._commit_seconds.observe(time.perf_counter() - start)
+        return doc_refs
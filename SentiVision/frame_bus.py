@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Shared-memory frame bus: one camera, many local consumers
+
+Only one process can open a camera. A Webcam with a 'frame_bus' name in its
+capture settings publishes every frame it stores into a ring of frames in
+a multiprocessing.shared_memory block. Any number of local processes
+(the monitor, a preview, a recorder, a pose estimator) attach to the bus
+by name and read frames without opening the device:
+
+    bus = FrameBus.attach('senticare-camera')
+    sequence = bus.latest_sequence()
+    frame, timestamp = bus.read(sequence)  # (None, None) if it was overwritten
+
+Or, as a capture source for Webcam (see frame_sources.FrameBusSource):
+
+    "capture": {"source": "bus:senticare-camera"}
+
+Layout: a header (magic, capacity, frame shape, latest sequence, closed
+flag, publisher pid, random creation nonce), then per slot a seqlock version, the frame's sequence number and its
+capture timestamp, then capacity frames. Frame n lives in slot n % capacity.
+The single writer makes a slot's version odd while it writes the slot and
+even again afterwards; a reader copies the frame and accepts it only if the
+version was even and unchanged across the copy, so a reader never blocks
+the camera and never returns a torn frame. A reader that falls more than
+capacity frames behind sees its frame overwritten, and reads the latest
+one instead.
+
+The seqlock relies on the CPU making stores visible to other cores in
+program order, and performing loads in program order, as x86 and x86-64 do:
+the version, sequence and frame are written with plain NumPy stores and no
+memory barriers. On weakly ordered CPUs (ARM, e.g. a Raspberry Pi) a reader
+may see the new version before all of the frame's bytes and accept a torn
+frame, so there frames are best-effort and create() logs a warning.
+
+view() gives zero-copy access to a slot for consumers that can check
+is_current() after using the frame.
+
+Running this module is the capture service: it opens the camera described
+by config.json and publishes to the bus until stopped:
+
+    python frame_bus.py --config config.json --name senticare-camera
+
+A bus left behind by a publisher that crashed is replaced; one whose
+publisher is still running is not, unless --force is given. Readers of the
+old bus notice the new one by its nonce (is_replaced()) and re-attach.
+"""
+
+import os
+import sys
+import time
+import secrets
+import signal
+import logging
+import argparse
+import platform
+import json
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = 0x53454E5449425553  # 'SENTIBUS'
+HEADER_FIELDS = 9  # int64: magic, capacity, height, width, channels, latest sequence, closed, publisher pid, nonce
+ALIGNMENT = 64
+
+_MAGIC, _CAPACITY, _HEIGHT, _WIDTH, _CHANNELS, _LATEST, _CLOSED, _PID, _NONCE = range(9)
+
+# CPUs whose memory model keeps the seqlock's plain stores and loads in order
+_ORDERED_MACHINES = ('x86_64', 'amd64', 'i386', 'i686', 'x86')
+
+
+def _layout(capacity, frame_shape):
+    """Byte offsets of the slot table, the timestamps and the frames, and the total size"""
+    slots_offset = HEADER_FIELDS * 8
+    timestamps_offset = slots_offset + capacity * 2 * 8
+    frames_offset = -(-(timestamps_offset + capacity * 8) // ALIGNMENT) * ALIGNMENT
+    size = frames_offset + capacity * int(np.prod(frame_shape))
+    return slots_offset, timestamps_offset, frames_offset, size
+
+
+# Python 3.13+ can attach to a block without registering it with the resource tracker
+_UNTRACKED_ATTACH = sys.version_info >= (3, 13)
+
+
+def _attach_shared_memory(name):
+    """Open an existing block without letting this process's resource tracker unlink it on exit"""
+    if _UNTRACKED_ATTACH:
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _unlink_shared_memory(shm):
+    """
+    Remove a block by name
+
+    Before 3.13, unlink() also unregisters the block from the resource
+    tracker, which a reader sharing the tracker (in this process or a
+    spawned child) may already have done by attaching; register it again
+    first so the tracker is not asked to forget a name it no longer has.
+    """
+    if not _UNTRACKED_ATTACH:
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+def _running_publisher(name):
+    """PID of the live process publishing to an existing bus, or None if the bus is closed or abandoned"""
+    shm = _attach_shared_memory(name)
+    try:
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        magic, closed, pid = int(header[_MAGIC]), int(header[_CLOSED]), int(header[_PID])
+        del header
+    finally:
+        shm.close()
+
+    # A restarted service (e.g. PID 1 in a container) may get its predecessor's PID
+    if magic != MAGIC or closed or pid <= 0 or pid == os.getpid():
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return pid
+
+
+class FrameBus:
+    """Ring of uint8 frames in shared memory with one writer and any number of readers"""
+
+    def __init__(self, shm, owner):
+        """Use FrameBus.create() or FrameBus.attach()"""
+        self._shm = shm
+        self.name = shm.name
+        self.owner = owner
+        self._header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        if self._header[_MAGIC] != MAGIC:
+            raise RuntimeError(f"Shared memory block {shm.name} is not a frame bus")
+
+        self.nonce = int(self._header[_NONCE])
+        self.capacity = int(self._header[_CAPACITY])
+        self.frame_shape = tuple(int(value) for value in self._header[_HEIGHT:_CHANNELS + 1])
+        slots_offset, timestamps_offset, frames_offset, _ = _layout(self.capacity, self.frame_shape)
+        # Per slot: [seqlock version, frame sequence]
+        self._slots = np.ndarray((self.capacity, 2), dtype=np.int64, buffer=shm.buf, offset=slots_offset)
+        self._timestamps = np.ndarray((self.capacity,), dtype=np.float64, buffer=shm.buf,
+                                      offset=timestamps_offset)
+        self._frames = np.ndarray((self.capacity,) + self.frame_shape, dtype=np.uint8, buffer=shm.buf,
+                                  offset=frames_offset)
+
+    @classmethod
+    def create(cls, name, frame_shape, capacity=32, force=False):
+        """
+        Create a bus for frames of frame_shape (H, W, 3), replacing a stale one of the same name
+
+        Args:
+            name: Shared memory name readers attach to
+            frame_shape: Shape of every published frame
+            capacity: Frames kept; readers may lag this many frames behind
+            force: Also replace a bus whose publisher is still running;
+                otherwise that raises FileExistsError
+        """
+        frame_shape = tuple(frame_shape)
+        size = _layout(capacity, frame_shape)[3]
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            pid = _running_publisher(name)
+            if pid is not None and not force:
+                raise FileExistsError(f"Frame bus {name} is in use by running process {pid}")
+            # Left behind by a capture service that did not shut down cleanly (or forced)
+            stale = _attach_shared_memory(name)
+            stale.close()
+            _unlink_shared_memory(stale)
+            logger.warning("Replaced frame bus %s left by %s", name,
+                           f"running process {pid}" if pid else "a publisher that did not close it")
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_CAPACITY] = capacity
+        header[_HEIGHT:_CHANNELS + 1] = frame_shape
+        header[_LATEST] = -1
+        header[_PID] = os.getpid()
+        header[_NONCE] = secrets.randbits(62)
+        header[_MAGIC] = MAGIC
+        del header
+        logger.info("Frame bus %s created: %d frames of %s", name, capacity, frame_shape)
+        machine = platform.machine()
+        if machine.lower() not in _ORDERED_MACHINES:
+            logger.warning("Frame bus %s: %s does not order memory like x86; readers may occasionally "
+                           "accept a torn frame", name, machine)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to a bus published by another process; raises FileNotFoundError if there is none"""
+        return cls(_attach_shared_memory(name), owner=False)
+
+    def publish(self, frame, timestamp=None):
+        """
+        Copy a frame into the next slot (writer only)
+
+        Returns:
+            The frame's sequence number
+        """
+        sequence = int(self._header[_LATEST]) + 1
+        slot = sequence % self.capacity
+        self._slots[slot, 0] += 1  # Odd: slot being written
+        np.copyto(self._frames[slot], frame)
+        self._slots[slot, 1] = sequence
+        self._timestamps[slot] = time.time() if timestamp is None else timestamp
+        self._slots[slot, 0] += 1  # Even: slot consistent again
+        self._header[_LATEST] = sequence
+        return sequence
+
+    def latest_sequence(self):
+        """Sequence number of the newest frame, or -1 before the first"""
+        return int(self._header[_LATEST])
+
+    def is_closed(self):
+        """True once the writer has closed the bus"""
+        return bool(self._header[_CLOSED])
+
+    def is_replaced(self):
+        """
+        True if the bus name now refers to a different block
+
+        That happens when the publisher crashed and was restarted: the new
+        publisher replaced the block without closing this one, so this
+        mapping will never see another frame.
+        """
+        try:
+            shm = _attach_shared_memory(self.name)
+        except FileNotFoundError:
+            return False  # Publisher gone, no new bus yet
+        try:
+            header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+            # A block still being created has no magic yet; it is not this one either
+            replaced = header[_MAGIC] != MAGIC or header[_NONCE] != self.nonce
+            del header
+        finally:
+            shm.close()
+        return bool(replaced)
+
+    def read(self, sequence, out=None, retries=3):
+        """
+        Copy frame sequence into out (allocated if None)
+
+        Returns:
+            (frame, timestamp), or (None, None) if the frame has been
+            overwritten or not published yet
+        """
+        slot = sequence % self.capacity
+        if out is None:
+            out = np.empty(self.frame_shape, dtype=np.uint8)
+        for _ in range(retries):
+            version = self._slots[slot, 0]
+            if version & 1:
+                continue  # Being written right now
+            if self._slots[slot, 1] != sequence:
+                return None, None
+            np.copyto(out, self._frames[slot])
+            timestamp = float(self._timestamps[slot])
+            if self._slots[slot, 0] == version:
+                return out, timestamp
+        return None, None
+
+    def view(self, sequence):
+        """
+        Zero-copy, read-only view of frame sequence and the slot version to check it against
+
+        The writer may overwrite the slot at any time; use the frame, then
+        call is_current(sequence, version) and discard the result if False.
+
+        Returns:
+            (frame view, version), or (None, None) if the frame is not available
+        """
+        slot = sequence % self.capacity
+        version = int(self._slots[slot, 0])
+        if version & 1 or self._slots[slot, 1] != sequence:
+            return None, None
+        frame = self._frames[slot]
+        frame.flags.writeable = False
+        return frame, version
+
+    def is_current(self, sequence, version):
+        """True if the slot still holds frame sequence, unchanged since view() returned version"""
+        slot = sequence % self.capacity
+        return self._slots[slot, 0] == version and self._slots[slot, 1] == sequence
+
+    def close(self):
+        """Detach; the writer also marks the bus closed and removes it"""
+        if self._shm is None:
+            return
+        if self.owner:
+            self._header[_CLOSED] = 1
+        del self._header, self._slots, self._timestamps, self._frames
+        self._shm.close()
+        if self.owner:
+            _unlink_shared_memory(self._shm)
+            logger.info("Frame bus %s closed", self.name)
+        self._shm = None
+
+
+def main():
+    """Capture service: publish the configured camera to a frame bus until stopped"""
+    # Imported here: camera imports frame_sources, which imports this module
+    from camera import Webcam
+    from logging_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description='Publish the camera to a shared-memory frame bus')
+    parser.add_argument('--config', default='config.json', help='Configuration file (default: config.json)')
+    parser.add_argument('--name', help="Bus name (default: the capture section's frame_bus, or senticare-camera)")
+    parser.add_argument('--capacity', type=int, default=32, help='Frames kept in the bus (default: 32)')
+    parser.add_argument('--force', action='store_true',
+                        help='Replace the bus even if another running process publishes to it')
+    args = parser.parse_args()
+    configure_logging()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    capture = dict(config.get('capture') or {})
+    capture['frame_bus'] = args.name or capture.get('frame_bus') or 'senticare-camera'
+    capture['frame_bus_capacity'] = args.capacity
+    capture['frame_bus_force'] = args.force
+
+    try:
+        pid = _running_publisher(capture['frame_bus'])
+    except FileNotFoundError:
+        pid = None
+    if pid is not None and not args.force:
+        logger.error("Frame bus %s is already published by running process %d (use --force to replace it)",
+                     capture['frame_bus'], pid)
+        return 1
+
+    stopped = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.append(signum))
+
+    # A one-frame ring: the bus is the buffer consumers read from
+    with Webcam(clip_length=1, capture=capture,
+                capture_interval=config.get('capture_interval')) as webcam:
+        logger.info("Publishing %s to frame bus %s (Ctrl+C to stop)", capture.get('source', 0), capture['frame_bus'])
+        try:
+            while not stopped and not webcam.is_finished():
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+    logger.info("Capture service stopped after %d frames", webcam.source.frames_read)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,410 @@
+"""
+Frame sources for Webcam
+
+Webcam reads frames from a FrameSource instead of a hard-wired camera, so
+the whole monitor can run from recorded material on machines without a
+camera:
+
+- CameraSource: live camera, V4L2 device or RTSP/HTTP stream (OpenCV)
+- VideoFileSource: mp4/avi/... files decoded with OpenCV
+- NpzClipSource: the preprocessed training clips (.npz files with a
+  'frames' array, as written by preprocess_and_save_videos in hackathon.py)
+- ImageSequenceSource: a directory of jpg/png frames in file name order
+- FrameBusSource: frames another process publishes to a shared-memory
+  frame bus (source "bus:<name>", see frame_bus.py)
+
+Replay sources run either in real time (pace='realtime', frames are
+released at the source frame rate) or as fast as the consumer reads them
+(pace='fast'), and either stop at the end or loop.
+
+Every source returns BGR uint8 frames, like cv2.VideoCapture.read().
+"""
+
+import logging
+import os
+import glob
+import time
+import cv2
+import numpy as np
+from frame_bus import FrameBus
+
+
+logger = logging.getLogger(__name__)
+
+
+# Capture settings used for keys missing from the 'capture' config section
+DEFAULT_CAPTURE_SETTINGS = {
+    'source': 0,  # Camera index, V4L2 device path, RTSP/HTTP URL, video file, .npz file, or directory
+    'api': None,  # 'v4l2', 'ffmpeg', 'gstreamer', 'dshow', 'msmf' (default: chosen from the source)
+    'fourcc': None,  # e.g. 'MJPG' or 'YUYV'
+    'width': 640,
+    'height': 480,
+    'fps': 20,  # Camera frame rate, and the replay rate of .npz clips and image sequences
+    'resize_to': None,  # [height, width] to letterbox frames to at capture time
+    'hw_acceleration': False,  # Hardware video decoding for files and streams, if OpenCV supports it
+    'pace': 'realtime',  # Replay sources: 'realtime' or 'fast'
+    'loop': False,  # Replay sources: start over at the end instead of finishing
+    'frame_bus': None,  # Name of a shared-memory frame bus to publish stored frames to (see frame_bus.py)
+    'frame_bus_capacity': 32,  # Frames the published bus keeps
+    'frame_bus_force': False  # Replace a bus another running process publishes to
+}
+
+FRAME_BUS_PREFIX = 'bus:'
+
+CAPTURE_APIS = {
+    'v4l2': cv2.CAP_V4L2,
+    'ffmpeg': cv2.CAP_FFMPEG,
+    'gstreamer': cv2.CAP_GSTREAMER,
+    'dshow': cv2.CAP_DSHOW,
+    'msmf': cv2.CAP_MSMF
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def open_video_capture(settings):
+    """
+    Open a cv2.VideoCapture from capture settings and apply format, size and rate
+
+    Returns the opened capture; raises RuntimeError if the source cannot be opened.
+    """
+    source = settings['source']
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+
+    is_device = isinstance(source, int) or source.startswith('/dev/video')
+    is_stream = isinstance(source, str) and '://' in source
+
+    api = settings.get('api')
+    if api:
+        api_preference = CAPTURE_APIS[api]
+    elif isinstance(source, str) and source.startswith('/dev/video'):
+        api_preference = cv2.CAP_V4L2
+    elif is_stream:
+        api_preference = cv2.CAP_FFMPEG
+    else:
+        api_preference = cv2.CAP_ANY
+
+    params = []
+    if settings.get('hw_acceleration') and not is_device and hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+        params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+
+    cap = cv2.VideoCapture(source, api_preference, params) if params else cv2.VideoCapture(source, api_preference)
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video source: {source}")
+
+    if is_device:
+        # The pixel format must be requested before the frame size (V4L2)
+        if settings.get('fourcc'):
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings['fourcc']))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings['width'])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings['height'])
+        cap.set(cv2.CAP_PROP_FPS, settings['fps'])
+    if is_device or is_stream:
+        # Keep at most one decoded frame queued so clips stay current
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    fourcc_text = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)) if fourcc else 'n/a'
+    logger.info("Capture opened: %s at %dx%d @ %.0f fps (%s)", source, cap.get(cv2.CAP_PROP_FRAME_WIDTH),
+                cap.get(cv2.CAP_PROP_FRAME_HEIGHT), cap.get(cv2.CAP_PROP_FPS), fourcc_text)
+    return cap
+
+
+class FrameSource:
+    """Base class: a sequence of BGR uint8 frames"""
+
+    # Seconds Webcam sleeps between reads when not told otherwise
+    default_capture_interval = 0.0
+
+    def __init__(self, fps=20, pace='realtime', loop=False):
+        """
+        Args:
+            fps: Replay rate for pace='realtime'
+            pace: 'realtime' to release frames at fps, 'fast' to return them immediately
+            loop: Start over at the end instead of finishing
+        """
+        if pace not in ('realtime', 'fast'):
+            raise ValueError(f"Unknown pace: {pace}")
+        self.fps = fps
+        self.pace = pace
+        self.loop = loop
+        self.finished = False  # True once a non-looping source has returned its last frame
+        self.frames_read = 0
+        self._start_time = None
+
+    def read(self, out=None):
+        """Return (ok, frame) like cv2.VideoCapture.read(); ok is False at the end or on error"""
+        if self.finished:
+            return False, None
+
+        ok, frame = self._read_frame(out)
+        if not ok and self.loop and self.frames_read:
+            self._rewind()
+            ok, frame = self._read_frame(out)
+        if not ok:
+            self.finished = True
+            return False, None
+
+        self._wait_for_frame_time()
+        self.frames_read += 1
+        return True, frame
+
+    def _wait_for_frame_time(self):
+        """Sleep until this frame's time on the replay clock"""
+        if self.pace != 'realtime':
+            return
+        now = time.perf_counter()
+        if self._start_time is None:
+            self._start_time = now
+            return
+        delay = self._start_time + self.frames_read / self.fps - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def _read_frame(self, out):
+        """Read the next frame (implemented by subclasses)"""
+        raise NotImplementedError
+
+    def _rewind(self):
+        """Go back to the first frame (implemented by replay sources)"""
+        raise NotImplementedError
+
+    def release(self):
+        """Release any underlying resources"""
+        pass
+
+
+class CameraSource(FrameSource):
+    """Live camera, V4L2 device or network stream"""
+
+    # Matches the fixed ~20 FPS capture loop delay cameras always had
+    default_capture_interval = 0.05
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Capture settings (see DEFAULT_CAPTURE_SETTINGS)
+        """
+        super().__init__(fps=settings['fps'], pace='fast')
+        self.cap = open_video_capture(settings)
+
+    def read(self, out=None):
+        """Live sources never finish; a failed read is reported but retried by the caller"""
+        ret, frame = self.cap.read(out)
+        if ret:
+            self.frames_read += 1
+        return ret, frame
+
+    def release(self):
+        """Release the camera"""
+        if self.cap.isOpened():
+            self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """Video file replay at the file's frame rate (or as fast as possible)"""
+
+    def __init__(self, path, pace='realtime', loop=False, settings=None):
+        """
+        Args:
+            path: Video file
+            pace: 'realtime' or 'fast'
+            loop: Start over at the end instead of finishing
+            settings: Optional capture settings ('api', 'hw_acceleration')
+        """
+        settings = dict(DEFAULT_CAPTURE_SETTINGS, **(settings or {}))
+        settings['source'] = path
+        self.cap = open_video_capture(settings)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_CAPTURE_SETTINGS['fps']
+        super().__init__(fps=fps, pace=pace, loop=loop)
+        self.path = path
+
+    def _read_frame(self, out):
+        return self.cap.read(out)
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        """Close the file"""
+        if self.cap.isOpened():
+            self.cap.release()
+
+
+class NpzClipSource(FrameSource):
+    """Replay of preprocessed training clips, one .npz file after another"""
+
+    def __init__(self, path, fps=20, pace='realtime', loop=False):
+        """
+        Args:
+            path: .npz file or a directory of .npz files (played in file name order)
+            fps: Replay rate; the training clips were sampled from 20 FPS video
+            pace: 'realtime' or 'fast'
+            loop: Start over at the end instead of finishing
+        """
+        super().__init__(fps=fps, pace=pace, loop=loop)
+        if os.path.isdir(path):
+            self.paths = sorted(glob.glob(os.path.join(path, '*.npz')))
+        else:
+            self.paths = [path]
+        if not self.paths:
+            raise RuntimeError(f"No .npz clips found in {path}")
+
+        self._clip_index = -1
+        self._clip = None
+        self._frame_index = 0
+
+    def _read_frame(self, out):
+        while self._clip is None or self._frame_index >= len(self._clip):
+            self._clip_index += 1
+            if self._clip_index >= len(self.paths):
+                return False, None
+            self._clip = self._load_clip(self.paths[self._clip_index])
+            self._frame_index = 0
+
+        frame = self._clip[self._frame_index]
+        self._frame_index += 1
+        if out is not None and out.shape == frame.shape:
+            np.copyto(out, frame)
+            return True, out
+        return True, frame.copy()
+
+    @staticmethod
+    def _load_clip(path):
+        """Load a (T, H, W, 3) RGB float clip in [0, 1] as BGR uint8 frames"""
+        with np.load(path) as data:
+            frames = data['frames']
+        if np.issubdtype(frames.dtype, np.floating):
+            frames = np.clip(np.rint(frames * 255.0), 0, 255)
+        return np.ascontiguousarray(frames[..., ::-1], dtype=np.uint8)
+
+    def _rewind(self):
+        self._clip_index = -1
+        self._clip = None
+        self._frame_index = 0
+
+
+class ImageSequenceSource(FrameSource):
+    """Replay of a directory of image files in file name order"""
+
+    def __init__(self, directory, fps=20, pace='realtime', loop=False):
+        """
+        Args:
+            directory: Directory of jpg/png/bmp frames
+            fps: Replay rate
+            pace: 'realtime' or 'fast'
+            loop: Start over at the end instead of finishing
+        """
+        super().__init__(fps=fps, pace=pace, loop=loop)
+        self.paths = sorted(
+            path for path in glob.glob(os.path.join(directory, '*'))
+            if path.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if not self.paths:
+            raise RuntimeError(f"No images found in {directory}")
+        self._index = 0
+
+    def _read_frame(self, out):
+        while self._index < len(self.paths):
+            frame = cv2.imread(self.paths[self._index], cv2.IMREAD_COLOR)
+            self._index += 1
+            if frame is not None:
+                return True, frame
+            logger.warning("Skipping unreadable image: %s", self.paths[self._index - 1])
+        return False, None
+
+    def _rewind(self):
+        self._index = 0
+
+
+class FrameBusSource(FrameSource):
+    """Newest frames from a frame bus another process (e.g. python frame_bus.py) publishes to"""
+
+    def __init__(self, name, timeout=1.0):
+        """
+        Args:
+            name: Bus name
+            timeout: Seconds read() waits for a new frame before failing
+        """
+        super().__init__(pace='fast')
+        self.bus_name = name
+        self.timeout = timeout
+        self.skipped_frames = 0  # Published frames this reader was too slow to see
+        self._bus = None
+        self._last_sequence = None
+        self._attach()
+        if self._bus is None:
+            raise RuntimeError(f"Frame bus not found: {name} (is the capture service running?)")
+
+    def _attach(self):
+        """(Re)attach to the bus; leaves _bus None if it does not exist (yet)"""
+        try:
+            self._bus = FrameBus.attach(self.bus_name)
+            self._last_sequence = self._bus.latest_sequence() - 1
+            logger.info("Attached to frame bus %s (%s frames)", self.bus_name, self._bus.frame_shape)
+        except (FileNotFoundError, RuntimeError):
+            self._bus = None  # Missing, or still being created
+
+    def read(self, out=None):
+        """Wait for a frame newer than the last one read; like a camera, the bus never finishes"""
+        if self._bus is None or self._bus.is_closed():
+            # Publisher stopped or gone: drop the old mapping and look for a new bus
+            if self._bus is not None:
+                self._bus.close()
+                self._bus = None
+            self._attach()
+            if self._bus is None:
+                time.sleep(self.timeout)
+                return False, None
+
+        if out is not None and out.shape != self._bus.frame_shape:
+            out = None
+        deadline = time.perf_counter() + self.timeout
+        while time.perf_counter() < deadline:
+            latest = self._bus.latest_sequence()
+            if latest > self._last_sequence:
+                frame, _ = self._bus.read(latest, out)
+                if frame is not None:
+                    self.skipped_frames += latest - self._last_sequence - 1
+                    self._last_sequence = latest
+                    self.frames_read += 1
+                    return True, frame
+            time.sleep(0.002)
+
+        if self._bus.is_replaced():
+            # The publisher crashed and restarted; the next read attaches to its new bus
+            logger.warning("Frame bus %s was replaced by a restarted publisher, re-attaching", self.bus_name)
+            self._bus.close()
+            self._bus = None
+        return False, None
+
+    def release(self):
+        """Detach from the bus (the publisher keeps it)"""
+        if self._bus is not None:
+            self._bus.close()
+            self._bus = None
+
+
+def create_frame_source(settings):
+    """Pick the FrameSource for capture settings (see DEFAULT_CAPTURE_SETTINGS)"""
+    settings = dict(DEFAULT_CAPTURE_SETTINGS, **(settings or {}))
+    source = settings['source']
+    replay = {'pace': settings['pace'], 'loop': settings['loop']}
+
+    if isinstance(source, str) and source.startswith(FRAME_BUS_PREFIX):
+        return FrameBusSource(source[len(FRAME_BUS_PREFIX):])
+
+    if isinstance(source, int) or (isinstance(source, str) and (
+            source.isdigit() or source.startswith('/dev/video') or '://' in source)):
+        return CameraSource(settings)
+
+    if os.path.isdir(source):
+        if glob.glob(os.path.join(source, '*.npz')):
+            return NpzClipSource(source, fps=settings['fps'], **replay)
+        return ImageSequenceSource(source, fps=settings['fps'], **replay)
+
+    if source.lower().endswith('.npz'):
+        return NpzClipSource(source, fps=settings['fps'], **replay)
+
+    return VideoFileSource(source, settings=settings, **replay)
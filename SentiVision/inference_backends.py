@@ -0,0 +1,229 @@
+"""
+Inference backends for the SentiVision model
+
+Every backend loads one model file and implements the same contract:
+
+    probabilities, predicted_classes = backend.predict_batch(clips)
+
+where clips is a float32 array of shape (N, T, 224, 224, 3) produced by
+ModelInterface.preprocess_clip, probabilities has shape (N, num_classes) and
+predicted_classes has shape (N,). Heavy runtimes (TensorFlow, TFLite, ONNX
+Runtime) are imported only when their backend is created.
+
+New backends are added with the register_backend decorator and selected by
+name through the 'inference_backend' key in config.json.
+"""
+
+import logging
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+BACKENDS = {}
+
+
+def register_backend(name):
+    """Class decorator registering an inference backend under a config name"""
+    def decorator(backend_class):
+        backend_class.name = name
+        BACKENDS[name] = backend_class
+        return backend_class
+    return decorator
+
+
+def get_backend_class(name):
+    """Look up a registered backend class by name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name} (available: {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[name]
+
+
+def create_backend(name, model_path=None, **options):
+    """Create and load a registered backend"""
+    return get_backend_class(name)(model_path, **options)
+
+
+def softmax(logits):
+    """Numerically stable softmax over the last axis"""
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+class InferenceBackend:
+    """Base class for inference backends"""
+
+    name = None
+    default_model_path = None
+    # True if a new batch size makes the runtime re-plan the whole graph;
+    # batching callers then pad partial batches to one fixed size
+    pad_batches = False
+
+    def __init__(self, model_path, clip_length=20, input_size=(224, 224), num_threads=None, **options):
+        self.model_path = model_path
+        self.clip_length = clip_length
+        self.input_size = tuple(input_size)
+        self.num_threads = num_threads
+
+    def predict_batch(self, clips):
+        """Return (probabilities, predicted_classes) for a (N, T, H, W, 3) batch"""
+        raise NotImplementedError
+
+
+@register_backend('keras')
+class KerasBackend(InferenceBackend):
+    """Runs the Keras model, optionally as a graph-compiled tf.function"""
+
+    default_model_path = "models/SentiVision.keras"
+
+    def __init__(self, model_path, clip_length=20, input_size=(224, 224), num_threads=None,
+                 compile_inference=True, jit_compile=False, **options):
+        super().__init__(model_path, clip_length, input_size, num_threads)
+        import tensorflow as tf
+        import model_layers
+        self._tf = tf
+
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            except RuntimeError:
+                pass  # TensorFlow is already initialized; keep its thread pool
+
+        if model_path is None:
+            self.model = model_layers.create_mock_model(clip_length, input_size)
+        else:
+            self.model = model_layers.load_keras_model(model_path)
+
+        # Graph-compiled inference, traced and warmed up now so the first
+        # real prediction does not pay for it. The batch dimension is left
+        # open so batches of any size (see inference_server.py) reuse the trace
+        self._compiled_predict = None
+        self._compiled_input_shape = (None, clip_length) + self.input_size + (3,)
+        if compile_inference:
+            self._compiled_predict = self._build_compiled_predict(jit_compile)
+
+    def _build_compiled_predict(self, jit_compile):
+        """Trace and warm up a fused forward pass + softmax + argmax function"""
+        tf = self._tf
+        input_shape = self._compiled_input_shape
+        model = self.model
+
+        @tf.function(input_signature=[tf.TensorSpec(input_shape, tf.float32)],
+                     jit_compile=jit_compile)
+        def compiled_predict(video_tensor):
+            predictions = model(video_tensor, training=False)
+            if isinstance(predictions, (list, tuple)):
+                predictions = predictions[0]
+            return tf.nn.softmax(predictions), tf.argmax(predictions, axis=-1)
+
+        try:
+            logger.info("Compiling inference function%s...", ' with XLA' if jit_compile else '')
+            compiled_predict(tf.zeros((1,) + input_shape[1:], tf.float32))
+            logger.info("Inference function compiled")
+            return compiled_predict
+        except Exception as e:
+            logger.warning("Failed to compile inference function, using eager mode: %s", e)
+            return None
+
+    def predict_batch(self, clips):
+        """Return (probabilities, predicted_classes) for a (N, T, H, W, 3) batch"""
+        if self._compiled_predict is not None and clips.shape[1:] == self._compiled_input_shape[1:]:
+            probabilities, predicted_classes = self._compiled_predict(clips)
+            return probabilities.numpy(), predicted_classes.numpy()
+
+        predictions = self.model(clips, training=False)
+
+        # Handle different prediction output formats
+        if isinstance(predictions, (list, tuple)):
+            predictions = predictions[0]
+
+        probabilities = self._tf.nn.softmax(predictions).numpy()
+        return probabilities, probabilities.argmax(axis=-1)
+
+
+@register_backend('tflite')
+class TFLiteBackend(InferenceBackend):
+    """Runs a model exported with export_model.py in the TFLite interpreter"""
+
+    default_model_path = "models/SentiVision_float16.tflite"
+    pad_batches = True  # resize_tensor_input + allocate_tensors on every batch size change
+
+    def __init__(self, model_path, clip_length=20, input_size=(224, 224), num_threads=None, **options):
+        super().__init__(model_path, clip_length, input_size, num_threads)
+        interpreter_class = self._load_interpreter_class()
+        self.interpreter = interpreter_class(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self.input_details['shape'][0])
+
+    @staticmethod
+    def _load_interpreter_class():
+        """Find a TFLite interpreter, preferring the standalone runtimes over full TensorFlow"""
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+            return Interpreter
+        except ImportError:
+            pass
+        try:
+            from tflite_runtime.interpreter import Interpreter
+            return Interpreter
+        except ImportError:
+            import tensorflow as tf
+            return tf.lite.Interpreter
+
+    def predict_batch(self, clips):
+        """Return (probabilities, predicted_classes) for a (N, T, H, W, 3) batch"""
+        clips = np.asarray(clips, dtype=np.float32)
+
+        if clips.shape[0] != self._batch_size:
+            self.interpreter.resize_tensor_input(self.input_details['index'], clips.shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = clips.shape[0]
+
+        # Fully-quantized models take integer input; quantize with the model's own params
+        input_scale, input_zero_point = self.input_details['quantization']
+        if input_scale:
+            clips = np.round(clips / input_scale + input_zero_point).astype(self.input_details['dtype'])
+
+        self.interpreter.set_tensor(self.input_details['index'], clips)
+        self.interpreter.invoke()
+        outputs = self.interpreter.get_tensor(self.output_details['index'])
+
+        output_scale, output_zero_point = self.output_details['quantization']
+        if output_scale:
+            outputs = (outputs.astype(np.float32) - output_zero_point) * output_scale
+
+        probabilities = softmax(outputs.astype(np.float32))
+        return probabilities, probabilities.argmax(axis=-1)
+
+
+@register_backend('onnx')
+class OnnxBackend(InferenceBackend):
+    """Runs a model exported with export_model.py --format onnx in ONNX Runtime on CPU"""
+
+    default_model_path = "models/SentiVision.onnx"
+
+    def __init__(self, model_path, clip_length=20, input_size=(224, 224), num_threads=None, **options):
+        super().__init__(model_path, clip_length, input_size, num_threads)
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+
+        self.session = onnxruntime.InferenceSession(
+            model_path,
+            sess_options=session_options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_batch(self, clips):
+        """Return (probabilities, predicted_classes) for a (N, T, H, W, 3) batch"""
+        clips = np.asarray(clips, dtype=np.float32)
+        outputs = self.session.run(None, {self.input_name: clips})[0]
+        probabilities = softmax(outputs.astype(np.float32))
+        return probabilities, probabilities.argmax(axis=-1)
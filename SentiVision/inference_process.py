@@ -0,0 +1,385 @@
+"""
+Model inference in a dedicated worker process
+
+In the default thread mode the model runs on a thread of the monitor's own
+interpreter, next to capture, preview, preprocessing, the state machines and
+Firestore I/O, and every Python-level step of inference contends with them
+for the GIL. With "inference_mode": "process" the model is loaded in a worker
+process instead, and the monitor only preprocesses clips:
+
+- clips are handed over through slots in one multiprocessing.shared_memory
+  block, so the 12 MB model input is copied once into the slot instead of
+  being pickled through a pipe; only slot numbers and prediction dicts travel
+  through the queues
+- the worker runs every request waiting in its queue (up to max_batch_size)
+  as one batch, so several rooms share forward passes as with the
+  InferenceServer
+- a reader thread in the monitor resolves each request's Future; if the
+  worker dies (e.g. killed for running out of memory), waiting requests
+  fail instead of hanging and the worker is restarted with back-off, with
+  fresh queues and the same shared-memory block. If it cannot be restarted
+  max_restarts times in a row, `failed` is set and every request fails
+
+    inference = InferenceProcess({'backend': 'tflite', 'num_threads': 4}, clip_shape=(1, 20, 224, 224, 3))
+    prediction = inference.predict(video_tensor)
+    inference.close()
+
+The worker is started with the 'spawn' method, so it loads TensorFlow or the
+TFLite runtime itself instead of inheriting the monitor's threads.
+"""
+
+import time
+import logging
+import queue
+import threading
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import Future
+import numpy as np
+from metrics import default_registry, DEPTH_BUCKETS
+
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(shm_name, clip_shape, num_slots, model_options, max_batch_size, requests, responses):
+    """Worker process: load the model, then run requested slots in batches until None arrives"""
+    # Imported here so the monitor process never loads the model's runtime
+    from model_interface import ModelInterface
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = None
+    try:
+        slots = np.ndarray((num_slots,) + tuple(clip_shape[1:]), dtype=np.float32, buffer=shm.buf)
+        model_interface = ModelInterface(**model_options)
+        # Fixed-size batches for backends that re-plan the graph on a new batch size (see InferenceServer)
+        padded = None
+        if model_interface.pad_batches and max_batch_size > 1:
+            padded = np.zeros((max_batch_size,) + tuple(clip_shape[1:]), dtype=np.float32)
+        responses.put(('ready', None, None))
+
+        running = True
+        while running:
+            batch = [requests.get()]
+            while len(batch) < max_batch_size:
+                try:
+                    batch.append(requests.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [request for request in batch if request is not None]
+            if not batch:
+                continue
+
+            indices = [slot for _, slot in batch]
+            if padded is not None:
+                padded[:len(indices)] = slots[indices]
+                video_tensors = padded
+            elif len(indices) == 1:
+                video_tensors = slots[indices[0]:indices[0] + 1]  # A view; no copy
+            else:
+                video_tensors = slots[indices]
+            predictions = model_interface.predict_inputs(video_tensors)
+            for (request_id, _), prediction in zip(batch, predictions):
+                responses.put(('result', request_id, prediction))
+    except Exception as e:
+        responses.put(('error', None, f"{type(e).__name__}: {e}"))
+    finally:
+        del slots
+        shm.close()
+
+
+class InferenceProcess:
+    """Runs a ModelInterface in a worker process fed through shared-memory clip slots"""
+
+    def __init__(self, model_options, clip_shape, num_slots=4, max_batch_size=4,
+                 start_timeout=300.0, max_restarts=5, restart_delay=1.0, max_restart_delay=30.0,
+                 metrics=None):
+        """
+        Starts the worker and waits until its model is loaded.
+
+        Args:
+            model_options: Keyword arguments for the worker's ModelInterface
+                (backend, model_path, num_threads, ...)
+            clip_shape: Shape of one preprocessed clip, (1, T, H, W, 3)
+            num_slots: Clips that can be in flight at once; further
+                predict() calls wait for a free slot
+            max_batch_size: Most waiting clips the worker runs in one forward pass
+            start_timeout: Seconds to wait for the worker to load the model
+            max_restarts: Restart attempts after the worker dies before giving
+                up; the count resets once a restarted worker returns a result
+            restart_delay: Back-off before the first restart attempt; doubles
+                on each further attempt up to max_restart_delay
+            metrics: MetricsRegistry for the worker's batch sizes
+                (default: the shared registry)
+        """
+        self.clip_shape = tuple(clip_shape)
+        self.num_slots = num_slots
+        self.model_options = model_options
+        self.max_batch_size = max_batch_size
+        self.start_timeout = start_timeout
+        self.max_restarts = max_restarts
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.clip_count = 0
+        self.restart_count = 0
+        self.failed = False  # Set once the worker could not be restarted
+
+        metrics = metrics or default_registry()
+        self._slots_in_use = metrics.histogram(
+            'senticare_inference_slots_in_use', 'Shared-memory clip slots in use at each request',
+            buckets=DEPTH_BUCKETS)
+
+        slot_bytes = int(np.prod(self.clip_shape[1:])) * np.dtype(np.float32).itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=slot_bytes * num_slots)
+        self._slots = np.ndarray((num_slots,) + self.clip_shape[1:], dtype=np.float32, buffer=self._shm.buf)
+        self._free_slots = list(range(num_slots))
+        self._slot_condition = threading.Condition()
+
+        self._futures = {}  # request ID -> (Future, slot)
+        self._futures_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._running = True
+        self._ready = False  # A worker is running and accepting requests
+        self._restart_attempts = 0
+        self._process = None
+
+        try:
+            self._start_worker()
+        except RuntimeError:
+            self.close()
+            raise
+        self._ready = True
+
+        self._reader = threading.Thread(target=self._read_responses, name="inference-results", daemon=True)
+        self._reader.start()
+
+    def _start_worker(self):
+        """Start a worker process with fresh queues and wait until its model is loaded"""
+        context = multiprocessing.get_context('spawn')
+        self._requests = context.Queue()
+        self._responses = context.Queue()
+        self._process = process = context.Process(
+            target=_worker_main,
+            args=(self._shm.name, self.clip_shape, self.num_slots, self.model_options, self.max_batch_size,
+                  self._requests, self._responses),
+            name="inference-worker",
+            daemon=True
+        )
+        process.start()
+
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            try:
+                kind, _, error = self._responses.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    kind, error = 'error', f"worker exited with code {process.exitcode}"
+                elif not self._running:
+                    kind, error = 'error', "closed while starting"
+                elif time.monotonic() > deadline:
+                    kind, error = 'error', f"no model loaded after {self.start_timeout}s"
+                else:
+                    continue
+                break
+        if kind != 'ready':
+            if process.is_alive():
+                process.terminate()
+                process.join(1.0)
+            raise RuntimeError(f"Inference worker failed to start: {error}")
+        logger.info("Inference worker process started (pid %d, %d slots)", process.pid, self.num_slots)
+
+    def submit(self, video_tensor):
+        """
+        Copy a preprocessed (1, T, H, W, 3) clip into a free slot and queue it for the worker
+
+        Blocks while all slots are in use. The caller may reuse video_tensor
+        as soon as this returns. Raises RuntimeError while the worker is
+        being restarted and after close().
+
+        Returns:
+            Future resolving to the prediction dict (or None), as
+            ModelInterface.predict_input returns it
+        """
+        if tuple(video_tensor.shape) != self.clip_shape:
+            raise ValueError(f"Clip of shape {video_tensor.shape} does not fit slots of {self.clip_shape}")
+
+        with self._slot_condition:
+            while self._running and self._ready and not self._free_slots:
+                self._slot_condition.wait()
+            self._check_ready()
+            slot = self._free_slots.pop()
+            self._slots_in_use.observe(self.num_slots - len(self._free_slots))
+
+        np.copyto(self._slots[slot], video_tensor[0])
+        future = Future()
+        request_id = next(self._request_ids)
+        with self._slot_condition:
+            # The worker may have died during the copy; its queue is gone with it
+            try:
+                self._check_ready()
+            except RuntimeError:
+                self._free_slots.append(slot)
+                self._slot_condition.notify()
+                raise
+            with self._futures_lock:
+                self._futures[request_id] = (future, slot)
+            self._requests.put((request_id, slot))
+        return future
+
+    def _check_ready(self):
+        """Raise RuntimeError unless a worker accepts requests (called with the slot lock held)"""
+        if not self._running:
+            raise RuntimeError("Inference process is closed")
+        if not self._ready:
+            raise RuntimeError("Inference worker is restarting")
+
+    def predict(self, video_tensor, timeout=None):
+        """Submit a clip and wait for its prediction"""
+        return self.submit(video_tensor).result(timeout)
+
+    def _read_responses(self):
+        """Internal method - serves one worker after another; runs in the reader thread"""
+        while True:
+            error = self._serve_worker()
+            if error is None:
+                return  # Closed
+            logger.error("%s", error)
+            self._fail_in_flight(error)
+            if self._process.is_alive():
+                self._process.terminate()  # Reported an error; do not leave it running
+                self._process.join(1.0)
+            if not self._restart_worker():
+                return
+
+    def _serve_worker(self):
+        """Resolve futures from the current worker's responses; returns why it stopped, or None once closed"""
+        while True:
+            try:
+                kind, request_id, payload = self._responses.get(timeout=0.5)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    if not self._running:
+                        return None
+                    return f"Inference worker process exited (code {self._process.exitcode})"
+                continue
+            except (EOFError, OSError):
+                return None  # Queue closed by close()
+
+            if kind == 'error':
+                return f"Inference worker failed: {payload}"
+
+            with self._futures_lock:
+                future, slot = self._futures.pop(request_id, (None, None))
+            if future is not None:
+                self.clip_count += 1
+                self._restart_attempts = 0
+                self._release_slot(slot)
+                future.set_result(payload)
+
+    def _restart_worker(self):
+        """Start a new worker with back-off; returns False once closed or giving up"""
+        while True:
+            with self._slot_condition:
+                if self._running and self._restart_attempts < self.max_restarts:
+                    # close() cuts the back-off short
+                    self._slot_condition.wait(min(self.restart_delay * 2 ** self._restart_attempts,
+                                                  self.max_restart_delay))
+                if not self._running:
+                    return False
+                if self._restart_attempts >= self.max_restarts:
+                    break
+                self._restart_attempts += 1
+                attempt = self._restart_attempts
+
+            logger.warning("Restarting inference worker (attempt %d of %d)", attempt, self.max_restarts)
+            try:
+                self._start_worker()
+            except RuntimeError as e:
+                logger.error("%s", e)
+                continue
+
+            with self._slot_condition:
+                self.restart_count += 1
+                self._ready = True
+                self._slot_condition.notify_all()
+            return True
+
+        logger.error("Inference worker could not be restarted after %d attempts, giving up", self.max_restarts)
+        self.failed = True
+        self._fail_pending("Inference worker process could not be restarted")
+        return False
+
+    def _release_slot(self, slot):
+        """Return a slot to the free list"""
+        with self._slot_condition:
+            self._free_slots.append(slot)
+            self._slot_condition.notify()
+
+    def _fail_in_flight(self, message):
+        """Fail the requests a dead worker held and free their slots; refuse new ones until restarted"""
+        with self._slot_condition:
+            self._ready = False
+            with self._futures_lock:
+                pending, self._futures = list(self._futures.values()), {}
+            for _, slot in pending:
+                self._free_slots.append(slot)
+            self._slot_condition.notify_all()
+        for future, _ in pending:
+            future.set_exception(RuntimeError(message))
+
+    def _fail_pending(self, message):
+        """Fail every waiting request and refuse new ones"""
+        with self._slot_condition:
+            self._running = False
+            self._slot_condition.notify_all()
+        with self._futures_lock:
+            pending, self._futures = list(self._futures.values()), {}
+        for future, _ in pending:
+            future.set_exception(RuntimeError(message))
+
+    def is_alive(self):
+        """True while a worker process is running"""
+        return self._process is not None and self._process.is_alive()
+
+    def get_stats(self):
+        """Worker process state and clips run so far"""
+        return {
+            'pid': self._process.pid if self._process else None,
+            'alive': self.is_alive(),
+            'restarts': self.restart_count,
+            'failed': self.failed,
+            'clips': self.clip_count,
+            'free_slots': len(self._free_slots)
+        }
+
+    def close(self, timeout=10.0):
+        """Let the worker finish queued clips, stop it, and free the shared memory"""
+        with self._slot_condition:
+            self._running = False
+            self._slot_condition.notify_all()
+
+        if self.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout)
+        if self.is_alive():
+            logger.warning("Inference worker did not stop, terminating it")
+            self._process.terminate()
+            self._process.join(1.0)
+
+        reader = getattr(self, '_reader', None)
+        if reader is not None:
+            reader.join(2.0)
+        if self.is_alive():
+            # Started by a restart that raced with close()
+            self._process.terminate()
+            self._process.join(1.0)
+        self._fail_pending("Inference process is closed")
+
+        del self._slots
+        self._shm.close()
+        self._shm.unlink()
+        logger.info("Inference worker process stopped after %d clips", self.clip_count)
@@ -0,0 +1,179 @@
+"""
+Dynamic batching of inference requests from several cameras
+
+When several rooms share one ModelInterface, each room's inference stage
+would run its own batch-of-one forward pass. An InferenceServer collects
+the preprocessed clips the rooms submit into one batch and runs a single
+forward pass for all of them; on CPU a batched 3D convolution costs far
+less per clip than the same clips one at a time.
+
+A batch is dispatched as soon as max_batch_size clips are waiting, or
+max_wait seconds after its first clip arrived, whichever comes first, so
+a single active room waits at most max_wait for company. For backends that
+re-plan their graph whenever the batch size changes (TFLite), partial
+batches are padded to max_batch_size so the model always sees one shape.
+
+    server = InferenceServer(model_interface, max_batch_size=4, max_wait=0.02)
+    prediction = server.predict(video_tensor)  # From any room's inference stage
+    server.close()
+"""
+
+import logging
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from metrics import default_registry, DEPTH_BUCKETS
+
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServer:
+    """Background thread running queued clips through the model in dynamic batches"""
+
+    def __init__(self, model_interface, max_batch_size=4, max_wait=0.02, metrics=None):
+        """
+        Args:
+            model_interface: ModelInterface shared by the submitting cameras
+            max_batch_size: Most clips run in one forward pass
+            max_wait: Most seconds the first clip of a batch waits for more
+            metrics: MetricsRegistry for batch sizes and queueing delay
+                (default: the shared registry)
+        """
+        self.model_interface = model_interface
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_count = 0
+        self.clip_count = 0
+
+        metrics = metrics or default_registry()
+        self._batch_size_histogram = metrics.histogram(
+            'senticare_inference_batch_size', 'Clips per batched forward pass', buckets=DEPTH_BUCKETS)
+        self._queue_wait = metrics.histogram(
+            'senticare_inference_queue_seconds', 'Time a clip waits for its batch to start')
+
+        self._requests = deque()  # (video_tensor, future, submitted_at)
+        self._batch_buffer = None  # Reused (max_batch_size, T, H, W, 3) model input
+        self._pad_batches = getattr(model_interface, 'pad_batches', False)
+        self._condition = threading.Condition()
+        self._running = True
+
+        self._thread = threading.Thread(target=self._run, name="inference-server", daemon=True)
+        self._thread.start()
+
+    def submit(self, video_tensor):
+        """
+        Queue a preprocessed (1, T, H, W, 3) clip for the next batch
+
+        The clip is copied into the batch when the batch starts, so the caller
+        must not reuse or release video_tensor before the future resolves.
+
+        Returns:
+            Future resolving to the prediction dict (or None), as
+            ModelInterface.predict_input returns it
+        """
+        future = Future()
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Inference server is closed")
+            self._requests.append((video_tensor, future, time.perf_counter()))
+            self._condition.notify()
+        return future
+
+    def predict(self, video_tensor, timeout=None):
+        """Submit a clip and wait for its prediction"""
+        return self.submit(video_tensor).result(timeout)
+
+    def close(self, timeout=5.0):
+        """Run the clips already queued, then stop the worker thread"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout)
+
+        # Anything left (worker stuck past the timeout) fails instead of hanging its caller
+        with self._condition:
+            while self._requests:
+                _, future, _ = self._requests.popleft()
+                future.set_exception(RuntimeError("Inference server is closed"))
+
+        stats = self.get_stats()
+        if stats['batches']:
+            logger.info("Inference server ran %d clips in %d batches (%.2f clips per batch)",
+                        stats['clips'], stats['batches'], stats['mean_batch_size'])
+
+    def get_stats(self):
+        """Clips and batches run so far"""
+        return {
+            'clips': self.clip_count,
+            'batches': self.batch_count,
+            'mean_batch_size': self.clip_count / self.batch_count if self.batch_count else None
+        }
+
+    def _next_batch(self):
+        """Wait for a full batch or the first request's deadline; returns [] once closed and empty"""
+        with self._condition:
+            while self._running and not self._requests:
+                self._condition.wait()
+            if not self._requests:
+                return []
+
+            deadline = self._requests[0][2] + self.max_wait
+            while self._running and len(self._requests) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            count = min(len(self._requests), self.max_batch_size)
+            return [self._requests.popleft() for _ in range(count)]
+
+    def _run(self):
+        """Internal method - runs in the worker thread"""
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            started_at = time.perf_counter()
+            for _, _, submitted_at in batch:
+                self._queue_wait.observe(started_at - submitted_at)
+            self._batch_size_histogram.observe(len(batch))
+
+            try:
+                predictions = self.model_interface.predict_inputs(self._gather(batch))
+            except Exception as e:
+                logger.error("Error in batched inference: %s", e)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batch_count += 1
+            self.clip_count += len(batch)
+            # Predictions for padding rows are left unused by zip
+            for (_, future, _), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+
+    def _gather(self, batch):
+        """
+        Copy the batch's clips into the reused batch buffer
+
+        Returns a (N, T, H, W, 3) view, or with pad_batches the whole
+        (max_batch_size, T, H, W, 3) buffer: a partial batch then runs with
+        stale clips in its remaining rows. Computing those rows costs less
+        than the TFLite interpreter re-allocating the 3D-conv graph every
+        time a room waits alone past max_wait and the batch size changes.
+        """
+        clip_shape = batch[0][0].shape[1:]
+        if len(batch) == 1 and not self._pad_batches:
+            return batch[0][0]  # Already a batch of one; no copy needed
+
+        if self._batch_buffer is None or self._batch_buffer.shape[1:] != clip_shape:
+            self._batch_buffer = np.zeros((self.max_batch_size,) + clip_shape, dtype=np.float32)
+        for index, (video_tensor, _, _) in enumerate(batch):
+            self._batch_buffer[index] = video_tensor[0]
+        if self._pad_batches:
+            return self._batch_buffer
+        return self._batch_buffer[:len(batch)]
@@ -0,0 +1,123 @@
+"""
+In-process stand-in for firestore.Client
+
+Implements the part of the Firestore API FirebaseClient and FirestoreWriter
+use (collection().document(), collection().add(), DocumentReference.set(),
+batch().set() / commit()) against an in-memory dict, so the monitor can run
+without credentials or network access:
+
+    client = FirebaseClient("config.json", db=LocalFirestore(latency=0.05))
+
+Every round-trip (a direct write or a batch commit) sleeps for latency
+seconds to model the network, and raises ConnectionError while online is
+False to model an outage. SERVER_TIMESTAMP sentinels are stored as the
+commit time, as the server would.
+"""
+
+import time
+import threading
+from datetime import datetime, timezone
+from google.cloud import firestore
+from write_ahead_log import new_document_id
+
+
+class LocalDocumentReference:
+    """DocumentReference into a LocalFirestore"""
+
+    def __init__(self, db, collection, document_id):
+        self._db = db
+        self.id = document_id
+        self.path = f"{collection}/{document_id}"
+        self.collection_name = collection
+
+    def set(self, data):
+        """Write the document in its own round-trip"""
+        self._db._commit([(self, data)])
+
+    def get_data(self):
+        """Stored document data, or None if it was never written"""
+        with self._db._lock:
+            data = self._db.documents.get(self.path)
+            return dict(data) if data is not None else None
+
+
+class LocalCollection:
+    """CollectionReference into a LocalFirestore"""
+
+    def __init__(self, db, name):
+        self._db = db
+        self.name = name
+
+    def document(self, document_id=None):
+        """Reference to a document; a new random ID if none is given"""
+        return LocalDocumentReference(self._db, self.name, document_id or new_document_id())
+
+    def add(self, data):
+        """Create a document with a random ID; returns (update_time, reference) like collection.add()"""
+        doc_ref = self.document()
+        doc_ref.set(data)
+        return datetime.now(timezone.utc), doc_ref
+
+
+class LocalWriteBatch:
+    """WriteBatch committed to a LocalFirestore in one round-trip"""
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, doc_ref, data):
+        """Queue a document write"""
+        self._writes.append((doc_ref, data))
+
+    def commit(self):
+        """Apply all queued writes atomically"""
+        self._db._commit(self._writes)
+
+
+class LocalFirestore:
+    """In-memory Firestore with simulated round-trip latency and outages"""
+
+    def __init__(self, latency=0.0):
+        """
+        Args:
+            latency: Seconds every round-trip (write or batch commit) takes
+        """
+        self.latency = latency
+        self.online = True
+        self.documents = {}  # 'collection/document' -> data
+        self.round_trips = 0
+        self.written_documents = 0
+
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        """Reference to a collection"""
+        return LocalCollection(self, name)
+
+    def batch(self):
+        """New write batch"""
+        return LocalWriteBatch(self)
+
+    def count(self, collection):
+        """Number of documents stored in a collection"""
+        prefix = f"{collection}/"
+        with self._lock:
+            return sum(1 for path in self.documents if path.startswith(prefix))
+
+    def _commit(self, writes):
+        """One round-trip applying writes"""
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.online:
+            raise ConnectionError("Firestore unreachable")
+
+        committed_at = datetime.now(timezone.utc)
+        with self._lock:
+            for doc_ref, data in writes:
+                self.documents[doc_ref.path] = {
+                    key: committed_at if value is firestore.SERVER_TIMESTAMP else value
+                    for key, value in data.items()
+                }
+            self.round_trips += 1
+            self.written_documents += len(writes)
@@ -0,0 +1,168 @@
+"""
+Logging setup for the SentiCare monitor
+
+Library modules log through per-module loggers
+(logger = logging.getLogger(__name__)) and never print. configure_logging()
+is called once by the entry point (main.py, benchmark.py, the debug
+scripts) and installs on the root logger:
+
+- a QueueHandler: a logging call on the capture, inference or publisher
+  threads does no I/O, it only enqueues the record; a QueueListener thread
+  writes it to the console, so a slow console (or a blocked pipe) never
+  stalls the pipeline. The queue is bounded; when it is full, records
+  are dropped and counted instead of blocking the caller
+- a RateLimitFilter: every call site (logger and line) gets a token bucket
+  of burst records refilled at rate records per second. Suppressed records
+  are counted and reported with the next record from the same call site.
+  CRITICAL records are never suppressed
+
+Without configure_logging() (e.g. when the modules are imported by tests)
+only warnings and errors reach stderr, through Python's last-resort handler.
+"""
+
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# Libraries whose debug output would drown ours with --verbose; kept at WARNING
+THIRD_PARTY_LOGGERS = ('tensorflow', 'absl', 'h5py', 'urllib3', 'google', 'grpc')
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site; suppressed records are summarized in the next one let through"""
+
+    def __init__(self, rate=1.0, burst=10, clock=time.monotonic):
+        """
+        Args:
+            rate: Records per second each call site may log on average
+            burst: Records a call site may log at once before being limited
+            clock: Time source (seconds)
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.suppressed_count = 0
+        self._buckets = {}  # (logger name, line) -> [tokens, last refill time, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.CRITICAL:
+            return True
+
+        key = (record.name, record.lineno)
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                self.suppressed_count += 1
+                return False
+
+            bucket[0] -= 1.0
+            suppressed, bucket[2] = bucket[2], 0
+
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when its bounded queue is full instead of blocking"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped_count = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_count += 1
+
+
+class ConsoleListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for a full queue to drain instead of failing, up to a timeout"""
+
+    def stop(self, timeout=5.0):
+        """Write out queued records and stop the thread; gives up on a console blocked for timeout seconds"""
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+        except queue.Full:
+            return  # Console stuck; the daemon thread is abandoned
+        self._thread.join(timeout)
+        self._thread = None
+
+
+_listener = None
+_queue_handler = None
+_previous_root_level = None
+
+
+def configure_logging(level=logging.INFO, rate=1.0, burst=10, queue_size=10000, stream=None):
+    """
+    Route all logging through a rate-limited, bounded queue to a console writer thread
+
+    Calling it again replaces the previous configuration.
+
+    Args:
+        level: Root log level (logging.DEBUG with --verbose)
+        rate: Records per second each call site may log on average
+        burst: Records a call site may log at once before being limited
+        queue_size: Records waiting for the console before new ones are dropped
+        stream: Output stream (default: sys.stdout)
+
+    Returns:
+        The installed DroppingQueueHandler (its dropped_count and filters
+        show what was lost)
+    """
+    global _listener, _queue_handler, _previous_root_level
+    shutdown_logging()
+
+    console = logging.StreamHandler(stream or sys.stdout)
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+    _queue_handler.addFilter(RateLimitFilter(rate, burst))
+    _listener = ConsoleListener(_queue_handler.queue, console, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    _previous_root_level = root.level
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+    for name in THIRD_PARTY_LOGGERS:
+        logging.getLogger(name).setLevel(max(level, logging.WARNING))
+    return _queue_handler
+
+
+def shutdown_logging():
+    """Write out queued records and remove the handler installed by configure_logging()"""
+    global _listener, _queue_handler, _previous_root_level
+    if _queue_handler is not None:
+        root = logging.getLogger()
+        root.removeHandler(_queue_handler)
+        root.setLevel(_previous_root_level)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
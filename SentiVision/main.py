@@ -18,8 +18,11 @@ Requirements:
 
 import os
 import sys
+import json
+import logging
 import argparse
 from monitoring import Monitor
+from logging_setup import configure_logging
 
 
 def check_environment():
@@ -59,6 +62,19 @@ def check_environment():
         return False
 
 
+def setup_logging(config_path, verbose):
+    """Configure logging from log_level / log_rate_limit in the config; --verbose forces DEBUG"""
+    config = {}
+    try:
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        pass  # Reported by check_environment
+    
+    level = logging.DEBUG if verbose else getattr(logging, str(config.get('log_level', 'INFO')).upper(), logging.INFO)
+    configure_logging(level, rate=config.get('log_rate_limit', 1.0))
+
+
 def main():
     """Main entry point for SentiCare AI Client"""
     parser = argparse.ArgumentParser(
@@ -72,10 +88,11 @@ def main():
     parser.add_argument(
         '--verbose', 
         action='store_true',
-        help='Enable verbose logging'
+        help='Enable verbose logging (every prediction and Firestore commit, still rate limited)'
     )
     
     args = parser.parse_args()
+    setup_logging(args.config, args.verbose)
     
     print("=" * 60)
     print("SentiCare AI Client Application")
@@ -0,0 +1,419 @@
+"""
+Low-overhead metrics for the SentiCare monitor
+
+Components record into a MetricsRegistry (by default the shared
+default_registry()):
+
+- Counter: monotonically increasing count (frames captured, writes failed)
+- Gauge: current value, either set explicitly or read from a callback when
+  the metrics are collected (queue depth, writes pending)
+- Histogram: observations counted into fixed buckets (latencies, queue
+  depths); observe() is a bisect and two additions under a lock
+
+Every metric may carry constant labels, e.g. {'stage': 'inference'}; metrics
+with the same name and different labels are exported as one family.
+
+The registry is exported in the Prometheus text format by a MetricsServer
+on a local HTTP port (/metrics, and /metrics.json for the JSON form), and
+can be dumped to a JSON file periodically by a MetricsDumper.
+"""
+
+import logging
+import os
+import json
+import time
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from scheduler import default_scheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds; covers sub-millisecond frame copies up to multi-second Firestore retries
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds spent waiting for a lock; uncontended acquisitions land in the first bucket
+LOCK_WAIT_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0)
+
+# Items waiting in a queue
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+def _format_labels(labels, extra=None):
+    """Prometheus label set, e.g. {stage="inference",le="0.1"}"""
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+
+
+def _format_value(value):
+    """Prometheus sample value"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing count"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, help_text, labels=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = dict(labels or {})
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Add amount (must not be negative)"""
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def samples(self):
+        """(suffix, extra labels, value) tuples for the Prometheus text format"""
+        return [('_total', {}, self._value)]
+
+    def to_dict(self):
+        return self._value
+
+
+class Gauge:
+    """Current value, set explicitly or read from a callback at collection time"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, help_text, labels=None, callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = dict(labels or {})
+        self.callback = callback
+        self._value = 0.0
+
+    def set(self, value):
+        """Set the current value"""
+        self._value = value
+
+    @property
+    def value(self):
+        if self.callback is not None:
+            try:
+                return float(self.callback())
+            except Exception:
+                return float('nan')
+        return self._value
+
+    def samples(self):
+        return [('', {}, self.value)]
+
+    def to_dict(self):
+        return self.value
+
+
+class Histogram:
+    """Observations counted into fixed buckets, with their count and sum"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = dict(labels or {})
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last entry: above the largest bucket
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+
+    def time(self):
+        """Context manager observing the duration of its block"""
+        return _HistogramTimer(self)
+
+    @property
+    def count(self):
+        return self._count
+
+    def snapshot(self):
+        """(cumulative bucket counts, count, sum) taken atomically"""
+        with self._lock:
+            counts = list(self._counts)
+            count, total = self._count, self._sum
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, count, total
+
+    def quantile(self, q, snapshot=None):
+        """Estimate of the q-quantile, interpolated within its bucket like Prometheus histogram_quantile"""
+        cumulative, count, _ = snapshot or self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        index = next(i for i, value in enumerate(cumulative) if value >= rank)
+        if index == len(self.buckets):
+            return self.buckets[-1]  # Above the largest bucket: its bound is the best estimate
+        lower = self.buckets[index - 1] if index else 0.0
+        below = cumulative[index - 1] if index else 0
+        in_bucket = cumulative[index] - below
+        return lower + (self.buckets[index] - lower) * (rank - below) / in_bucket
+
+    def samples(self):
+        cumulative, count, total = self.snapshot()
+        samples = [
+            ('_bucket', {'le': bound}, value)
+            for bound, value in zip(self.buckets + (float('inf'),), cumulative)
+        ]
+        samples.append(('_sum', {}, total))
+        samples.append(('_count', {}, count))
+        return samples
+
+    def to_dict(self):
+        snapshot = self.snapshot()
+        cumulative, count, total = snapshot
+        return {
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else None,
+            'p50': self.quantile(0.5, snapshot),
+            'p95': self.quantile(0.95, snapshot),
+            'p99': self.quantile(0.99, snapshot),
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], cumulative))
+        }
+
+
+class _HistogramTimer:
+    """Context manager returned by Histogram.time()"""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.perf_counter() - self._start)
+
+
+class TimedLock:
+    """threading.Lock that records how long each acquisition waited"""
+
+    def __init__(self, wait_histogram):
+        self.wait_histogram = wait_histogram
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self.wait_histogram.observe(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class MetricsRegistry:
+    """Named metrics, created on first use and shared by everyone asking for the same name and labels"""
+
+    def __init__(self):
+        self._metrics = {}  # (name, sorted labels) -> metric
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=None):
+        """Get or create a Counter"""
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=None, callback=None):
+        """Get or create a Gauge; a callback replaces the one of an existing gauge"""
+        gauge = self._get_or_create(Gauge, name, help_text, labels)
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        """Get or create a Histogram"""
+        return self._get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+    def _get_or_create(self, metric_class, name, help_text, labels, **options):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = metric_class(name, help_text, labels, **options)
+                self._metrics[key] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} already registered as a {metric.type_name}")
+            return metric
+
+    def get(self, name, labels=None):
+        """Registered metric, or None"""
+        with self._lock:
+            return self._metrics.get((name, tuple(sorted((labels or {}).items()))))
+
+    def _families(self):
+        """Metrics grouped by name, in registration order"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+        return families
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, metrics in self._families().items():
+            lines.append(f"# HELP {name} {metrics[0].help_text}")
+            lines.append(f"# TYPE {name} {metrics[0].type_name}")
+            for metric in metrics:
+                for suffix, extra_labels, value in metric.samples():
+                    extra = {key: _format_value(bound) for key, bound in extra_labels.items()}
+                    lines.append(f"{name}{suffix}{_format_labels(metric.labels, extra)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        """All metrics as {name: value} (or {name: [{'labels': ..., 'value': ...}]} for labelled families)"""
+        result = {}
+        for name, metrics in self._families().items():
+            if len(metrics) == 1 and not metrics[0].labels:
+                result[name] = metrics[0].to_dict()
+            else:
+                result[name] = [{'labels': metric.labels, 'value': metric.to_dict()} for metric in metrics]
+        return result
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def default_registry():
+    """Shared MetricsRegistry for the process"""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = MetricsRegistry()
+        return _default_registry
+
+
+class MetricsServer:
+    """Serves a registry on a local HTTP port: /metrics (Prometheus text) and /metrics.json"""
+
+    def __init__(self, registry=None, host='127.0.0.1', port=9464):
+        """
+        Args:
+            registry: MetricsRegistry to serve (default: default_registry())
+            host: Interface to listen on; localhost keeps the endpoint off the network
+            port: TCP port (0 picks a free one, see self.port)
+        """
+        self.registry = registry or default_registry()
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body = registry.render_prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/metrics.json':
+                    body = json.dumps(registry.to_dict()).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes are too frequent to log
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host = host
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        """Serve requests in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info("Metrics available at http://%s:%d/metrics", self.host, self.port)
+
+    def stop(self):
+        """Stop serving and close the port"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self._server.server_close()
+
+
+class MetricsDumper:
+    """Writes a registry to a JSON file every interval seconds"""
+
+    def __init__(self, path, registry=None, interval=60.0, scheduler=None):
+        """
+        Args:
+            path: JSON file; replaced atomically on every dump
+            registry: MetricsRegistry to dump (default: default_registry())
+            interval: Seconds between dumps
+            scheduler: Scheduler running the dumps (default: the shared scheduler thread)
+        """
+        self.path = path
+        self.registry = registry or default_registry()
+        self.interval = interval
+        self.scheduler = scheduler or default_scheduler()
+        self._job = None
+
+    def start(self):
+        """Dump every interval seconds"""
+        self._job = self.scheduler.call_every(self.interval, self.dump)
+
+    def stop(self):
+        """Stop the periodic dumps and write a final one"""
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
+        self.dump()
+
+    def dump(self):
+        """Write the current metrics"""
+        data = {'timestamp': time.time(), 'metrics': self.registry.to_dict()}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error("Error writing metrics to %s: %s", self.path, e)
@@ -1,140 +1,97 @@
-import tensorflow as tf
+import logging
 import numpy as np
 import os
-import einops
+import cv2
+import threading
+from collections import OrderedDict
+from inference_backends import create_backend, get_backend_class
+
+
+logger = logging.getLogger(__name__)
 
-# Suppress TensorFlow verbose output
-import os
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Hide INFO and WARNING messages
-tf.get_logger().setLevel('ERROR')
-import warnings
-warnings.filterwarnings('ignore')
-
-# Custom layer definitions from your training script
-class Conv2Plus1D(tf.keras.layers.Layer):
-    def __init__(self, filters, kernel_size, padding, **kwargs):
-        super().__init__(**kwargs)
-        self.filters = filters
-        self.kernel_size = kernel_size
-        self.padding = padding
-        self.seq = tf.keras.Sequential([
-            # Spatial decomposition
-            tf.keras.layers.Conv3D(filters=filters,
-                          kernel_size=(1, kernel_size[1], kernel_size[2]),
-                          padding=padding),
-            # Temporal decomposition
-            tf.keras.layers.Conv3D(filters=filters,
-                          kernel_size=(kernel_size[0], 1, 1),
-                          padding=padding)
-        ])
-
-    def call(self, x):
-        return self.seq(x)
-    
-    def get_config(self):
-        config = super().get_config()
-        config.update({
-            'filters': self.filters,
-            'kernel_size': self.kernel_size,
-            'padding': self.padding
-        })
-        return config
-
-class ResidualMain(tf.keras.layers.Layer):
-    def __init__(self, filters, kernel_size, **kwargs):
-        super().__init__(**kwargs)
-        self.filters = filters
-        self.kernel_size = kernel_size
-        self.seq = tf.keras.Sequential([
-            Conv2Plus1D(filters=filters,
-                        kernel_size=kernel_size,
-                        padding='same'),
-            tf.keras.layers.LayerNormalization(),
-            tf.keras.layers.ReLU(),
-            Conv2Plus1D(filters=filters,
-                        kernel_size=kernel_size,
-                        padding='same'),
-            tf.keras.layers.LayerNormalization()
-        ])
-
-    def call(self, x):
-        return self.seq(x)
-    
-    def get_config(self):
-        config = super().get_config()
-        config.update({
-            'filters': self.filters,
-            'kernel_size': self.kernel_size
-        })
-        return config
-
-class Project(tf.keras.layers.Layer):
-    def __init__(self, units, **kwargs):
-        super().__init__(**kwargs)
-        self.units = units
-        self.seq = tf.keras.Sequential([
-            tf.keras.layers.Dense(units),
-            tf.keras.layers.LayerNormalization()
-        ])
-
-    def call(self, x):
-        return self.seq(x)
-    
-    def get_config(self):
-        config = super().get_config()
-        config.update({'units': self.units})
-        return config
-
-class ResizeVideo(tf.keras.layers.Layer):
-    def __init__(self, height, width, **kwargs):
-        super().__init__(**kwargs)
-        self.height = height
-        self.width = width
-        self.resizing_layer = tf.keras.layers.Resizing(self.height, self.width)
-
-    def call(self, video):
-        old_shape = einops.parse_shape(video, 'b t h w c')
-        images = einops.rearrange(video, 'b t h w c -> (b t) h w c')
-        images = self.resizing_layer(images)
-        videos = einops.rearrange(
-            images, '(b t) h w c -> b t h w c',
-            t = old_shape['t'])
-        return videos
-    
-    def get_config(self):
-        config = super().get_config()
-        config.update({
-            'height': self.height,
-            'width': self.width
-        })
-        return config
+
+def letterbox_geometry(frame_height, frame_width, target_height, target_width):
+    """(resized_height, resized_width, top, left) of a frame letterboxed like tf.image.resize_with_pad"""
+    ratio = max(frame_width / target_width, frame_height / target_height)
+    resized_height = int(frame_height / ratio)
+    resized_width = int(frame_width / ratio)
+    top = max(0, int((target_height - frame_height / ratio) / 2))
+    left = max(0, int((target_width - frame_width / ratio) / 2))
+    return resized_height, resized_width, top, left
 
 
 class ModelInterface:
 
-    def __init__(self):
+    def __init__(self, input_size=(224, 224), bgr_input=True, frame_cache_size=64,
+                 clip_length=20, backend='keras', model_path=None, num_threads=None,
+                 compile_inference=True, jit_compile=False, min_confidence=0.65):
+        """
+        Initialize the model interface
+
+        Args:
+            input_size: (height, width) the model expects for each frame
+            bgr_input: True if clips come from OpenCV in BGR order; they are
+                flipped to the RGB order the model was trained on
+            frame_cache_size: Number of preprocessed frames kept, keyed by the
+                Webcam sequence ID, so overlapping clips are not reprocessed;
+                0 disables the cache
+            clip_length: Number of frames per clip the model expects
+            backend: Registered inference backend name (see inference_backends):
+                'keras', 'tflite' or 'onnx'; None loads no model, for a
+                preprocessing-only interface whose clips are run elsewhere
+                (see inference_process.py)
+            model_path: Model file for the backend, relative to this directory
+                (default: the backend's default_model_path)
+            num_threads: CPU threads for the inference runtime
+            compile_inference: Keras only; run the forward pass, softmax and
+                argmax as one tf.function with a fixed input signature
+            jit_compile: Keras only; additionally compile that function with XLA
+            min_confidence: Predictions at or below this confidence are dropped
+                (use 0 to keep every prediction, e.g. for a TemporalFilter)
+        """
+        self.input_size = tuple(input_size)
+        self.clip_length = clip_length
+        self.bgr_input = bgr_input
+        self.frame_cache_size = frame_cache_size
+        self.min_confidence = min_confidence
+
+        # Reusable preprocessing buffers (see preprocess_clip)
+        self._input_buffer = None
+        self._input_geometry = None
+        self._resize_buffer = None
+
+        # LRU of (source, sequence ID) -> preprocessed (resized, normalized) frame
+        self._frame_cache = OrderedDict()
+        self.frame_cache_hits = 0
+        self.frame_cache_misses = 0
+
+        # One model serves every room: preprocessing state and the backend
+        # (TFLite interpreters are not thread-safe) are used by one thread at a time
+        self._preprocess_lock = threading.Lock()
+        self._inference_lock = threading.Lock()
+
+        # Pool of batch buffers handed out by preprocess_clip(..., pooled=True)
+        self._pool_lock = threading.Lock()
+        self._input_pool = []
+        self._pool_members = []
+
+        backend_options = {
+            'clip_length': clip_length,
+            'input_size': self.input_size,
+            'num_threads': num_threads,
+            'compile_inference': compile_inference,
+            'jit_compile': jit_compile
+        }
+
         # Get the directory where this script is located
         script_dir = os.path.dirname(os.path.abspath(__file__))
         
         # Load SentiVision model only
-        model_path = os.path.join(script_dir, "models/SentiVision.keras")
-        
-        if os.path.exists(model_path):
-            try:
-                print(f"Loading SentiVision model (this may take 30-60 seconds)...")
-                # Try loading with custom objects and without compilation first
-                self.model = self._load_model_safely(model_path)
-                print("SentiVision model loaded successfully")
-            except Exception as e:
-                print(f"Failed to load SentiVision model: {str(e)}")
-                print("Creating mock model for testing...")
-                self.model = self._create_mock_model()
-                print("Mock model created")
+        if backend is None:
+            self.backend = None
+            logger.info("No model loaded in this process; clips are run by the inference worker")
         else:
-            print(f"SentiVision model not found at: {model_path}")
-            print("Creating mock model for testing...")
-            self.model = self._create_mock_model()
-            print("Mock model created")
+            self.backend = self._load_backend(backend, model_path, script_dir, backend_options)
         
         # Mapping from keras model outputs to specification states
         self.label_mapping = {
@@ -153,71 +110,91 @@ class ModelInterface:
         # Critical events that require immediate alerts
         self.critical_events = {1}  # fall detection
 
-    def _load_model_safely(self, model_path):
-        """Safely load the model with various fallback strategies"""
-        # Strategy 1: Try loading without compilation
-        try:
-            with tf.device('/CPU:0'):  # Force CPU to avoid GPU issues
-                return tf.keras.models.load_model(model_path, compile=False)
-        except Exception as e1:
-            # Strategy 2: Try with custom objects (for Conv2D issues)
+    def _load_backend(self, backend, model_path, script_dir, backend_options):
+        """Create the backend, falling back to the mock model if the model file is missing or broken"""
+        backend_class = get_backend_class(backend)
+        model_path = os.path.join(script_dir, model_path or backend_class.default_model_path)
+        
+        if os.path.exists(model_path):
             try:
-                custom_objects = {
-                    'Conv2Plus1D': Conv2Plus1D,
-                    'ResidualMain': ResidualMain,
-                    'Project': Project,
-                    'ResizeVideo': ResizeVideo,
-                }
-                with tf.device('/CPU:0'):
-                    return tf.keras.models.load_model(model_path, custom_objects=custom_objects, compile=False)
-            except Exception as e2:
-                # Strategy 3: Try loading with safe_mode
-                try:
-                    with tf.device('/CPU:0'):
-                        return tf.keras.models.load_model(model_path, compile=False, safe_mode=False)
-                except Exception as e3:
-                    raise Exception(f"Model loading failed. Conv2D error likely due to version incompatibility: {str(e3)}")
-
-    def _create_mock_model(self):
-        """Create a simple mock model for testing when real model fails to load"""
-        inputs = tf.keras.Input(shape=(20, 224, 224, 3))
-        x = tf.keras.layers.GlobalAveragePooling3D()(inputs)
-        outputs = tf.keras.layers.Dense(10, activation='softmax')(x)
-        model = tf.keras.Model(inputs, outputs)
-        return model
-
-    def predict(self, video):
+                if backend == 'keras':
+                    logger.info("Loading SentiVision model (this may take 30-60 seconds)...")
+                else:
+                    logger.info("Loading SentiVision model with the %s backend: %s", backend, model_path)
+                loaded = create_backend(backend, model_path, **backend_options)
+                logger.info("SentiVision model loaded successfully")
+                return loaded
+            except Exception as e:
+                logger.error("Failed to load SentiVision model: %s", e)
+        else:
+            logger.warning("SentiVision model not found at: %s", model_path)
+        
+        logger.warning("Creating mock model for testing...")
+        mock = create_backend('keras', None, **backend_options)
+        logger.warning("Mock model created")
+        return mock
+
+    @property
+    def pad_batches(self):
+        """True if batches should always have the same size (see InferenceBackend.pad_batches)"""
+        return self.backend is not None and self.backend.pad_batches
+
+    def _run_model(self, video_tensor):
+        """Run the backend and return (probabilities, predicted_classes) for a (N, T, H, W, 3) batch"""
+        with self._inference_lock:
+            return self.backend.predict_batch(video_tensor)
+
+    def predict(self, video, sequence_ids=None):
+        """
+        Run the model on a clip
+
+        Args:
+            video: Clip of shape (T, H, W, 3) or a list of frames
+            sequence_ids: Optional Webcam sequence IDs of the frames; when
+                given, frames preprocessed for an earlier clip are reused
+        """
         try:
-            # Suppress all numpy array printing
-            original_printoptions = np.get_printoptions()
-            np.set_printoptions(suppress=True, threshold=0)
-            
-            video_tensor = self.convert_to_tensor(video)
-            
-            # Run prediction with output suppression
-            import sys
-            from io import StringIO
-            old_stdout = sys.stdout
-            sys.stdout = StringIO()  # Redirect stdout to suppress prints
-            
-            try:
-                predictions = self.model(video_tensor)
-            finally:
-                sys.stdout = old_stdout  # Restore stdout
-                np.set_printoptions(**original_printoptions)  # Restore numpy settings
-            
-            # Handle different prediction output formats
-            if isinstance(predictions, (list, tuple)):
-                predictions = predictions[0]
-            
-            # Get probabilities and predicted class
-            probabilities = tf.nn.softmax(predictions).numpy()
-            predicted_class = int(tf.argmax(predictions, axis=-1).numpy().flatten()[0])
-            confidence_score = float(probabilities.flatten()[predicted_class])
+            video_tensor = self.convert_to_tensor(video, sequence_ids)
+        except Exception as e:
+            logger.error("Prediction error: %s", e)
+            return self._default_prediction()
+        return self.predict_input(video_tensor)
+
+    def predict_input(self, video_tensor):
+        """
+        Run the model on an already preprocessed (1, T, H, W, 3) batch
+
+        Returns the prediction dict, including the full 'probabilities' vector
+        over the raw classes, or None if confidence is too low
+        """
+        return self.predict_inputs(video_tensor)[0]
+
+    def predict_inputs(self, video_tensors):
+        """
+        Run the model once on a (N, T, H, W, 3) batch of preprocessed clips
+
+        Returns one prediction (or None) per clip, as predict_input does;
+        InferenceServer uses this to serve clips from several cameras with
+        one forward pass.
+        """
+        try:
+            probabilities, predicted_classes = self._run_model(video_tensors)
+        except Exception as e:
+            logger.error("Prediction error: %s", e)
+            return [self._default_prediction() for _ in range(len(video_tensors))]
+        return [
+            self._make_prediction(clip_probabilities, int(predicted_class))
+            for clip_probabilities, predicted_class in zip(probabilities, predicted_classes)
+        ]
+
+    def _make_prediction(self, probabilities, predicted_class):
+        """Prediction dict for one clip's model output, or None if confidence is too low"""
+        try:
+            confidence_score = float(probabilities[predicted_class])
             
             # Ensure predicted_class is within valid range
             if predicted_class >= len(self.label_mapping):
-                print(f"Warning: Predicted class {predicted_class} out of range, defaulting to IDLE")
+                logger.warning("Predicted class %d out of range, defaulting to IDLE", predicted_class)
                 predicted_class = 9  # Default to 'other' class
                 confidence_score = 0.5
             
@@ -231,11 +208,11 @@ class ModelInterface:
             valid_states = {'IDLE', 'SITTING', 'WALKING', 'STANDING', 'IN_BED', 'NOT_PRESENT'}
             valid_critical_events = {'FALL_DETECTED', 'HELP_SIGNAL_DETECTED'}
             
-            if confidence_score <= 0.65:
+            if confidence_score <= self.min_confidence:
                 return None
 
             if mapped_state not in valid_states and mapped_state not in valid_critical_events:
-                print(f"Warning: Invalid state {mapped_state}, defaulting to IDLE")
+                logger.warning("Invalid state %s, defaulting to IDLE", mapped_state)
                 mapped_state = "IDLE"
                 is_critical = False
 
@@ -244,35 +221,162 @@ class ModelInterface:
                 'confidence': confidence_score,
                 'is_critical': is_critical,
                 'raw_class': int(predicted_class),
-                'firebase_compatible': True  # Flag to indicate Firebase compatibility
+                'firebase_compatible': True,  # Flag to indicate Firebase compatibility
+                'probabilities': np.asarray(probabilities, dtype=np.float64).tolist()
             }
             
-            # Only print concise prediction info
-            print(f"{mapped_state} ({confidence_score:.1%})")
+            # Hot path: only visible with --verbose, and rate limited
+            logger.debug("%s (%.1f%%)", mapped_state, confidence_score * 100)
             return result
             
         except Exception as e:
-            print(f"Prediction error: {str(e)}")
-            # Return a safe default prediction
-            return {
-                'state': 'IDLE',
-                'confidence': 0.5,
-                'is_critical': False,
-                'raw_class': 9,
-                'firebase_compatible': True
-            }
+            logger.error("Prediction error: %s", e)
+            return self._default_prediction()
+
+    def _default_prediction(self):
+        """Safe default prediction returned when inference fails"""
+        return {
+            'state': 'IDLE',
+            'confidence': 0.5,
+            'is_critical': False,
+            'raw_class': 9,
+            'firebase_compatible': True
+        }
+
+    def convert_to_tensor(self, video, sequence_ids=None):
+        """Convert a clip into a (1, T, H, W, 3) model input batch"""
+        return self.preprocess_clip(video, sequence_ids)
+
+    def release_input_buffer(self, buffer):
+        """Return a batch from preprocess_clip(..., pooled=True) to the buffer pool"""
+        with self._pool_lock:
+            # Ignore buffers from before a geometry change
+            if any(member is buffer for member in self._pool_members):
+                self._input_pool.append(buffer)
+
+    def _acquire_input_buffer(self, shape):
+        """Take a zero-padded batch buffer from the pool, allocating if it is empty"""
+        with self._pool_lock:
+            if self._input_pool:
+                return self._input_pool.pop()
+            buffer = np.zeros(shape, dtype=np.float32)
+            self._pool_members.append(buffer)
+            return buffer
+
+    def preprocess_clip(self, video, sequence_ids=None, pooled=False, source=None):
+        """
+          Letterbox-resize and normalize a whole clip in one pass.
+
+          Equivalent to running format_frames on every frame and stacking the
+          results, but the letterbox geometry is computed once per clip, frames
+          are resized with OpenCV into a reused scratch buffer, and the dtype
+          conversion and BGR->RGB flip are a single vectorized NumPy operation
+          written straight into a preallocated output batch.
+
+          When sequence_ids are given and frame_cache_size is positive, only
+          frames whose ID is not in the preprocessed-frame cache are resized;
+          cached frames are copied in.
+
+          Args:
+            video: Array of shape (T, H, W, 3) or a list of (H, W, 3) frames.
+            sequence_ids: Optional per-frame IDs, unique per captured frame.
+            pooled: Write into a buffer taken from a pool instead of the single
+              shared buffer, so several batches can be in flight at once.
+            source: Camera the frames come from, when several cameras share
+              this ModelInterface; sequence IDs are only unique per camera.
+
+          Return:
+            Float32 array of shape (1, T, height, width, 3). Unless pooled, the
+            buffer is reused by the next call, so consume it before
+            preprocessing again; pooled buffers are owned by the caller until
+            passed to release_input_buffer.
+        """
+        with self._preprocess_lock:
+            return self._preprocess_clip(video, sequence_ids, pooled, source)
+
+    def _preprocess_clip(self, video, sequence_ids, pooled, source):
+        """preprocess_clip (called with the preprocess lock held)"""
+        num_frames = len(video)
+        frame_height, frame_width = video[0].shape[:2]
+        dtype = np.asarray(video[0]).dtype
+        target_height, target_width = self.input_size
+
+        resized_height, resized_width, top, left = letterbox_geometry(
+            frame_height, frame_width, target_height, target_width
+        )
+
+        geometry = (num_frames, resized_height, resized_width, top, left, dtype)
+        batch_shape = (1, num_frames, target_height, target_width, 3)
+        if self._input_geometry != geometry:
+            # Padding stays zero between calls as long as the geometry is unchanged.
+            # Cameras sharing the model should deliver the same frame size (or use
+            # capture resize_to), otherwise every switch between them lands here
+            self._input_buffer = np.zeros(batch_shape, dtype=np.float32)
+            self._input_geometry = geometry
+            self._frame_cache.clear()
+            with self._pool_lock:
+                self._input_pool.clear()
+                self._pool_members.clear()
+
+        output = self._acquire_input_buffer(batch_shape) if pooled else self._input_buffer
+
+        # Integer frames are scaled to [0, 1]; float frames are assumed to be already
+        # in range, matching tf.image.convert_image_dtype
+        scale = 1.0 / np.iinfo(dtype).max if np.issubdtype(dtype, np.integer) else 1.0
+        target = output[0, :, top:top + resized_height, left:left + resized_width]
+
+        if sequence_ids is not None and self.frame_cache_size > 0:
+            self._preprocess_incremental(video, sequence_ids, target, scale, source)
+            return output
+
+        if (resized_height, resized_width) == (frame_height, frame_width):
+            resized = video if isinstance(video, np.ndarray) else np.stack(video)
+        else:
+            resize_shape = (num_frames, resized_height, resized_width, 3)
+            if self._resize_buffer is None or self._resize_buffer.shape != resize_shape or self._resize_buffer.dtype != dtype:
+                self._resize_buffer = np.empty(resize_shape, dtype=dtype)
+            resized = self._resize_buffer
+            for index, frame in enumerate(video):
+                cv2.resize(frame, (resized_width, resized_height), dst=resized[index],
+                           interpolation=cv2.INTER_LINEAR)
+
+        if self.bgr_input:
+            resized = resized[..., ::-1]
+
+        np.multiply(resized, scale, out=target, casting='unsafe')
+        return output
+
+    def _preprocess_incremental(self, video, sequence_ids, target, scale, source=None):
+        """Fill target frame by frame, preprocessing only frames missing from the cache"""
+        resized_height, resized_width = target.shape[1:3]
+        resize_shape = (resized_height, resized_width, 3)
+        needs_resize = video[0].shape[:2] != (resized_height, resized_width)
 
-    def convert_to_tensor(self, video):
-        formatted_frames = []
+        for index, sequence_id in enumerate(sequence_ids):
+            cache_key = (source, int(sequence_id))
+            cached = self._frame_cache.get(cache_key)
 
-        for image in video:
-            formatted_image = self.format_frames(image)
-            formatted_frames.append(formatted_image)
+            if cached is not None:
+                self._frame_cache.move_to_end(cache_key)
+                np.copyto(target[index], cached)
+                self.frame_cache_hits += 1
+                continue
 
-        video_tensor = tf.stack(formatted_frames)  # Shape: (20, 224, 224, 3)
-        video_tensor = tf.expand_dims(video_tensor, axis=0)  # Shape: (1, 20, 224, 224, 3)
+            frame = video[index]
+            if needs_resize:
+                frame = cv2.resize(frame, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+            if self.bgr_input:
+                frame = frame[..., ::-1]
+            np.multiply(frame, scale, out=target[index], casting='unsafe')
+            self.frame_cache_misses += 1
 
-        return video_tensor
+            # Recycle the evicted entry's array instead of allocating a new one
+            if len(self._frame_cache) >= self.frame_cache_size:
+                _, entry = self._frame_cache.popitem(last=False)
+            else:
+                entry = np.empty(resize_shape, dtype=np.float32)
+            np.copyto(entry, target[index])
+            self._frame_cache[cache_key] = entry
 
     def format_frames(self, frame):
         """
@@ -285,6 +389,7 @@ class ModelInterface:
           Return:
             Formatted frame with padding of specified output size.
         """
+        import tensorflow as tf
         frame = tf.image.convert_image_dtype(frame, tf.float32)
         frame = tf.image.resize_with_pad(frame, *(224,224))
         return frame
@@ -0,0 +1,150 @@
+"""
+Keras definitions for the SentiVision model
+
+Importing this module imports TensorFlow, so it is only loaded by the Keras
+inference backend and the export tool.
+"""
+
+import os
+import einops
+
+# Suppress TensorFlow verbose output
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Hide INFO and WARNING messages
+import tensorflow as tf
+tf.get_logger().setLevel('ERROR')
+import warnings
+warnings.filterwarnings('ignore')
+
+# Custom layer definitions from your training script
+class Conv2Plus1D(tf.keras.layers.Layer):
+    def __init__(self, filters, kernel_size, padding, **kwargs):
+        super().__init__(**kwargs)
+        self.filters = filters
+        self.kernel_size = kernel_size
+        self.padding = padding
+        self.seq = tf.keras.Sequential([
+            # Spatial decomposition
+            tf.keras.layers.Conv3D(filters=filters,
+                          kernel_size=(1, kernel_size[1], kernel_size[2]),
+                          padding=padding),
+            # Temporal decomposition
+            tf.keras.layers.Conv3D(filters=filters,
+                          kernel_size=(kernel_size[0], 1, 1),
+                          padding=padding)
+        ])
+
+    def call(self, x):
+        return self.seq(x)
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({
+            'filters': self.filters,
+            'kernel_size': self.kernel_size,
+            'padding': self.padding
+        })
+        return config
+
+class ResidualMain(tf.keras.layers.Layer):
+    def __init__(self, filters, kernel_size, **kwargs):
+        super().__init__(**kwargs)
+        self.filters = filters
+        self.kernel_size = kernel_size
+        self.seq = tf.keras.Sequential([
+            Conv2Plus1D(filters=filters,
+                        kernel_size=kernel_size,
+                        padding='same'),
+            tf.keras.layers.LayerNormalization(),
+            tf.keras.layers.ReLU(),
+            Conv2Plus1D(filters=filters,
+                        kernel_size=kernel_size,
+                        padding='same'),
+            tf.keras.layers.LayerNormalization()
+        ])
+
+    def call(self, x):
+        return self.seq(x)
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({
+            'filters': self.filters,
+            'kernel_size': self.kernel_size
+        })
+        return config
+
+class Project(tf.keras.layers.Layer):
+    def __init__(self, units, **kwargs):
+        super().__init__(**kwargs)
+        self.units = units
+        self.seq = tf.keras.Sequential([
+            tf.keras.layers.Dense(units),
+            tf.keras.layers.LayerNormalization()
+        ])
+
+    def call(self, x):
+        return self.seq(x)
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({'units': self.units})
+        return config
+
+class ResizeVideo(tf.keras.layers.Layer):
+    def __init__(self, height, width, **kwargs):
+        super().__init__(**kwargs)
+        self.height = height
+        self.width = width
+        self.resizing_layer = tf.keras.layers.Resizing(self.height, self.width)
+
+    def call(self, video):
+        old_shape = einops.parse_shape(video, 'b t h w c')
+        images = einops.rearrange(video, 'b t h w c -> (b t) h w c')
+        images = self.resizing_layer(images)
+        videos = einops.rearrange(
+            images, '(b t) h w c -> b t h w c',
+            t = old_shape['t'])
+        return videos
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({
+            'height': self.height,
+            'width': self.width
+        })
+        return config
+
+
+def load_keras_model(model_path):
+    """Load the SentiVision Keras model with various fallback strategies"""
+    # Strategy 1: Try loading without compilation
+    try:
+        with tf.device('/CPU:0'):  # Force CPU to avoid GPU issues
+            return tf.keras.models.load_model(model_path, compile=False)
+    except Exception as e1:
+        # Strategy 2: Try with custom objects (for Conv2D issues)
+        try:
+            custom_objects = {
+                'Conv2Plus1D': Conv2Plus1D,
+                'ResidualMain': ResidualMain,
+                'Project': Project,
+                'ResizeVideo': ResizeVideo,
+            }
+            with tf.device('/CPU:0'):
+                return tf.keras.models.load_model(model_path, custom_objects=custom_objects, compile=False)
+        except Exception as e2:
+            # Strategy 3: Try loading with safe_mode
+            try:
+                with tf.device('/CPU:0'):
+                    return tf.keras.models.load_model(model_path, compile=False, safe_mode=False)
+            except Exception as e3:
+                raise Exception(f"Model loading failed. Conv2D error likely due to version incompatibility: {str(e3)}")
+
+
+def create_mock_model(clip_length=20, input_size=(224, 224)):
+    """Create a simple mock model for testing when real model fails to load"""
+    inputs = tf.keras.Input(shape=(clip_length,) + tuple(input_size) + (3,))
+    x = tf.keras.layers.GlobalAveragePooling3D()(inputs)
+    outputs = tf.keras.layers.Dense(10, activation='softmax')(x)
+    model = tf.keras.Model(inputs, outputs)
+    return model
@@ -1,37 +1,322 @@
+import logging
+import os
 import time
 import threading
 import signal
 import sys
 from camera import Webcam
+from preview import PreviewWindow, DEFAULT_WINDOW_NAME
 from model_interface import ModelInterface
 from firebase_client import FirebaseClient
 from state_machine import ActivityStateMachine
+from pipeline import MonitoringPipeline
+from temporal_filter import TemporalFilter
+from motion_gate import MotionGate
+from inference_server import InferenceServer
+from inference_process import InferenceProcess
+from metrics import default_registry, MetricsServer, MetricsDumper
+
+
+logger = logging.getLogger(__name__)
+
+
+def room_configs(config):
+    """
+    Per-room configuration: the top-level config with each entry of 'rooms' applied over it
+
+    A room's 'capture' section is merged into the top-level one. Without
+    'rooms' the top-level config describes the single room. Rooms may share
+    a patientId (one patient, several rooms); their status writes are then
+    arbitrated by firebase_client.PatientStatusOwner.
+    """
+    rooms = config.get('rooms')
+    if not rooms:
+        return [config]
+    
+    merged = []
+    for room in rooms:
+        if 'roomId' not in room:
+            raise ValueError(f"Room without roomId in config: {room}")
+        room_config = dict(config, **room)
+        room_config['capture'] = dict(config.get('capture') or {}, **(room.get('capture') or {}))
+        del room_config['rooms']
+        merged.append(room_config)
+    
+    room_ids = [room['roomId'] for room in merged]
+    if len(set(room_ids)) != len(room_ids):
+        raise ValueError(f"Duplicate roomId in config: {room_ids}")
+    return merged
+
+
+class RoomMonitor:
+    """Camera, temporal filter, state machine and pipeline for one room; the model is the Monitor's"""
+    
+    def __init__(self, monitor, config, firebase_client, room_id=None):
+        """
+        Args:
+            monitor: Monitor owning the shared model
+            config: Configuration for this room (see room_configs())
+            firebase_client: FirebaseClient writing this room's events and status
+            room_id: Room label for metrics and the preprocessing cache
+                (None when the monitor runs a single room)
+        """
+        self.monitor = monitor
+        self.config = config
+        self.firebase_client = firebase_client
+        self.room_id = room_id
+        
+        model_interface = monitor.model_interface
+        self.temporal_filter = None
+        if config.get('temporal_filter', True):
+            self.temporal_filter = TemporalFilter(
+                model_interface.label_mapping,
+                model_interface.critical_events,
+                time_constant=config.get('filter_time_constant', 1.5),
+                enter_threshold=config.get('filter_enter_threshold', 0.6),
+                exit_threshold=config.get('filter_exit_threshold', 0.4),
+                critical_threshold=config.get('min_confidence', 0.65)
+            )
+        self.state_machine = ActivityStateMachine(
+            firebase_client,
+            debounce_duration=config.get('debounce_duration', 7),
+            confidence_threshold=config.get('confidence_threshold', 0.90),
+            max_event_duration=config.get('max_event_duration', 600),  # 10 minutes default
+            room_id=room_id
+        )
+        
+        self.pipeline = None
+        self.thread = None
+        self.last_prediction = None  # Shown in the preview overlay
+    
+    @property
+    def name(self):
+        """Room name for log messages"""
+        return self.room_id or self.config.get('roomId', 'room')
+    
+    def start(self):
+        """Start this room's processing thread"""
+        self.thread = threading.Thread(target=self._processing_loop, name=f"room-{self.name}", daemon=True)
+        self.thread.start()
+    
+    def join(self, timeout=5):
+        """Wait for the processing thread to finish"""
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+    
+    def _processing_loop(self):
+        """Open the camera and run the staged processing pipeline until the monitor stops"""
+        logger.info("Starting video processing loop for %s...", self.name)
+        # With several rooms, preview windows are opt-in per room
+        show_preview = self.config.get('show_preview', self.room_id is None)
+        
+        preview = None
+        try:
+            with Webcam(stride=self.config.get('clip_stride', 1),
+                        capture=self.config.get('capture'),
+                        capture_interval=self.config.get('capture_interval'),
+                        room_id=self.room_id) as webcam:
+                if show_preview:
+                    preview = PreviewWindow(
+                        webcam,
+                        status=self._preview_status,
+                        max_fps=self.config.get('preview_fps', 10),
+                        window_name=f"{DEFAULT_WINDOW_NAME} - {self.room_id}" if self.room_id else DEFAULT_WINDOW_NAME
+                    )
+                    preview.start()
+                
+                # Wait for buffer to fill
+                while not webcam.is_ready() and not webcam.is_finished() and self.monitor.running:
+                    logger.info("%s buffer filling... %d/%d", self.name, webcam.get_buffer_size(), webcam.capacity)
+                    time.sleep(0.5)
+                
+                logger.info("Camera ready in %s, starting AI processing...", self.name)
+                
+                # Capture -> preprocess -> inference -> publish, each on its own worker
+                self.pipeline = self.create_pipeline(webcam)
+                self.pipeline.start()
+                
+                try:
+                    # A replayed recording ends; a camera runs until stopped
+                    while self.monitor.running and not webcam.is_finished():
+                        time.sleep(0.2)
+                finally:
+                    self.pipeline.stop()
+                
+                if webcam.is_finished():
+                    logger.info("Frame source finished in %s, processing stopped", self.name)
+                    
+        except Exception as e:
+            logger.error("Error in processing loop for %s: %s", self.name, e)
+            # A single room failing stops the monitor; other rooms keep running
+            if len(self.monitor.rooms) == 1:
+                self.monitor.running = False
+        finally:
+            if preview is not None:
+                preview.stop()
+    
+    def _preview_status(self):
+        """Overlay lines for the preview window: current state and latest prediction"""
+        state_info = self.state_machine.get_current_state()
+        lines = [f"State: {state_info['current_state'] or '-'}"]
+        if state_info['pending_state']:
+            lines.append(f"Pending: {state_info['pending_state']}")
+        prediction = self.last_prediction
+        if prediction is not None:
+            lines.append(f"Prediction: {prediction['state']} ({prediction['confidence'] * 100:.0f}%)")
+        return lines
+    
+    def create_pipeline(self, webcam):
+        """MonitoringPipeline from webcam through the shared model and this room's filter and state machine"""
+        return MonitoringPipeline(
+            webcam,
+            self.monitor.model_interface,
+            self.state_machine,
+            queue_size=self.config.get('pipeline_queue_size', 1),
+            publish_queue_size=self.config.get('publish_queue_size', 16),
+            poll_interval=self.config.get('processing_interval', 0.1),
+            on_prediction=self._on_prediction,
+            temporal_filter=self.temporal_filter,
+            motion_gate=self._create_motion_gate(),
+            room_id=self.room_id,
+            inference_server=self.monitor.inference_server or self.monitor.inference_process
+        )
+    
+    def _create_motion_gate(self):
+        """MotionGate lowering the inference rate in static scenes, or None if disabled"""
+        if not self.config.get('motion_gate', True):
+            return None
+        return MotionGate(
+            min_interval=self.config.get('processing_interval', 0.1),
+            max_interval=1.0 / self.config.get('min_inference_rate', 0.5),
+            motion_threshold=self.config.get('motion_threshold', 3.0)
+        )
+    
+    def _on_prediction(self, prediction, processing_time):
+        """Called by the publish stage after each prediction reaches the state machine"""
+        self.last_prediction = prediction
+        self.monitor._on_prediction(prediction, processing_time, self.room_id)
+    
+    def send_heartbeat(self):
+        """Re-send the current state as patient status, if there is one"""
+        state_info = self.state_machine.get_current_state()
+        
+        if state_info['current_state']:
+            # Use a default confidence for heartbeat if no recent prediction
+            confidence = 0.8  # Default heartbeat confidence
+            
+            self.state_machine.force_heartbeat_update(confidence)
+            logger.info("Heartbeat sent for %s - Current state: %s", self.name, state_info['current_state'])
+        else:
+            logger.info("Heartbeat skipped for %s - No current state available", self.name)
+    
+    def shutdown(self):
+        """Stop the state machine and write this room's pending status"""
+        self.state_machine.shutdown()
+        if self.firebase_client is not self.monitor.firebase_client:
+            self.firebase_client.close()
+    
+    def get_status(self):
+        """Current state, pipeline and status write statistics for this room"""
+        state_info = self.state_machine.get_current_state()
+        publisher = self.firebase_client.status_publisher
+        
+        return {
+            'current_state': state_info['current_state'],
+            'is_debouncing': state_info['is_debouncing'],
+            'pending_state': state_info['pending_state'],
+            'pipeline': self.pipeline.get_status() if self.pipeline else None,
+            'status_writes': publisher.get_stats() if publisher else None,
+            'state_probabilities': self.temporal_filter.state_probabilities() if self.temporal_filter else None
+        }
 
 
 class Monitor:
-    def __init__(self, config_path="config.json"):
-        """Initialize the monitoring system with all components"""
-        print("Initializing SentiCare AI Monitoring System...")
+    def __init__(self, config_path="config.json", firebase_client=None):
+        """
+        Initialize the monitoring system with all components
+        
+        With a 'rooms' list in the config, one camera, pipeline and state
+        machine run per room; all rooms share the loaded model and the
+        Firestore writer.
+        
+        Args:
+            config_path: Path to config.json
+            firebase_client: FirebaseClient to use instead of connecting to
+                Firestore (e.g. one backed by a LocalFirestore in benchmarks)
+        """
+        logger.info("Initializing SentiCare AI Monitoring System...")
         
         # Initialize components
-        self.firebase_client = FirebaseClient(config_path)
+        self.firebase_client = firebase_client or FirebaseClient(config_path)
         config = self.firebase_client.get_config()
+        self.config = config
+        self.config_path = config_path
+        self.metrics = default_registry()
         
-        self.model_interface = ModelInterface()
-        self.state_machine = ActivityStateMachine(
-            self.firebase_client,
-            debounce_duration=config.get('debounce_duration', 7),
-            confidence_threshold=config.get('confidence_threshold', 0.90),
-            max_event_duration=config.get('max_event_duration', 600)  # 10 minutes default
+        rooms = room_configs(config)
+        multi_room = bool(config.get('rooms'))
+        
+        # With temporal filtering every prediction feeds the filter, so none are dropped up front
+        use_temporal_filter = config.get('temporal_filter', True)
+        min_confidence = 0.0 if use_temporal_filter else config.get('min_confidence', 0.65)
+        
+        backend = config.get('inference_backend', 'keras')
+        model_options = {
+            'backend': backend,
+            'model_path': config.get(f'{backend}_model_path'),
+            'num_threads': config.get('inference_threads'),
+            'compile_inference': config.get('compile_inference', True),
+            'jit_compile': config.get('xla_jit', False),
+            'min_confidence': min_confidence
+        }
+        inference_mode = config.get('inference_mode', 'thread')
+        if inference_mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown inference_mode: {inference_mode} (expected 'thread' or 'process')")
+        
+        # In process mode only the worker loads the model; this process preprocesses
+        self.model_interface = ModelInterface(
+            frame_cache_size=64 * len(rooms),  # Frames of every room's current clip
+            **dict(model_options, backend=None if inference_mode == 'process' else backend)
         )
         
+        # Rooms' clips share forward passes: up to one clip per room per batch by default
+        self.inference_server = None
+        self.inference_process = None
+        batch_size = config.get('inference_batch_size', len(rooms))
+        if inference_mode == 'process':
+            clip_shape = (1, self.model_interface.clip_length) + self.model_interface.input_size + (3,)
+            self.inference_process = InferenceProcess(
+                model_options,
+                clip_shape,
+                num_slots=4 * len(rooms),
+                max_batch_size=max(batch_size, 1)
+            )
+        elif batch_size > 1:
+            self.inference_server = InferenceServer(
+                self.model_interface,
+                max_batch_size=batch_size,
+                max_wait=config.get('inference_batch_wait', 0.02)
+            )
+        
+        if multi_room:
+            self.rooms = [
+                RoomMonitor(self, room, self.firebase_client.for_room(room), room_id=room['roomId'])
+                for room in rooms
+            ]
+        else:
+            self.rooms = [RoomMonitor(self, config, self.firebase_client)]
+        
+        # Metrics endpoint and periodic dump, started with monitoring
+        self.metrics_server = None
+        self.metrics_dumper = None
+        
         # Threading control
         self.running = False
-        self.processing_thread = None
         self.heartbeat_thread = None
         self.heartbeat_interval = config.get('heartbeat_interval', 180)  # 3 minutes
         
-        # Performance tracking
+        # Performance tracking (updated from every room's publish stage)
+        self._stats_lock = threading.Lock()
         self.last_prediction_time = 0
         self.prediction_count = 0
         
@@ -39,154 +324,184 @@ class Monitor:
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
         
-        print("Monitor initialization complete")
+        logger.info("Monitor initialization complete (%d room%s)", len(self.rooms), "s" if multi_room else "")
+    
+    # The first room's components, for callers written for a single camera
+    @property
+    def state_machine(self):
+        return self.rooms[0].state_machine
+    
+    @property
+    def temporal_filter(self):
+        return self.rooms[0].temporal_filter
+    
+    @property
+    def pipeline(self):
+        return self.rooms[0].pipeline
+    
+    def create_pipeline(self, webcam):
+        """MonitoringPipeline from webcam through the first room's filter and state machine"""
+        return self.rooms[0].create_pipeline(webcam)
     
     def start_monitoring(self):
         """Start the monitoring system with multithreading"""
         if self.running:
-            print("Monitoring is already running")
+            logger.warning("Monitoring is already running")
             return
         
         self.running = True
-        print("Starting SentiCare monitoring system...")
+        logger.info("Starting SentiCare monitoring system...")
+        self._start_metrics()
         
-        # Start processing thread
-        self.processing_thread = threading.Thread(target=self._processing_loop, daemon=True)
-        self.processing_thread.start()
+        # One processing thread per room
+        for room in self.rooms:
+            room.start()
         
         # Start heartbeat thread
         self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
         self.heartbeat_thread.start()
         
-        print("Monitoring system started successfully")
-        print("Press Ctrl+C to stop monitoring")
+        logger.info("Monitoring system started successfully")
+        logger.info("Press Ctrl+C to stop monitoring")
         
         # Keep main thread alive
         try:
             while self.running:
+                if self.inference_process and self.inference_process.failed:
+                    # Without inference the monitor would only repeat stale states;
+                    # exit so the service manager restarts the whole client
+                    logger.error("Inference worker process failed for good, stopping monitoring")
+                    self.stop_monitoring()
+                    raise RuntimeError("Inference worker process could not be restarted")
                 time.sleep(1)
         except KeyboardInterrupt:
             self.stop_monitoring()
     
-    def _processing_loop(self):
-        """Main processing loop running in separate thread"""
-        print("Starting video processing loop...")
+    def _start_metrics(self):
+        """Serve metrics on metrics_port and dump them to metrics_dump_path, if configured"""
+        port = self.config.get('metrics_port')
+        if port is not None:
+            try:
+                self.metrics_server = MetricsServer(
+                    self.metrics, host=self.config.get('metrics_host', '127.0.0.1'), port=port
+                )
+                self.metrics_server.start()
+            except OSError as e:
+                logger.warning("Metrics endpoint not started: %s", e)
+                self.metrics_server = None
         
-        try:
-            with Webcam(show_preview=True) as webcam:
-                # Wait for buffer to fill
-                while not webcam.is_ready() and self.running:
-                    print(f"Buffer filling... {webcam.get_buffer_size()}/{webcam.clip_length}")
-                    time.sleep(0.5)
-                
-                print("Camera ready, starting AI processing...")
-                print("📹 Camera preview window opened - Press 'Q' to close preview")
-                
-                # Main processing loop
-                while self.running:
-                    if webcam.is_ready():
-                        start_time = time.time()
-                        
-                        # Get video clip
-                        clip = webcam.get_clip()
-                        
-                        if clip:
-                            try:
-                                # Run AI inference
-                                prediction = self.model_interface.predict(clip)
-                                if prediction is None:
-                                    continue
-                                
-                                # Process prediction through state machine
-                                self.state_machine.process_prediction(prediction)
-                                
-                                # Update performance metrics
-                                self.prediction_count += 1
-                                self.last_prediction_time = time.time()
-                                
-                                processing_time = self.last_prediction_time - start_time
-                                
-                                # Log prediction details (clean format)
-                                if self.prediction_count % 10 == 0:  # Only log every 10th prediction to reduce spam
-                                    print(f"📊 Prediction #{self.prediction_count}: "
-                                          f"{prediction['state']} "
-                                          f"({prediction['confidence']:.1%}, "
-                                          f"{processing_time:.1f}s)")
-                                
-                            except Exception as e:
-                                print(f"Error during AI processing: {str(e)}")
-                    
-                    # Control processing rate (process every 0.1 seconds)
-                    time.sleep(0.1)
-                    
-        except Exception as e:
-            print(f"Error in processing loop: {str(e)}")
-            self.running = False
+        dump_path = self.config.get('metrics_dump_path')
+        if dump_path:
+            # Relative paths are resolved against the directory of the config file
+            if not os.path.isabs(dump_path):
+                dump_path = os.path.join(os.path.dirname(os.path.abspath(self.config_path)), dump_path)
+            self.metrics_dumper = MetricsDumper(
+                dump_path, self.metrics, interval=self.config.get('metrics_dump_interval', 60)
+            )
+            self.metrics_dumper.start()
+    
+    def _stop_metrics(self):
+        """Write a final metrics dump and close the endpoint"""
+        if self.metrics_dumper:
+            self.metrics_dumper.stop()
+            self.metrics_dumper = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+    
+    def _on_prediction(self, prediction, processing_time, room_id=None):
+        """Count a prediction published by one of the rooms' pipelines"""
+        labels = {'state': prediction['state']}
+        if room_id:
+            labels['room'] = room_id
+        self.metrics.counter('senticare_predictions', 'Predictions published to the state machine', labels).inc()
+        with self._stats_lock:
+            self.prediction_count += 1
+            self.last_prediction_time = time.time()
+            prediction_count = self.prediction_count
+        
+        # Log prediction details (clean format)
+        if prediction_count % 10 == 0:  # Only log every 10th prediction to reduce spam
+            logger.info("📊 Prediction #%d%s: %s (%.1f%%, %.1fs)", prediction_count,
+                        f" in {room_id}" if room_id else "",
+                        prediction['state'], prediction['confidence'] * 100, processing_time)
     
     def _heartbeat_loop(self):
         """Heartbeat loop for patient status updates"""
-        print(f"Starting heartbeat loop (interval: {self.heartbeat_interval}s)")
+        logger.info("Starting heartbeat loop (interval: %ss)", self.heartbeat_interval)
         
         while self.running:
-            try:
-                # Wait for heartbeat interval
-                for _ in range(self.heartbeat_interval):
-                    if not self.running:
-                        break
-                    time.sleep(1)
-                
-                if self.running:
-                    # Get current state and send heartbeat
-                    state_info = self.state_machine.get_current_state()
-                    
-                    if state_info['current_state']:
-                        # Use a default confidence for heartbeat if no recent prediction
-                        confidence = 0.8  # Default heartbeat confidence
-                        
-                        self.state_machine.force_heartbeat_update(confidence)
-                        print(f"Heartbeat sent - Current state: {state_info['current_state']}")
-                    else:
-                        print("Heartbeat skipped - No current state available")
-                        
-            except Exception as e:
-                print(f"Error in heartbeat loop: {str(e)}")
+            # Wait for heartbeat interval
+            for _ in range(self.heartbeat_interval):
+                if not self.running:
+                    break
+                time.sleep(1)
+            
+            if not self.running:
+                break
+            
+            # Get current state and send heartbeat for each room
+            for room in self.rooms:
+                try:
+                    room.send_heartbeat()
+                except Exception as e:
+                    logger.error("Error in heartbeat loop for %s: %s", room.name, e)
     
     def stop_monitoring(self):
         """Stop the monitoring system gracefully"""
         if not self.running:
             return
         
-        print("\nStopping SentiCare monitoring system...")
+        logger.info("Stopping SentiCare monitoring system...")
         self.running = False
         
         # Wait for threads to finish
-        if self.processing_thread and self.processing_thread.is_alive():
-            self.processing_thread.join(timeout=5)
+        for room in self.rooms:
+            room.join(timeout=5)
         
         if self.heartbeat_thread and self.heartbeat_thread.is_alive():
             self.heartbeat_thread.join(timeout=5)
         
-        # Shutdown state machine
-        self.state_machine.shutdown()
+        # Shutdown state machines and the rooms' status publishers
+        for room in self.rooms:
+            room.shutdown()
+        
+        self.close_inference()
         
-        print("Monitoring system stopped")
-        print(f"Total predictions processed: {self.prediction_count}")
+        # Commit any queued Firestore writes before exiting
+        self.firebase_client.close()
+        
+        self._stop_metrics()
+        
+        logger.info("Monitoring system stopped")
+        logger.info("Total predictions processed: %d", self.prediction_count)
+    
+    def close_inference(self):
+        """Stop the inference server or worker process, if one is running"""
+        if self.inference_server:
+            self.inference_server.close()
+            self.inference_server = None
+        if self.inference_process:
+            self.inference_process.close()
+            self.inference_process = None
     
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully"""
-        print(f"\nReceived signal {signum}, shutting down...")
+        logger.info("Received signal %s, shutting down...", signum)
         self.stop_monitoring()
         sys.exit(0)
     
     def get_status(self):
-        """Get current monitoring status"""
-        state_info = self.state_machine.get_current_state()
-        
-        return {
+        """Get current monitoring status (the first room's state at the top level, every room under 'rooms')"""
+        status = {
             'running': self.running,
             'prediction_count': self.prediction_count,
             'last_prediction_time': self.last_prediction_time,
-            'current_state': state_info['current_state'],
-            'is_debouncing': state_info['is_debouncing'],
-            'pending_state': state_info['pending_state']
-        }
\ No newline at end of file
+            **self.rooms[0].get_status(),
+            'inference_batching': self.inference_server.get_stats() if self.inference_server else None,
+            'inference_process': self.inference_process.get_stats() if self.inference_process else None,
+            'metrics': self.metrics.to_dict()
+        }
+        if len(self.rooms) > 1 or self.rooms[0].room_id:
+            status['rooms'] = {room.room_id: room.get_status() for room in self.rooms}
+        return status
@@ -0,0 +1,107 @@
+"""
+Outbox between the state machine and Firebase
+
+ActivityStateMachine computes transitions in memory and only emits outbound
+records while holding its lock; a publisher thread drains the outbox and
+makes the FirebaseClient calls, so network latency (or the write-ahead log's
+fsync) never blocks process_prediction() or get_current_state().
+
+Records are FirebaseClient method calls, e.g.
+
+    outbox.emit('write_event', 'SITTING', 42, 0.93)
+    outbox.emit('write_alert', 'FALL_DETECTED', 0.97, priority=True)
+
+Priority records (critical alerts) are published ahead of everything else;
+otherwise records are published in the order they were emitted.
+"""
+
+import logging
+import time
+import threading
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """Queue of outbound FirebaseClient calls drained by a publisher thread"""
+
+    def __init__(self, firebase_client, name="outbox"):
+        """
+        Args:
+            firebase_client: FirebaseClient the records are published to
+            name: Publisher thread name
+        """
+        self.firebase_client = firebase_client
+        self.published_count = 0
+        self.failed_count = 0
+
+        self._priority = deque()
+        self._routine = deque()
+        self._publishing = False
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def emit(self, method, *args, priority=False):
+        """Queue a call of firebase_client.<method>(*args); never blocks on I/O"""
+        with self._condition:
+            (self._priority if priority else self._routine).append((method, args))
+            self._condition.notify()
+
+    def pending_count(self):
+        """Number of records not yet published"""
+        with self._condition:
+            return len(self._priority) + len(self._routine) + int(self._publishing)
+
+    def flush(self, timeout=None):
+        """Wait until every emitted record is published; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._priority or self._routine or self._publishing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Publish remaining records and stop the publisher thread"""
+        self.flush(timeout)
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout=2.0)
+
+    def _next_record(self):
+        """Wait for the next record (called with the lock held)"""
+        while self._running:
+            if self._priority:
+                return self._priority.popleft()
+            if self._routine:
+                return self._routine.popleft()
+            self._condition.wait()
+        return None
+
+    def _run(self):
+        """Internal method - runs in the publisher thread"""
+        while True:
+            with self._condition:
+                record = self._next_record()
+                if record is None:
+                    return
+                self._publishing = True
+
+            method, args = record
+            try:
+                getattr(self.firebase_client, method)(*args)
+                self.published_count += 1
+            except Exception as e:
+                self.failed_count += 1
+                logger.error("Error publishing %s to Firebase: %s", method, e)
+
+            with self._condition:
+                self._publishing = False
+                self._condition.notify_all()
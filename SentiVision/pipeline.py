@@ -0,0 +1,338 @@
+"""
+Staged processing pipeline for the SentiCare monitor
+
+    capture -> preprocess -> inference -> publish
+
+Each stage runs on its own worker thread and hands work to the next stage
+through a bounded queue. When a downstream stage falls behind, the queue
+drops its oldest item instead of blocking the producer, so the pipeline
+always works on the most recent clip and a slow Firestore write in the
+publish stage never stalls the next inference.
+"""
+
+import logging
+import time
+import threading
+from collections import deque
+from metrics import default_registry, DEPTH_BUCKETS
+
+
+logger = logging.getLogger(__name__)
+
+
+class DropOldestQueue:
+    """Bounded FIFO queue that drops the oldest item instead of blocking the producer"""
+
+    def __init__(self, maxsize, on_drop=None, can_drop=None, depth_histogram=None, drop_counter=None):
+        """
+        Args:
+            maxsize: Maximum number of queued items
+            on_drop: Optional callback invoked with every dropped item
+            can_drop: Optional predicate; items for which it returns False are
+                never dropped (the queue may then temporarily exceed maxsize)
+            depth_histogram: Optional Histogram observing the queue depth after every put
+            drop_counter: Optional Counter of dropped items
+        """
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.can_drop = can_drop
+        self.depth_histogram = depth_histogram
+        self.drop_counter = drop_counter
+        self.dropped_count = 0
+
+        self._items = deque()
+        self._condition = threading.Condition()
+
+    def put(self, item):
+        """Add an item, dropping the oldest droppable item if the queue is full"""
+        dropped = None
+        with self._condition:
+            if len(self._items) >= self.maxsize:
+                dropped = self._pop_droppable()
+                if dropped is not None:
+                    self.dropped_count += 1
+            self._items.append(item)
+            depth = len(self._items)
+            self._condition.notify()
+
+        if self.depth_histogram is not None:
+            self.depth_histogram.observe(depth)
+        if dropped is not None:
+            if self.drop_counter is not None:
+                self.drop_counter.inc()
+            if self.on_drop:
+                self.on_drop(dropped)
+
+    def _pop_droppable(self):
+        """Remove and return the oldest item that may be dropped, or None"""
+        for index, item in enumerate(self._items):
+            if self.can_drop is None or self.can_drop(item):
+                del self._items[index]
+                return item
+        return None
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, or None if nothing arrives within timeout"""
+        with self._condition:
+            if not self._items:
+                self._condition.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def drain(self):
+        """Remove and return all queued items"""
+        with self._condition:
+            items = list(self._items)
+            self._items.clear()
+            return items
+
+    def qsize(self):
+        """Number of queued items"""
+        with self._condition:
+            return len(self._items)
+
+
+class PipelineStage:
+    """Worker thread that applies a handler to items from an input queue"""
+
+    def __init__(self, name, handler, input_queue, output_queue=None, duration_histogram=None,
+                 error_counter=None, role=None):
+        """
+        Args:
+            name: Stage name used in thread names and log messages
+            handler: Callable taking one item; a non-None result is passed to output_queue
+            input_queue: DropOldestQueue to read from
+            output_queue: Optional DropOldestQueue to write results to
+            duration_histogram: Optional Histogram observing the handler time per item
+            error_counter: Optional Counter of items the handler failed on
+            role: What the stage does ('preprocess', 'inference', 'publish'), the same in every
+                room's pipeline; defaults to name
+        """
+        self.name = name
+        self.role = role or name
+        self.handler = handler
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.duration_histogram = duration_histogram
+        self.error_counter = error_counter
+        self.processed_count = 0
+
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the worker thread after its current item"""
+        self._running = False
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+
+    def _run(self):
+        """Internal method - runs in the worker thread"""
+        while self._running:
+            item = self.input_queue.get(timeout=0.2)
+            if item is None:
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                if self.error_counter is not None:
+                    self.error_counter.inc()
+                logger.error("Error in %s stage: %s", self.name, e)
+                continue
+            if self.duration_histogram is not None:
+                self.duration_histogram.observe(time.perf_counter() - start)
+
+            self.processed_count += 1
+            if result is not None and self.output_queue is not None:
+                self.output_queue.put(result)
+
+
+class MonitoringPipeline:
+    """Capture, preprocess, inference and publish stages for one camera"""
+
+    def __init__(self, webcam, model_interface, state_machine, queue_size=1,
+                 publish_queue_size=16, poll_interval=0.1, on_prediction=None, temporal_filter=None,
+                 motion_gate=None, metrics=None, room_id=None, inference_server=None):
+        """
+        Args:
+            webcam: Started Webcam to take clips from
+            model_interface: ModelInterface used for preprocessing and inference
+            state_machine: ActivityStateMachine receiving predictions
+            queue_size: Capacity of the preprocess and inference queues; 1 means
+                only the newest clip waits while the next stage is busy
+            publish_queue_size: Capacity of the publish queue (critical
+                predictions are never dropped from it)
+            poll_interval: Seconds between checks for a new clip
+            on_prediction: Optional callback(prediction, processing_time) run
+                after each prediction is published
+            temporal_filter: Optional TemporalFilter smoothing predictions in
+                the inference stage before they are published
+            motion_gate: Optional MotionGate deciding in the capture stage
+                which new clips are worth an inference
+            metrics: MetricsRegistry for stage times, queue depths and drops
+                (default: the shared registry)
+            room_id: Room the camera watches when several pipelines share
+                model_interface; keys its frames in the preprocessing cache and
+                is added as a 'room' label to its metrics
+            inference_server: Optional InferenceServer (batching clips with
+                other cameras' clips) or InferenceProcess (running the model in
+                a worker process) the inference stage submits clips to,
+                instead of running the model itself
+        """
+        self.webcam = webcam
+        self.model_interface = model_interface
+        self.state_machine = state_machine
+        self.poll_interval = poll_interval
+        self.on_prediction = on_prediction
+        self.temporal_filter = temporal_filter
+        self.motion_gate = motion_gate
+        self.room_id = room_id
+        self.inference_server = inference_server
+
+        room_labels = {'room': room_id} if room_id else {}
+        metrics = metrics or default_registry()
+        self._end_to_end = metrics.histogram(
+            'senticare_end_to_end_seconds', 'Time from clip capture to its prediction being published',
+            room_labels)
+        self._clips_counter = metrics.counter('senticare_clips', 'New clips seen by the capture stage', room_labels)
+        self._skipped_counter = metrics.counter('senticare_clips_skipped', 'Clips skipped by the motion gate',
+                                                room_labels)
+
+        def queue_metrics(name):
+            labels = dict(room_labels, queue=name)
+            return {
+                'depth_histogram': metrics.histogram(
+                    'senticare_queue_depth', 'Queue depth after each put', labels, buckets=DEPTH_BUCKETS),
+                'drop_counter': metrics.counter('senticare_queue_dropped', 'Items dropped from a full queue', labels)
+            }
+
+        def stage_metrics(name):
+            labels = dict(room_labels, stage=name)
+            return {
+                'duration_histogram': metrics.histogram(
+                    'senticare_stage_seconds', 'Pipeline stage handler time per item', labels),
+                'error_counter': metrics.counter('senticare_stage_errors', 'Items a pipeline stage failed on', labels)
+            }
+
+        self.preprocess_queue = DropOldestQueue(queue_size, **queue_metrics('preprocess'))
+        self.inference_queue = DropOldestQueue(
+            queue_size,
+            on_drop=lambda item: model_interface.release_input_buffer(item['input']),
+            **queue_metrics('inference')
+        )
+        self.publish_queue = DropOldestQueue(
+            publish_queue_size,
+            can_drop=lambda item: not item['prediction']['is_critical'],
+            **queue_metrics('publish')
+        )
+
+        # Stage and thread names carry the room so log lines can be told apart
+        prefix = f"{room_id}-" if room_id else ""
+        self.stages = [
+            PipelineStage(f'{prefix}preprocess', self._preprocess, self.preprocess_queue, self.inference_queue,
+                          role='preprocess', **stage_metrics('preprocess')),
+            PipelineStage(f'{prefix}inference', self._infer, self.inference_queue, self.publish_queue,
+                          role='inference', **stage_metrics('inference')),
+            PipelineStage(f'{prefix}publish', self._publish, self.publish_queue,
+                          role='publish', **stage_metrics('publish'))
+        ]
+
+        self._running = False
+        self._capture_thread = None
+
+    def start(self):
+        """Start the capture thread and all stage workers"""
+        self._running = True
+        for stage in self.stages:
+            stage.start()
+        prefix = f"{self.room_id}-" if self.room_id else ""
+        self._capture_thread = threading.Thread(target=self._capture_loop, name=f"pipeline-{prefix}capture",
+                                                daemon=True)
+        self._capture_thread.start()
+
+    def stop(self):
+        """Stop capture first, then the stages, and release any queued buffers"""
+        self._running = False
+        if self._capture_thread and self._capture_thread.is_alive():
+            self._capture_thread.join(timeout=2.0)
+
+        for stage in self.stages:
+            stage.stop()
+
+        for item in self.inference_queue.drain():
+            self.model_interface.release_input_buffer(item['input'])
+
+    def _capture_loop(self):
+        """Internal method - hands each new clip to the preprocess stage"""
+        last_generation = None
+        while self._running:
+            clip_view = self.webcam.get_clip_view(since_generation=last_generation)
+            if clip_view['frames'] is not None:
+                last_generation = clip_view['generation']
+                now = time.time()
+                self._clips_counter.inc()
+                if self.motion_gate is None or self.motion_gate.should_infer(clip_view['frames'][-1], now):
+                    clip_view['captured_at'] = now
+                    self.preprocess_queue.put(clip_view)
+                else:
+                    self._skipped_counter.inc()
+
+            # Control processing rate (check for a new clip every poll_interval)
+            time.sleep(self.poll_interval)
+
+    def _preprocess(self, clip_view):
+        """Preprocess stage: clip -> pooled model input batch"""
+        video_tensor = self.model_interface.preprocess_clip(
+            clip_view['frames'], clip_view['sequence_ids'], pooled=True, source=self.room_id
+        )
+        return {'input': video_tensor, 'captured_at': clip_view['captured_at']}
+
+    def _infer(self, item):
+        """Inference stage: model input batch -> prediction (None if low confidence)"""
+        try:
+            if self.inference_server is not None:
+                prediction = self.inference_server.predict(item['input'])
+            else:
+                prediction = self.model_interface.predict_input(item['input'])
+        finally:
+            self.model_interface.release_input_buffer(item['input'])
+
+        if self.temporal_filter and prediction is not None and 'probabilities' in prediction:
+            prediction = self.temporal_filter.update(prediction['probabilities'], item['captured_at'])
+
+        if prediction is None:
+            return None
+        return {'prediction': prediction, 'captured_at': item['captured_at']}
+
+    def _publish(self, item):
+        """Publish stage: feed the state machine, which performs the Firestore writes"""
+        self.state_machine.process_prediction(item['prediction'])
+        processing_time = time.time() - item['captured_at']
+        self._end_to_end.observe(processing_time)
+        if self.on_prediction:
+            self.on_prediction(item['prediction'], processing_time)
+
+    def get_status(self):
+        """Queue depths and drop counts per stage, and the motion gate state"""
+        return {
+            'motion_gate': self.motion_gate.get_status() if self.motion_gate else None,
+            'queue_depths': {
+                'preprocess': self.preprocess_queue.qsize(),
+                'inference': self.inference_queue.qsize(),
+                'publish': self.publish_queue.qsize()
+            },
+            'dropped': {
+                'preprocess': self.preprocess_queue.dropped_count,
+                'inference': self.inference_queue.dropped_count,
+                'publish': self.publish_queue.dropped_count
+            }
+        }
@@ -0,0 +1,155 @@
+"""
+Camera preview window
+
+The preview is a consumer of the Webcam like the pipeline, not part of
+capture: a PreviewWindow thread copies the latest stored frame into a
+reused display buffer at most max_fps times per second, draws the status
+overlay (buffer state plus whatever status callback returns, e.g. the
+monitor's current state and latest prediction) and shows it with
+cv2.imshow. The capture thread never copies a frame for display or
+waits in cv2.waitKey, and the preview thread runs at a lower OS
+scheduling priority where the platform allows it.
+
+Headless deployments simply create no PreviewWindow: no thread runs and
+OpenCV's GUI is never touched.
+
+    preview = PreviewWindow(webcam, status=lambda: ["State: SITTING"], max_fps=10)
+    preview.start()
+    ...
+    preview.stop()
+"""
+
+import logging
+import os
+import time
+import threading
+import cv2
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_WINDOW_NAME = "SentiCare Camera Feed"
+
+# OpenCV's GUI backends are not safe to drive from several threads at once
+_gui_lock = threading.Lock()
+
+
+class PreviewWindow:
+    """Thread showing a Webcam's latest frame with a status overlay at a capped frame rate"""
+
+    def __init__(self, webcam, status=None, max_fps=10, window_name=DEFAULT_WINDOW_NAME, niceness=10):
+        """
+        Args:
+            webcam: Webcam to show
+            status: Optional callable returning lines of text to overlay
+                (called on the preview thread, once per displayed frame)
+            max_fps: Most frames displayed per second
+            window_name: Window title; one window per name
+            niceness: How much to lower the preview thread's scheduling
+                priority (Linux only; 0 keeps it)
+        """
+        self.webcam = webcam
+        self.status = status
+        self.max_fps = max_fps
+        self.window_name = window_name
+        self.niceness = niceness
+        self.frames_shown = 0
+
+        self._display = None  # Reused display buffer
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Open the window and start the preview thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="preview", daemon=True)
+        self._thread.start()
+        logger.info("📹 Camera preview window opened - Press 'Q' to close preview")
+
+    def stop(self, timeout=2.0):
+        """Stop the preview thread and close the window"""
+        self._running = False
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def is_running(self):
+        """True until stopped or closed with Q"""
+        return self._running
+
+    def _run(self):
+        """Internal method - runs in the preview thread"""
+        self._lower_priority()
+        interval = 1.0 / self.max_fps
+        next_frame_time = time.perf_counter()
+
+        try:
+            while self._running:
+                now = time.perf_counter()
+                if now < next_frame_time:
+                    time.sleep(next_frame_time - now)
+                next_frame_time = max(next_frame_time + interval, time.perf_counter())
+
+                if not self._show_latest_frame():
+                    break
+        except Exception as e:
+            logger.warning("Preview stopped: %s", e)
+        finally:
+            self._running = False
+            with _gui_lock:
+                try:
+                    cv2.destroyWindow(self.window_name)
+                except cv2.error:
+                    pass  # Window never opened (e.g. no frame yet) or already closed
+
+    def _show_latest_frame(self):
+        """Display the latest frame; returns False once the user closed the window"""
+        frame = self.webcam.get_frame(out=self._display)
+        if frame is None:
+            return True  # Nothing captured yet
+        self._display = frame
+        self._draw_overlay(frame)
+
+        with _gui_lock:
+            cv2.imshow(self.window_name, frame)
+            key = cv2.waitKey(1) & 0xFF
+        self.frames_shown += 1
+
+        if key == ord('q'):
+            logger.info("Preview window closed by user")
+            return False
+        return True
+
+    def _draw_overlay(self, frame):
+        """Draw branding, buffer state and the status lines onto the display frame"""
+        height = frame.shape[0]
+
+        # Add SentiCare branding
+        cv2.putText(frame, "SentiCare AI Monitor", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # Status lines from the monitor (state, latest prediction)
+        lines = self.status() if self.status else []
+        for index, line in enumerate(lines):
+            cv2.putText(frame, line, (10, 55 + 22 * index),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 1)
+
+        # Add buffer status
+        buffer_text = f"Buffer: {self.webcam.get_buffer_size()}/{self.webcam.capacity}"
+        cv2.putText(frame, buffer_text, (10, height - 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+        # Add ready status
+        ready = self.webcam.is_ready()
+        cv2.putText(frame, "READY" if ready else "FILLING...", (10, height - 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0) if ready else (0, 255, 255), 2)
+
+    def _lower_priority(self):
+        """Lower this thread's scheduling priority (Linux: per-thread niceness)"""
+        if not self.niceness:
+            return
+        try:
+            thread_id = threading.get_native_id()
+            os.setpriority(os.PRIO_PROCESS, thread_id, os.getpriority(os.PRIO_PROCESS, thread_id) + self.niceness)
+        except (AttributeError, OSError):
+            pass  # Not supported here; the frame rate cap still bounds the cost
@@ -0,0 +1,181 @@
+"""
+Single-thread scheduler for delayed and periodic callbacks
+
+One heap-ordered thread runs all debounce deadlines and periodic jobs of the
+state machines instead of an OS thread per threading.Timer. Several state
+machines (e.g. one per room) share default_scheduler().
+
+The clock is injectable: tests pass a ManualClock, never start the thread,
+and call run_pending() after advancing the clock, so nothing sleeps.
+
+    scheduler = Scheduler(clock=ManualClock())
+    handle = scheduler.call_later(7, confirm, 'SITTING')
+    scheduler.clock.advance(7)
+    scheduler.run_pending()  # runs confirm('SITTING')
+"""
+
+import logging
+import time
+import heapq
+import itertools
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class ManualClock:
+    """Clock that only moves when advance() is called"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        """Move the clock forward"""
+        self.now += seconds
+
+
+class ScheduledCall:
+    """Handle for a scheduled callback; cancel() prevents any further runs"""
+
+    def __init__(self, deadline, interval, callback, args):
+        self.deadline = deadline
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel the call (and, for periodic calls, all later runs)"""
+        self.cancelled = True
+
+
+class Scheduler:
+    """Heap-based scheduler running callbacks on one background thread"""
+
+    def __init__(self, clock=time.monotonic, name="scheduler"):
+        """
+        Args:
+            clock: Callable returning the current time in seconds
+            name: Thread name
+        """
+        self.clock = clock
+        self.name = name
+
+        self._heap = []  # (deadline, sequence, ScheduledCall)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) once after delay seconds"""
+        return self._schedule(self.clock() + delay, None, callback, args)
+
+    def call_every(self, interval, callback, *args, first_delay=None):
+        """Run callback(*args) every interval seconds, first after first_delay (default interval)"""
+        delay = interval if first_delay is None else first_delay
+        return self._schedule(self.clock() + delay, interval, callback, args)
+
+    def _schedule(self, deadline, interval, callback, args):
+        """Push a new call onto the heap and wake the scheduler thread"""
+        call = ScheduledCall(deadline, interval, callback, args)
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._sequence), call))
+            self._condition.notify()
+        return call
+
+    def pending_count(self):
+        """Number of scheduled calls that are not cancelled"""
+        with self._condition:
+            return sum(1 for _, _, call in self._heap if not call.cancelled)
+
+    def start(self):
+        """Start the scheduler thread"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread; calls that are not due yet are not run"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+
+    def run_pending(self):
+        """Run every call that is due now in the calling thread; returns how many ran"""
+        count = 0
+        while True:
+            with self._condition:
+                call = self._pop_due()
+            if call is None:
+                return count
+            self._execute(call)
+            count += 1
+
+    def _pop_due(self):
+        """Remove and return the next due call, or None (called with the lock held)"""
+        now = self.clock()
+        while self._heap:
+            deadline, _, call = self._heap[0]
+            if call.cancelled:
+                heapq.heappop(self._heap)
+                continue
+            if deadline > now:
+                return None
+            heapq.heappop(self._heap)
+            if call.interval is not None:
+                # Fixed rate; runs missed while the thread was busy are skipped
+                next_deadline = deadline + call.interval
+                while next_deadline <= now:
+                    next_deadline += call.interval
+                call.deadline = next_deadline
+                heapq.heappush(self._heap, (next_deadline, next(self._sequence), call))
+            return call
+        return None
+
+    def _execute(self, call):
+        """Run one callback, keeping the scheduler alive if it raises"""
+        if call.cancelled:
+            return
+        try:
+            call.callback(*call.args)
+        except Exception as e:
+            logger.error("Error in scheduled callback %s: %s", getattr(call.callback, '__name__', call.callback), e)
+
+    def _run(self):
+        """Internal method - runs in the scheduler thread"""
+        while True:
+            with self._condition:
+                call = None
+                while self._running:
+                    call = self._pop_due()
+                    if call is not None:
+                        break
+                    timeout = self._heap[0][0] - self.clock() if self._heap else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+            self._execute(call)
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def default_scheduler():
+    """Shared, started Scheduler used by state machines that are not given one"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler(name="shared-scheduler")
+            _default_scheduler.start()
+        return _default_scheduler
@@ -1,11 +1,18 @@
+import logging
 import time
-import threading
 from datetime import datetime
 from google.cloud import firestore
+from scheduler import default_scheduler
+from outbox import Outbox
+from metrics import default_registry, TimedLock, LOCK_WAIT_BUCKETS
+
+
+logger = logging.getLogger(__name__)
 
 
 class ActivityStateMachine:
-    def __init__(self, firebase_client, debounce_duration=7, confidence_threshold=0.90, max_event_duration=600):
+    def __init__(self, firebase_client, debounce_duration=7, confidence_threshold=0.90, max_event_duration=600,
+                 status_update_interval=30, scheduler=None, outbox=None, metrics=None, room_id=None):
         """
         Initialize the state machine for activity tracking
         
@@ -14,23 +21,51 @@ class ActivityStateMachine:
             debounce_duration: Time in seconds to wait before confirming state change
             confidence_threshold: Minimum confidence for critical event detection
             max_event_duration: Maximum duration (seconds) before writing periodic events
+            status_update_interval: Seconds between patient status updates during an ongoing state
+            scheduler: Scheduler running debounce deadlines and periodic jobs
+                (default: the shared scheduler thread)
+            outbox: Outbox the Firebase writes are emitted to (default: a new
+                Outbox publishing to firebase_client)
+            metrics: MetricsRegistry for lock wait times and the outbox depth
+                (default: the shared registry)
+            room_id: Room this state machine tracks, added as a 'room' label
+                to its metrics when several rooms run in one process
         """
         self.firebase_client = firebase_client
         self.debounce_duration = debounce_duration
         self.confidence_threshold = confidence_threshold
         self.max_event_duration = max_event_duration  # 10 minutes default
+        self.status_update_interval = status_update_interval
+        self.scheduler = scheduler or default_scheduler()
+        
+        # Firebase writes are only emitted under the lock; a publisher thread performs them
+        self.outbox = outbox or Outbox(firebase_client)
         
         # State tracking
         self.current_state = None
         self.state_start_time = None
         self.pending_state = None
         self.pending_start_time = None
-        self.debounce_timer = None
+        self.debounce_timer = None  # ScheduledCall confirming the pending state
         self.last_event_write_time = None  # Track when we last wrote an event for current state
         self.last_status_update_time = None  # Track when we last updated patient status
+        self.last_confidence = None  # Latest confidence for the current state
+        
+        # Periodic jobs for the current state (ScheduledCall handles)
+        self.event_log_job = None
+        self.status_update_job = None
         
-        # Thread safety
-        self._lock = threading.Lock()
+        # Thread safety; time spent waiting for the lock is recorded
+        labels = {'room': room_id} if room_id else None
+        metrics = metrics or default_registry()
+        self._lock = TimedLock(metrics.histogram(
+            'senticare_state_machine_lock_wait_seconds',
+            'Time spent waiting for the ActivityStateMachine lock',
+            labels,
+            buckets=LOCK_WAIT_BUCKETS
+        ))
+        metrics.gauge('senticare_outbox_pending', 'Firebase writes emitted but not yet published',
+                      labels, callback=self.outbox.pending_count)
         
         # Valid states from specification
         self.valid_states = {
@@ -40,7 +75,7 @@ class ActivityStateMachine:
         # Critical events
         self.critical_events = {'FALL_DETECTED', 'HELP_SIGNAL_DETECTED'}
         
-        print("ActivityStateMachine initialized")
+        logger.info("ActivityStateMachine initialized")
     
     def process_prediction(self, prediction_result):
         """
@@ -65,18 +100,14 @@ class ActivityStateMachine:
     
     def _handle_critical_event(self, event_type, confidence):
         """Handle critical events immediately without debouncing"""
-        try:
-            print(f"CRITICAL EVENT DETECTED: {event_type} (confidence: {confidence:.3f})")
-            
-            # Write to alerts collection immediately
-            self.firebase_client.write_alert(event_type, confidence)
-            
-            # Also write to events collection for historical record
-            # For critical events, we use a minimal duration (1 second)
-            self.firebase_client.write_event(event_type, 1, confidence)
-            
-        except Exception as e:
-            print(f"Error handling critical event: {str(e)}")
+        logger.warning("CRITICAL EVENT DETECTED: %s (confidence: %.3f)", event_type, confidence)
+        
+        # Write to alerts collection immediately (ahead of queued routine writes)
+        self.outbox.emit('write_alert', event_type, confidence, priority=True)
+        
+        # Also write to events collection for historical record
+        # For critical events, we use a minimal duration (1 second)
+        self.outbox.emit('write_event', event_type, 1, confidence)
     
     def _handle_routine_state(self, new_state, confidence):
         """Handle routine state changes with debouncing logic"""
@@ -88,109 +119,106 @@ class ActivityStateMachine:
             self.state_start_time = current_time
             self.last_event_write_time = current_time
             self.last_status_update_time = current_time
-            print(f"Initial state set: {new_state}")
+            self.last_confidence = confidence
+            logger.info("Initial state set: %s", new_state)
             
             # Immediately update patient status for initial state
             self._update_patient_status_immediately(confidence)
+            self._schedule_periodic_jobs()
             return
         
-        # If new state is same as current state, check for periodic event logging
+        # If new state is same as current state, cancel any pending state change
         if new_state == self.current_state:
-            # Cancel any pending state change
             if self.debounce_timer:
                 self.debounce_timer.cancel()
                 self.debounce_timer = None
                 self.pending_state = None
                 self.pending_start_time = None
             
-            # Check if we need to write a periodic event for long-duration states
-            self._check_periodic_event_logging(confidence, current_time)
-            
-            # Also update patient status periodically (every 30 seconds) during ongoing states
-            self._check_periodic_status_update(confidence, current_time)
+            # Periodic event logging and status updates use the latest confidence
+            self.last_confidence = confidence
             return
         
         # If new state is different from current state
         if new_state != self.pending_state:
-            # Cancel previous debounce timer if exists
+            # Cancel previous debounce deadline if exists
             if self.debounce_timer:
                 self.debounce_timer.cancel()
             
-            # Start new debounce timer
+            # Schedule a new debounce deadline
             self.pending_state = new_state
             self.pending_start_time = current_time
             
-            print(f"State change detected: {self.current_state} -> {new_state}, starting debounce timer")
+            logger.info("State change detected: %s -> %s, starting debounce timer", self.current_state, new_state)
             
-            self.debounce_timer = threading.Timer(
+            self.debounce_timer = self.scheduler.call_later(
                 self.debounce_duration,
                 self._confirm_state_change,
-                args=[new_state, confidence, current_time]
+                new_state, confidence, current_time
             )
-            self.debounce_timer.start()
     
-    def _check_periodic_event_logging(self, confidence, current_time):
-        """Check if we need to write a periodic event for long-duration states"""
-        if not self.last_event_write_time:
-            self.last_event_write_time = self.state_start_time or current_time
-            return
-        
-        # Check if enough time has passed since last event write
-        time_since_last_write = current_time - self.last_event_write_time
-        
-        if time_since_last_write >= self.max_event_duration:
-            # Write a periodic event for the current ongoing state
-            duration_seconds = int(time_since_last_write)
+    def _schedule_periodic_jobs(self):
+        """(Re)start periodic event logging and status updates for the current state"""
+        self._cancel_periodic_jobs()
+        self.event_log_job = self.scheduler.call_every(self.max_event_duration, self._log_periodic_event)
+        self.status_update_job = self.scheduler.call_every(self.status_update_interval, self._periodic_status_update)
+    
+    def _cancel_periodic_jobs(self):
+        """Cancel the periodic jobs of the previous state"""
+        for job in (self.event_log_job, self.status_update_job):
+            if job:
+                job.cancel()
+        self.event_log_job = None
+        self.status_update_job = None
+    
+    def _log_periodic_event(self):
+        """Write a periodic event for long-duration states (scheduled every max_event_duration)"""
+        with self._lock:
+            if not self.current_state:
+                return
             
-            try:
-                self.firebase_client.write_event(
-                    self.current_state,
-                    duration_seconds,
-                    confidence
-                )
-                
-                # Update the last write time to current time
-                self.last_event_write_time = current_time
-                print(f"Periodic event logged: {self.current_state} ({duration_seconds}s)")
-                
-            except Exception as e:
-                print(f"Error writing periodic event: {str(e)}")
+            current_time = time.time()
+            duration_seconds = int(current_time - (self.last_event_write_time or self.state_start_time))
+            
+            self.outbox.emit('write_event', self.current_state, duration_seconds, self.last_confidence)
+            
+            # Update the last write time to current time
+            self.last_event_write_time = current_time
+            logger.info("Periodic event logged: %s (%ss)", self.current_state, duration_seconds)
 
     def _confirm_state_change(self, new_state, confidence, change_time):
         """Confirm state change after debounce period"""
         with self._lock:
-            try:
-                # Calculate duration of previous state
-                if self.state_start_time:
-                    duration_seconds = int(change_time - self.state_start_time)
-                    
-                    # Write previous state to events collection
-                    if duration_seconds > 0:  # Only write if duration is positive
-                        self.firebase_client.write_event(
-                            self.current_state,
-                            duration_seconds,
-                            confidence
-                        )
-                
-                # Update to new state
-                previous_state = self.current_state
-                self.current_state = new_state
-                self.state_start_time = change_time
-                self.last_event_write_time = change_time  # Reset periodic logging timer
-                self.last_status_update_time = change_time  # Reset status update timer
-                
-                # Clear pending state
-                self.pending_state = None
-                self.pending_start_time = None
-                self.debounce_timer = None
-                
-                print(f"State change confirmed: {previous_state} -> {new_state}")
-                
-                # Immediately update patient status for new confirmed state
-                self._update_patient_status_immediately(confidence)
+            # The deadline may have been cancelled while the scheduler was running it
+            if self.pending_state != new_state or self.pending_start_time != change_time:
+                return
+            
+            # Calculate duration of previous state
+            if self.state_start_time:
+                duration_seconds = int(change_time - self.state_start_time)
                 
-            except Exception as e:
-                print(f"Error confirming state change: {str(e)}")
+                # Write previous state to events collection
+                if duration_seconds > 0:  # Only write if duration is positive
+                    self.outbox.emit('write_event', self.current_state, duration_seconds, confidence)
+            
+            # Update to new state
+            previous_state = self.current_state
+            self.current_state = new_state
+            self.state_start_time = change_time
+            self.last_event_write_time = change_time  # Reset periodic logging timer
+            self.last_status_update_time = change_time  # Reset status update timer
+            self.last_confidence = confidence
+            
+            # Clear pending state
+            self.pending_state = None
+            self.pending_start_time = None
+            self.debounce_timer = None
+            
+            logger.info("State change confirmed: %s -> %s", previous_state, new_state)
+            
+            # Immediately update patient status for new confirmed state
+            self._update_patient_status_immediately(confidence)
+            self._schedule_periodic_jobs()
     
     def get_current_state(self):
         """Get current state information"""
@@ -205,74 +233,51 @@ class ActivityStateMachine:
     def force_heartbeat_update(self, confidence):
         """Force a heartbeat update to patient status"""
         with self._lock:
-            if self.current_state and self.state_start_time:
-                try:
-                    # Convert timestamp to Firestore timestamp
-                    state_start_timestamp = firestore.SERVER_TIMESTAMP
-                    if self.state_start_time:
-                        state_start_timestamp = datetime.fromtimestamp(self.state_start_time)
-                    
-                    self.firebase_client.update_patient_status(
-                        self.current_state,
-                        state_start_timestamp,
-                        confidence
-                    )
-                except Exception as e:
-                    print(f"Error during heartbeat update: {str(e)}")
+            self._emit_patient_status(confidence)
     
     def shutdown(self):
-        """Clean shutdown of state machine"""
+        """Clean shutdown of state machine; publishes all emitted writes before returning"""
         with self._lock:
             if self.debounce_timer:
                 self.debounce_timer.cancel()
                 self.debounce_timer = None
+            self._cancel_periodic_jobs()
             
             # Write final state if exists
             if self.current_state and self.state_start_time:
-                try:
-                    duration_seconds = int(time.time() - self.state_start_time)
-                    if duration_seconds > 0:
-                        self.firebase_client.write_event(
-                            self.current_state,
-                            duration_seconds,
-                            0.5  # Default confidence for shutdown
-                        )
-                except Exception as e:
-                    print(f"Error writing final state during shutdown: {str(e)}")
-            
-            print("ActivityStateMachine shutdown complete")
+                duration_seconds = int(time.time() - self.state_start_time)
+                if duration_seconds > 0:
+                    self.outbox.emit(
+                        'write_event',
+                        self.current_state,
+                        duration_seconds,
+                        0.5  # Default confidence for shutdown
+                    )
+        
+        # Drain the outbox outside the lock
+        self.outbox.close()
+        logger.info("ActivityStateMachine shutdown complete")
+    
+    def _emit_patient_status(self, confidence):
+        """Emit a patient status update for the current state (called with the lock held)"""
+        if not (self.current_state and self.state_start_time):
+            return False
+        
+        # Convert timestamp to Firestore timestamp
+        state_start_timestamp = firestore.SERVER_TIMESTAMP
+        if self.state_start_time:
+            state_start_timestamp = datetime.fromtimestamp(self.state_start_time)
+        
+        self.outbox.emit('update_patient_status', self.current_state, state_start_timestamp, confidence)
+        return True
     
     def _update_patient_status_immediately(self, confidence):
         """Immediately update patient status in Firebase"""
-        try:
-            if self.current_state and self.state_start_time:
-                # Convert timestamp to Firestore timestamp
-                state_start_timestamp = firestore.SERVER_TIMESTAMP
-                if self.state_start_time:
-                    state_start_timestamp = datetime.fromtimestamp(self.state_start_time)
-                
-                self.firebase_client.update_patient_status(
-                    self.current_state,
-                    state_start_timestamp,
-                    confidence
-                )
-                print(f"Patient status updated immediately: {self.current_state}")
-        except Exception as e:
-            print(f"Error updating patient status immediately: {str(e)}")
+        if self._emit_patient_status(confidence):
+            logger.debug("Patient status updated immediately: %s", self.current_state)
     
-    def _check_periodic_status_update(self, confidence, current_time):
-        """Check if we need to update patient status periodically (every 30 seconds)"""
-        if not self.last_status_update_time:
-            self.last_status_update_time = self.state_start_time or current_time
-            return
-        
-        # Check if enough time has passed since last status update (30 seconds)
-        time_since_last_update = current_time - self.last_status_update_time
-        
-        if time_since_last_update >= 30:  # Update every 30 seconds
-            try:
-                self._update_patient_status_immediately(confidence)
-                self.last_status_update_time = current_time
-                
-            except Exception as e:
-                print(f"Error during periodic status update: {str(e)}")
+    def _periodic_status_update(self):
+        """Update patient status during an ongoing state (scheduled every status_update_interval)"""
+        with self._lock:
+            self._update_patient_status_immediately(self.last_confidence)
+            self.last_status_update_time = time.time()
@@ -0,0 +1,185 @@
+"""
+Coalescing publisher for the patientStatus document
+
+The state machine and the monitor's heartbeat update patientStatus/{patientId}
+on the initial state, on every confirmed state change, every 30 seconds
+during an ongoing state, and on every heartbeat. Most of those updates carry
+the same state and only refresh lastSeen.
+
+StatusPublisher keeps a single latest-value-wins slot instead of writing each
+update:
+
+- a change of currentState or stateStartTime is written right away
+- other updates are written at most once per coalesce window; updates that
+  arrive within the window replace each other and only the newest is written
+- updates in which nothing but lastSeen (and the confidence, within a small
+  epsilon) changed are skipped unless the last write is older than the
+  liveness interval, so dashboards still see the monitor is alive
+
+A background thread performs the writes; get_stats() reports how many writes
+were saved.
+"""
+
+import logging
+import time
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+# Fields that change on every update without changing what the dashboard shows
+VOLATILE_FIELDS = ('lastSeen', 'confidenceScore')
+
+
+class StatusPublisher:
+    """Latest-value-wins slot in front of patientStatus writes"""
+
+    def __init__(self, write_status, coalesce_window=5.0, liveness_interval=120.0, confidence_epsilon=0.05):
+        """
+        Args:
+            write_status: Callable taking the status dict and performing the write
+            coalesce_window: Minimum seconds between two writes that do not
+                change the state
+            liveness_interval: Maximum seconds without a write; an update that
+                changes nothing is still written once this has passed
+            confidence_epsilon: Confidence changes smaller than this do not
+                count as a change
+        """
+        self.write_status = write_status
+        self.coalesce_window = coalesce_window
+        self.liveness_interval = liveness_interval
+        self.confidence_epsilon = confidence_epsilon
+
+        self.received_count = 0
+        self.written_count = 0
+        self.coalesced_count = 0
+        self.skipped_count = 0
+
+        self._pending = None
+        self._last_written = None
+        self._last_write_time = None
+        self._writing = False
+        self._flush_requested = False
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="status-publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, status_data):
+        """Replace the pending status update with a newer one"""
+        with self._condition:
+            self.received_count += 1
+            if self._pending is not None:
+                self.coalesced_count += 1
+            self._pending = status_data
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Write the pending update now (if it is needed) and wait; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            try:
+                while self._pending is not None or self._writing:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self._flush_requested = False
+        return True
+
+    def close(self, timeout=5.0):
+        """Flush the pending update and stop the publisher thread"""
+        self.flush(timeout)
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout=2.0)
+
+    def get_stats(self):
+        """Received, written and saved status writes"""
+        with self._condition:
+            return {
+                'received': self.received_count,
+                'written': self.written_count,
+                'coalesced': self.coalesced_count,
+                'skipped': self.skipped_count,
+                'saved': self.coalesced_count + self.skipped_count
+            }
+
+    def _state_changed(self, status_data):
+        """True if the update changes anything besides the volatile fields"""
+        if self._last_written is None:
+            return True
+        return any(
+            status_data.get(key) != self._last_written.get(key)
+            for key in set(status_data) | set(self._last_written)
+            if key not in VOLATILE_FIELDS
+        )
+
+    def _confidence_changed(self, status_data):
+        """True if the confidence moved by at least confidence_epsilon since the last write"""
+        previous = self._last_written.get('confidenceScore')
+        current = status_data.get('confidenceScore')
+        if previous is None or current is None:
+            return previous != current
+        return abs(current - previous) >= self.confidence_epsilon
+
+    def _next_write(self):
+        """Wait until the pending update is due and take it (called with the lock held)"""
+        while self._running:
+            if self._pending is None:
+                self._condition.wait()
+                continue
+
+            if self._state_changed(self._pending):
+                return self._take_pending()
+
+            since_write = time.monotonic() - self._last_write_time
+            if since_write >= self.liveness_interval:
+                return self._take_pending()
+
+            if not self._confidence_changed(self._pending):
+                # Only lastSeen changed and the liveness deadline is not due
+                self._pending = None
+                self.skipped_count += 1
+                self._condition.notify_all()
+                continue
+
+            if since_write >= self.coalesce_window or self._flush_requested:
+                return self._take_pending()
+            self._condition.wait(self.coalesce_window - since_write)
+        return None
+
+    def _take_pending(self):
+        """Remove the pending update and mark a write as in progress"""
+        status_data = self._pending
+        self._pending = None
+        self._writing = True
+        return status_data
+
+    def _run(self):
+        """Internal method - runs in the publisher thread"""
+        while True:
+            with self._condition:
+                status_data = self._next_write()
+                if status_data is None:
+                    return
+
+            try:
+                self.write_status(status_data)
+                written = True
+            except Exception as e:
+                logger.error("Error publishing patient status: %s", e)
+                written = False
+
+            with self._condition:
+                if written:
+                    self._last_written = status_data
+                    self._last_write_time = time.monotonic()
+                    self.written_count += 1
+                self._writing = False
+                self._condition.notify_all()
@@ -0,0 +1,143 @@
+"""
+Temporal smoothing of model predictions
+
+Each clip's prediction is noisy on its own: a single clip that looks like
+'sit_down' in the middle of a walk is enough to start a state change. The
+TemporalFilter keeps an exponential moving average of the model's
+probability vector over the 10 raw classes and derives the activity state
+from the filtered posterior instead of from one clip:
+
+- the average is time-aware: a clip arriving after a long gap weighs more
+  than one arriving shortly after the previous clip, so the filter reacts
+  within about time_constant seconds regardless of the inference rate
+- raw classes are summed per state through the label mapping (e.g.
+  'sit_down' and 'sitting' both count towards SITTING)
+- hysteresis: the held state only changes when another state's filtered
+  probability reaches enter_threshold; the held state is kept while its own
+  probability stays above exit_threshold, and is dropped below it only when
+  another state takes over
+- critical classes (falls) bypass the smoothing: a single clip with a
+  critical probability of at least critical_threshold is emitted at once
+
+update() returns the same prediction dict ModelInterface produces, with the
+filtered confidence and the full filtered probability vector.
+"""
+
+import math
+import numpy as np
+
+
+class TemporalFilter:
+    """Time-aware EMA over raw class probabilities with hysteresis on the derived state"""
+
+    def __init__(self, label_mapping, critical_classes, time_constant=1.5,
+                 enter_threshold=0.6, exit_threshold=0.4, critical_threshold=0.65):
+        """
+        Args:
+            label_mapping: Raw class index -> state name (ModelInterface.label_mapping)
+            critical_classes: Raw class indices emitted without smoothing
+            time_constant: Seconds for the average to move ~63% of the way to a new
+                steady prediction
+            enter_threshold: Filtered probability a state needs to become the held state
+            exit_threshold: The held state is kept while its filtered probability
+                stays at or above this
+            critical_threshold: Raw probability of a critical class that is
+                emitted immediately
+        """
+        if exit_threshold > enter_threshold:
+            raise ValueError("exit_threshold must not exceed enter_threshold")
+
+        self.label_mapping = dict(label_mapping)
+        self.critical_classes = set(critical_classes)
+        self.time_constant = time_constant
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = exit_threshold
+        self.critical_threshold = critical_threshold
+
+        num_classes = max(self.label_mapping) + 1
+        self.states = sorted({
+            state for index, state in self.label_mapping.items() if index not in self.critical_classes
+        })
+        # (num_states, num_classes) matrix summing raw classes into routine states
+        self._aggregation = np.zeros((len(self.states), num_classes), dtype=np.float64)
+        for index, state in self.label_mapping.items():
+            if index not in self.critical_classes:
+                self._aggregation[self.states.index(state), index] = 1.0
+
+        self.reset()
+
+    def reset(self):
+        """Forget the filtered posterior and the held state"""
+        self._posterior = None
+        self._last_timestamp = None
+        self.current_state = None
+
+    @property
+    def probabilities(self):
+        """Filtered probability of each raw class (None before the first update)"""
+        return None if self._posterior is None else self._posterior.copy()
+
+    def state_probabilities(self):
+        """Filtered probability of each routine state"""
+        if self._posterior is None:
+            return {}
+        return dict(zip(self.states, (self._aggregation @ self._posterior).tolist()))
+
+    def update(self, probabilities, timestamp):
+        """
+        Add one clip's probability vector to the filter
+
+        Args:
+            probabilities: Softmax output over the raw classes
+            timestamp: Capture time of the clip in seconds
+
+        Returns:
+            Prediction dict for the held (or critical) state, or None while no
+            state has reached enter_threshold yet
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+
+        if self._posterior is None:
+            self._posterior = probabilities.copy()
+        else:
+            elapsed = max(timestamp - self._last_timestamp, 0.0)
+            alpha = 1.0 - math.exp(-elapsed / self.time_constant)
+            self._posterior += alpha * (probabilities - self._posterior)
+        self._last_timestamp = timestamp
+
+        # Critical classes: one confident clip is enough
+        for index in self.critical_classes:
+            if probabilities[index] >= self.critical_threshold:
+                return self._prediction(self.label_mapping[index], float(probabilities[index]), index, True)
+
+        state_probabilities = self._aggregation @ self._posterior
+        best = int(np.argmax(state_probabilities))
+        best_state = self.states[best]
+        best_probability = float(state_probabilities[best])
+
+        if best_state != self.current_state and best_probability >= self.enter_threshold:
+            self.current_state = best_state
+        elif self.current_state is not None:
+            held_probability = float(state_probabilities[self.states.index(self.current_state)])
+            if held_probability < self.exit_threshold and best_probability >= self.exit_threshold:
+                # The held state faded and another one is clearly ahead
+                self.current_state = best_state
+
+        if self.current_state is None:
+            return None
+
+        state_index = self.states.index(self.current_state)
+        class_mask = self._aggregation[state_index] > 0
+        raw_class = int(np.argmax(np.where(class_mask, self._posterior, -1.0)))
+        return self._prediction(self.current_state, float(state_probabilities[state_index]), raw_class, False)
+
+    def _prediction(self, state, confidence, raw_class, is_critical):
+        """Prediction dict in the format ModelInterface.predict_input returns"""
+        return {
+            'state': state,
+            'confidence': confidence,
+            'is_critical': is_critical,
+            'raw_class': raw_class,
+            'firebase_compatible': True,
+            'probabilities': self._posterior.tolist()
+        }
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test that every inference backend produces the same result for the same clip
+
+Builds a small model from the SentiVision custom layers, exports it with
+export_model.py's converters, and checks that the Keras, TFLite and ONNX
+backends agree on the top class and on the probabilities. If exported
+SentiVision models exist in models/, they are checked against the Keras
+model as well.
+"""
+
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress TensorFlow logging
+
+import tempfile
+import importlib.util
+import numpy as np
+import tensorflow as tf
+from model_layers import Conv2Plus1D, ResizeVideo, Project
+from inference_backends import BACKENDS, create_backend
+from export_model import convert_to_tflite, convert_to_onnx
+
+# float32 exports should match the Keras model almost exactly
+PROBABILITY_TOLERANCE = 1e-3
+
+
+def build_reference_model():
+    """Small model exercising the custom SentiVision layers"""
+    inputs = tf.keras.Input(shape=(20, 224, 224, 3))
+    x = ResizeVideo(56, 56)(inputs)
+    x = Conv2Plus1D(filters=8, kernel_size=(3, 3, 3), padding='same')(x)
+    x = tf.keras.layers.GlobalAveragePooling3D()(x)
+    outputs = Project(10)(x)
+    return tf.keras.Model(inputs, outputs)
+
+
+def export_reference_models(directory):
+    """Save the reference model and export it for every available backend"""
+    model = build_reference_model()
+    model_paths = {'keras': os.path.join(directory, 'reference.keras')}
+    model.save(model_paths['keras'])
+
+    model_paths['tflite'] = os.path.join(directory, 'reference.tflite')
+    with open(model_paths['tflite'], 'wb') as f:
+        f.write(convert_to_tflite(model, 'float32'))
+
+    if importlib.util.find_spec('tf2onnx') and importlib.util.find_spec('onnxruntime'):
+        model_paths['onnx'] = os.path.join(directory, 'reference.onnx')
+        convert_to_onnx(model, model_paths['onnx'])
+    else:
+        print("Skipping ONNX backend (tf2onnx or onnxruntime not installed)")
+
+    return model_paths
+
+
+def assert_backends_agree(model_paths, clips):
+    """Run every backend on the same clips and compare with the Keras backend"""
+    results = {}
+    for name, path in model_paths.items():
+        backend = create_backend(name, path, compile_inference=False)
+        results[name] = backend.predict_batch(clips)
+
+    reference_probabilities, reference_classes = results['keras']
+    for name, (probabilities, predicted_classes) in results.items():
+        assert probabilities.shape == reference_probabilities.shape, f"{name}: shape {probabilities.shape}"
+        assert np.array_equal(predicted_classes, reference_classes), \
+            f"{name}: top class {predicted_classes} != keras {reference_classes}"
+        max_difference = float(np.abs(probabilities - reference_probabilities).max())
+        assert max_difference < PROBABILITY_TOLERANCE, f"{name}: max probability difference {max_difference}"
+        print(f"✅ {name} matches keras (max difference {max_difference:.2e})")
+
+
+def test_backend_parity():
+    """Reference model: all registered backends agree"""
+    clips = np.random.default_rng(0).random((2, 20, 224, 224, 3), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_paths = export_reference_models(directory)
+        assert_backends_agree(model_paths, clips)
+
+
+def test_exported_model_parity():
+    """Real SentiVision model: exported float models agree with the Keras model"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    model_paths = {}
+    for name in ('keras', 'onnx'):
+        path = os.path.join(script_dir, BACKENDS[name].default_model_path)
+        if os.path.exists(path):
+            model_paths[name] = path
+    float32_path = os.path.join(script_dir, 'models/SentiVision_float32.tflite')
+    if os.path.exists(float32_path):
+        model_paths['tflite'] = float32_path
+
+    if 'keras' not in model_paths or len(model_paths) < 2:
+        print("Skipping exported model parity (no exported SentiVision models found)")
+        return
+
+    clips = np.random.default_rng(0).random((1, 20, 224, 224, 3), dtype=np.float32)
+    assert_backends_agree(model_paths, clips)
+
+
+if __name__ == "__main__":
+    print("SentiVision Backend Parity Test")
+    print("=" * 40)
+    test_backend_parity()
+    test_exported_model_parity()
+    print("\n🎉 All backends agree!")
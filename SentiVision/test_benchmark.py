@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test the benchmark harness and the local Firestore stand-in
+
+Replays a short synthetic .npz recording through the full monitor (with the
+mock model if no trained model is present) against a LocalFirestore, so no
+camera, credentials or network access are needed.
+"""
+
+import os
+import json
+import tempfile
+import numpy as np
+from local_firestore import LocalFirestore
+from firestore_writer import FirestoreWriter
+from benchmark import run_benchmark, summarize, compare_results
+
+
+def test_summarize():
+    """Percentiles are reported in milliseconds"""
+    stats = summarize([i / 1000.0 for i in range(1, 101)])
+    assert stats['count'] == 100
+    assert abs(stats['p50_ms'] - 50.5) < 1e-6
+    assert abs(stats['p99_ms'] - 99.01) < 1e-6
+    assert stats['max_ms'] == 100.0
+    assert summarize([]) == {'count': 0}
+    print("✅ Latency percentiles")
+
+
+def test_local_firestore():
+    """Direct writes, batch commits through FirestoreWriter, and outages"""
+    db = LocalFirestore()
+    _, doc_ref = db.collection('events').add({'eventType': 'SITTING'})
+    assert len(doc_ref.id) == 20
+    assert doc_ref.get_data() == {'eventType': 'SITTING'}
+
+    writer = FirestoreWriter(db, batch_size=3, flush_interval=0.1)
+    futures = [writer.submit({'type': 'add', 'collection': 'events', 'data': {'n': n}}) for n in range(3)]
+    writer.submit({'type': 'set', 'collection': 'patientStatus', 'document': 'p1',
+                   'data': {'currentState': 'IDLE'}})
+    assert writer.flush(5.0)
+    assert all(future.result(1.0).get_data() is not None for future in futures)
+    assert db.count('events') == 4
+    assert db.collection('patientStatus').document('p1').get_data() == {'currentState': 'IDLE'}
+    writer.close()
+
+    db.online = False
+    try:
+        db.collection('alerts').add({'alertType': 'FALL_DETECTED'})
+        assert False, "Expected ConnectionError while offline"
+    except ConnectionError:
+        pass
+    print(f"✅ Local Firestore: {db.round_trips} round-trips, {db.written_documents} documents")
+
+
+def test_benchmark_replay():
+    """A replayed recording produces per-stage latencies, throughput and JSON-serializable results"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'recording.npz')
+        rng = np.random.default_rng(0)
+        np.savez(path, frames=rng.random((80, 120, 160, 3), dtype=np.float32))
+
+        results = run_benchmark(
+            path,
+            pace='realtime',
+            firestore_latency=0.01,
+            # Let the mock model's low-confidence predictions through to Firestore
+            overrides={'temporal_filter': False, 'min_confidence': 0.0, 'confidence_threshold': 0.0,
+                       'motion_gate': False}
+        )
+
+    assert results['throughput']['frames'] == 80
+    assert results['throughput']['frames_per_s'] > 0
+    latency = results['latency_ms']
+    for stage in ('decode', 'store', 'preprocess', 'inference', 'publish', 'end_to_end', 'firestore'):
+        assert latency[stage]['count'] > 0, stage
+        assert latency[stage]['p50_ms'] <= latency[stage]['p95_ms'] <= latency[stage]['p99_ms'], stage
+    assert results['firestore']['documents_written'] > 0
+    assert results['resources']['cpu_percent'] > 0
+    json.dumps(results)
+
+    lines = compare_results(results, results)
+    assert lines and all('+0.0%' in line for line in lines)
+    print(f"✅ Benchmark: {results['throughput']['inferences_per_s']:.1f} inferences/s, "
+          f"end-to-end p95 {latency['end_to_end']['p95_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    print("Benchmark Test")
+    print("=" * 40)
+    test_summarize()
+    test_local_firestore()
+    test_benchmark_replay()
+    print("\n🎉 All benchmark tests passed!")
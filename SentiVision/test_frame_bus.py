@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Test the shared-memory frame bus
+
+Covers the ring and its seqlock in one process, a reader in a separate
+process, a reader checking every frame's checksum against a publisher
+writing as fast as it can, replacing the bus of a publisher that crashed (and readers
+following it to the new bus), and a Webcam
+publishing a replayed recording to a second Webcam reading through a
+FrameBusSource.
+"""
+
+import os
+import time
+import zlib
+import tempfile
+import multiprocessing
+import numpy as np
+from frame_bus import FrameBus
+from frame_sources import FrameBusSource, create_frame_source
+from camera import Webcam
+
+
+def _bus_name(test):
+    return f"senticare-test-{test}-{os.getpid()}"
+
+
+def _read_latest_in_child(name, results):
+    """Child process: attach by name and report the newest frame's sequence and value"""
+    bus = FrameBus.attach(name)
+    sequence = bus.latest_sequence()
+    frame, _ = bus.read(sequence)
+    results.put((sequence, int(frame[0, 0, 0]), frame.shape))
+    bus.close()
+
+
+def _publish_in_child(name, published):
+    """Child process: publish one frame, then wait to be killed without closing the bus"""
+    bus = FrameBus.create(name, (8, 8, 3), capacity=4)
+    bus.publish(np.full((8, 8, 3), 7, dtype=np.uint8))
+    published.set()
+    time.sleep(60)
+
+
+STRESS_SHAPE = (120, 160, 3)
+
+
+def _frame_is_intact(frame, sequence):
+    """True if frame carries sequence and a CRC matching its contents (see _publish_checksummed_in_child)"""
+    flat = frame.reshape(-1)
+    return (int.from_bytes(flat[4:12].tobytes(), 'little') == sequence
+            and int.from_bytes(flat[:4].tobytes(), 'little') == zlib.crc32(flat[4:]))
+
+
+def _publish_checksummed_in_child(name, ready, stop):
+    """Child process: publish frames without pausing, each starting with its CRC and sequence, until stopped"""
+    patterns = np.random.default_rng(0).integers(0, 256, size=(8,) + STRESS_SHAPE, dtype=np.uint8)
+    bus = FrameBus.create(name, STRESS_SHAPE, capacity=4)
+    ready.set()
+    sequence = 0
+    try:
+        while not stop.is_set():
+            frame = patterns[sequence % len(patterns)]
+            flat = frame.reshape(-1)
+            flat[4:12] = np.frombuffer(sequence.to_bytes(8, 'little'), dtype=np.uint8)
+            flat[:4] = np.frombuffer(zlib.crc32(flat[4:]).to_bytes(4, 'little'), dtype=np.uint8)
+            bus.publish(frame)
+            sequence += 1
+    finally:
+        bus.close()
+
+
+def _start_crashing_publisher(name):
+    context = multiprocessing.get_context('spawn')
+    published = context.Event()
+    process = context.Process(target=_publish_in_child, args=(name, published), daemon=True)
+    process.start()
+    assert published.wait(60)
+    return process
+
+
+def test_ring_and_seqlock():
+    """Frames are read back by sequence; overwritten and half-written slots are rejected"""
+    bus = FrameBus.create(_bus_name('ring'), (4, 6, 3), capacity=4)
+    reader = FrameBus.attach(bus.name)
+    try:
+        assert reader.latest_sequence() == -1
+        for value in range(6):
+            assert bus.publish(np.full((4, 6, 3), value, dtype=np.uint8), timestamp=float(value)) == value
+
+        assert reader.latest_sequence() == 5
+        frame, timestamp = reader.read(5)
+        assert frame[0, 0, 0] == 5 and timestamp == 5.0
+        assert reader.read(1) == (None, None)  # Overwritten by frame 5
+        assert reader.read(9) == (None, None)  # Not published yet
+
+        view, version = reader.view(4)
+        assert view[0, 0, 0] == 4 and not view.flags.writeable
+        assert reader.is_current(4, version)
+        for value in range(6, 10):
+            bus.publish(np.full((4, 6, 3), value, dtype=np.uint8))
+        assert not reader.is_current(4, version)
+
+        # A slot the writer is in the middle of is never returned
+        slot = 9 % bus.capacity
+        bus._slots[slot, 0] += 1
+        assert reader.read(9) == (None, None)
+        bus._slots[slot, 0] += 1
+        assert reader.read(9)[0] is not None
+    finally:
+        reader.close()
+        bus.close()
+    print("✅ Frame bus ring and seqlock")
+
+
+def test_reader_process():
+    """Another process reads the newest frame by bus name"""
+    bus = FrameBus.create(_bus_name('process'), (8, 8, 3), capacity=8)
+    try:
+        for value in range(3):
+            bus.publish(np.full((8, 8, 3), 10 + value, dtype=np.uint8))
+
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        process = context.Process(target=_read_latest_in_child, args=(bus.name, results))
+        process.start()
+        sequence, value, shape = results.get(timeout=60)
+        process.join(10)
+
+        assert (sequence, value, shape) == (2, 12, (8, 8, 3))
+        # The child detaching must not remove the bus
+        reader = FrameBus.attach(bus.name)
+        assert reader.latest_sequence() == 2
+        reader.close()
+    finally:
+        bus.close()
+    print("✅ Frame bus read from another process")
+
+
+def test_no_torn_frames():
+    """A reader racing a publisher process never accepts a frame whose checksum does not match"""
+    name = _bus_name('stress')
+    context = multiprocessing.get_context('spawn')
+    ready, stop = context.Event(), context.Event()
+    process = context.Process(target=_publish_checksummed_in_child, args=(name, ready, stop), daemon=True)
+    process.start()
+    assert ready.wait(60)
+    reader = FrameBus.attach(name)
+    out = np.empty(STRESS_SHAPE, dtype=np.uint8)
+    accepted = rejected = 0
+    try:
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline:
+            latest = reader.latest_sequence()
+            if latest < 0:
+                continue
+            # The newest frame, and the oldest one, which is the next to be overwritten
+            for sequence in (latest, max(latest - reader.capacity + 1, 0)):
+                frame, _ = reader.read(sequence, out=out)
+                if frame is None:
+                    rejected += 1
+                else:
+                    assert _frame_is_intact(frame, sequence), sequence
+                    accepted += 1
+
+                view, version = reader.view(sequence)
+                if view is not None:
+                    intact = _frame_is_intact(view, sequence)
+                    if reader.is_current(sequence, version):
+                        assert intact, sequence
+        published = reader.latest_sequence() + 1
+    finally:
+        stop.set()
+        process.join(10)
+        reader.close()
+
+    assert accepted > 100, accepted
+    print(f"✅ No torn frames: {accepted} checked, {rejected} rejected, {published} published")
+
+
+def test_replace_crashed_publisher():
+    """A running publisher's bus is only replaced with force; a crashed one's is replaced"""
+    name = _bus_name('crash')
+    publisher = _start_crashing_publisher(name)
+    bus = None
+    try:
+        try:
+            FrameBus.create(name, (8, 8, 3))
+            assert False, "A bus with a running publisher must not be replaced"
+        except FileExistsError:
+            pass
+
+        bus = FrameBus.create(name, (8, 8, 3), capacity=4, force=True)
+        assert bus.latest_sequence() == -1
+        bus.close()
+        bus = None
+        publisher.kill()
+        publisher.join(10)
+
+        publisher = _start_crashing_publisher(name)
+        publisher.kill()
+        publisher.join(10)
+        bus = FrameBus.create(name, (8, 8, 3), capacity=4)
+        assert bus.latest_sequence() == -1 and not bus.is_closed()
+    finally:
+        if publisher.is_alive():
+            publisher.kill()
+        if bus is not None:
+            bus.close()
+    print("✅ Frame bus of a crashed publisher replaced")
+
+
+def test_reader_follows_restarted_publisher():
+    """A FrameBusSource re-attaches when a crashed publisher's bus is replaced without being closed"""
+    name = _bus_name('restart')
+    publisher = _start_crashing_publisher(name)
+    source = FrameBusSource(name, timeout=0.2)
+    bus = None
+    try:
+        ok, frame = source.read()
+        assert ok and frame[0, 0, 0] == 7
+
+        publisher.kill()
+        publisher.join(10)
+        bus = FrameBus.create(name, (8, 8, 3), capacity=4)
+        bus.publish(np.full((8, 8, 3), 9, dtype=np.uint8))
+
+        for _ in range(5):
+            ok, frame = source.read()
+            if ok:
+                break
+        assert ok and frame[0, 0, 0] == 9
+    finally:
+        source.release()
+        if publisher.is_alive():
+            publisher.kill()
+        if bus is not None:
+            bus.close()
+    print("✅ Frame bus reader followed a restarted publisher")
+
+
+def test_webcam_publishes_to_bus_source():
+    """A consumer Webcam reads what a publishing Webcam captured, without opening the source"""
+    name = _bus_name('webcam')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'recording.npz')
+        np.savez(path, frames=np.random.default_rng(0).random((40, 60, 80, 3), dtype=np.float32))
+
+        publisher = Webcam(clip_length=4,
+                           capture={'source': path, 'pace': 'realtime', 'fps': 40, 'frame_bus': name})
+        publisher.capture_frame()  # Creates the bus with the first frame
+        source = create_frame_source({'source': f'bus:{name}'})
+        assert isinstance(source, FrameBusSource)
+        source.release()
+
+        consumer = Webcam(clip_length=4, capture={'source': f'bus:{name}'})
+        try:
+            consumer.start_capture()
+            publisher.start_capture()
+            deadline = time.time() + 10
+            while not consumer.is_ready() and time.time() < deadline:
+                time.sleep(0.05)
+            assert consumer.is_ready()
+            assert consumer.get_frame().shape == (60, 80, 3)
+        finally:
+            consumer.release_camera()
+            publisher.release_camera()
+
+    try:
+        FrameBus.attach(name)
+        assert False, "The publisher should remove the bus on release"
+    except FileNotFoundError:
+        pass
+    print(f"✅ Webcam frames shared through a frame bus ({consumer.source.frames_read} read)")
+
+
+if __name__ == "__main__":
+    test_ring_and_seqlock()
+    test_reader_process()
+    test_no_torn_frames()
+    test_replace_crashed_publisher()
+    test_reader_follows_restarted_publisher()
+    test_webcam_publishes_to_bus_source()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test frame replay sources and Webcam without a camera
+
+Writes a short video, .npz clips and an image sequence to a temporary
+directory and replays them through the FrameSource classes and Webcam.
+"""
+
+import os
+import time
+import tempfile
+import cv2
+import numpy as np
+from frame_sources import (
+    create_frame_source, VideoFileSource, NpzClipSource, ImageSequenceSource
+)
+from camera import Webcam
+
+
+def synthetic_frames(count, height=120, width=160):
+    """Frames whose pixel values encode their index"""
+    return [np.full((height, width, 3), index * 10, dtype=np.uint8) for index in range(count)]
+
+
+def read_all(source):
+    frames = []
+    while True:
+        ok, frame = source.read()
+        if not ok:
+            break
+        frames.append(frame.copy())
+    return frames
+
+
+def test_replay_sources():
+    """Every replay source returns all frames in order, as BGR uint8"""
+    frames = synthetic_frames(12)
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = os.path.join(directory, 'clip.avi')
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 20, (160, 120))
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+
+        # Training clips are RGB floats in [0, 1]
+        npz_dir = os.path.join(directory, 'clips')
+        os.makedirs(npz_dir)
+        for part in range(2):
+            clip = np.stack(frames[part * 6:(part + 1) * 6])[..., ::-1].astype(np.float32) / 255.0
+            np.savez(os.path.join(npz_dir, f'clip_{part}.npz'), frames=clip)
+
+        image_dir = os.path.join(directory, 'images')
+        os.makedirs(image_dir)
+        for index, frame in enumerate(frames):
+            cv2.imwrite(os.path.join(image_dir, f'{index:04d}.png'), frame)
+
+        sources = {
+            'video': create_frame_source({'source': video_path, 'pace': 'fast'}),
+            'npz': create_frame_source({'source': npz_dir, 'pace': 'fast'}),
+            'images': create_frame_source({'source': image_dir, 'pace': 'fast'})
+        }
+        assert isinstance(sources['video'], VideoFileSource)
+        assert isinstance(sources['npz'], NpzClipSource)
+        assert isinstance(sources['images'], ImageSequenceSource)
+
+        for name, source in sources.items():
+            replayed = read_all(source)
+            source.release()
+            assert source.finished, name
+            assert len(replayed) == 12, f"{name}: {len(replayed)} frames"
+            values = [int(np.median(frame)) for frame in replayed]
+            assert all(abs(value - index * 10) <= 3 for index, value in enumerate(values)), f"{name}: {values}"
+            assert replayed[0].dtype == np.uint8 and replayed[0].shape == (120, 160, 3)
+            print(f"✅ {name} source replays all frames in order")
+
+
+def test_realtime_pacing():
+    """Real-time replay releases frames at the source frame rate; loop restarts"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'clip.npz')
+        np.savez(path, frames=np.zeros((5, 8, 8, 3), dtype=np.float32))
+
+        source = NpzClipSource(path, fps=50, pace='realtime', loop=True)
+        start = time.perf_counter()
+        for _ in range(11):
+            ok, _ = source.read()
+            assert ok
+        elapsed = time.perf_counter() - start
+        assert 0.18 <= elapsed < 0.5, elapsed
+        assert not source.finished
+    print(f"✅ Real-time pacing: 11 frames at 50 FPS in {elapsed:.2f}s")
+
+
+def test_webcam_replay():
+    """Webcam fills its ring from a replay source and hands out clips"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'clip.npz')
+        clip = np.random.default_rng(0).random((30, 120, 160, 3), dtype=np.float32)
+        np.savez(path, frames=clip)
+
+        webcam = Webcam(clip_length=10, stride=2,
+                        capture={'source': path, 'pace': 'fast', 'resize_to': [64, 64]})
+        with webcam:
+            deadline = time.time() + 5
+            while not webcam.is_finished() and time.time() < deadline:
+                time.sleep(0.01)
+
+        clip_view = webcam.get_clip_view()
+        assert webcam.is_finished()
+        assert clip_view['frames'].shape == (10, 64, 64, 3)
+        assert clip_view['sequence_ids'].tolist() == list(range(12, 31, 2))
+    print("✅ Webcam runs from a replay source without a camera")
+
+
+if __name__ == "__main__":
+    print("Frame Source Test")
+    print("=" * 40)
+    test_replay_sources()
+    test_realtime_pacing()
+    test_webcam_replay()
+    print("\n🎉 All frame source tests passed!")
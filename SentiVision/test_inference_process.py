@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test model inference in a worker process
+
+Starts an InferenceProcess with the mock model (or the trained model if
+present) and feeds it clips through its shared-memory slots.
+"""
+
+import time
+import threading
+import numpy as np
+from inference_process import InferenceProcess
+
+
+CLIP_SHAPE = (1, 20, 224, 224, 3)
+MODEL_OPTIONS = {'backend': 'keras', 'compile_inference': True, 'min_confidence': 0.0}
+
+
+def test_worker_predictions():
+    """Clips from several threads come back as predictions; a clip's result is deterministic"""
+    inference = InferenceProcess(MODEL_OPTIONS, CLIP_SHAPE, num_slots=2, max_batch_size=4)
+    try:
+        rng = np.random.default_rng(0)
+        clips = [rng.random(CLIP_SHAPE, dtype=np.float32) for _ in range(6)]
+        results = [None] * len(clips)
+
+        def room(index):
+            results[index] = inference.predict(clips[index], timeout=60)
+
+        # More concurrent requests than slots: submit() waits for a free slot
+        threads = [threading.Thread(target=room, args=(index,)) for index in range(len(clips))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for prediction in results:
+            assert prediction is not None and prediction['state']
+            assert abs(sum(prediction['probabilities']) - 1.0) < 1e-4
+
+        # Same clip, same slot content: same prediction as in the concurrent run
+        again = inference.predict(clips[0], timeout=60)
+        assert np.allclose(again['probabilities'], results[0]['probabilities'], atol=1e-5)
+
+        stats = inference.get_stats()
+        assert stats['alive'] and stats['clips'] == len(clips) + 1 and stats['free_slots'] == 2
+
+        try:
+            inference.submit(np.zeros((1, 10, 224, 224, 3), dtype=np.float32))
+            assert False, "Expected ValueError for a clip that does not fit the slots"
+        except ValueError:
+            pass
+    finally:
+        inference.close()
+
+    assert not inference.is_alive()
+    try:
+        inference.submit(clips[0])
+        assert False, "Expected RuntimeError after close"
+    except RuntimeError:
+        pass
+    print(f"✅ Worker process ran {stats['clips']} clips")
+
+
+def _kill_worker_and_submit(inference):
+    """Kill the worker; a request made right after fails instead of hanging"""
+    inference._process.kill()
+    inference._process.join(5)
+    try:
+        future = inference.submit(np.zeros(CLIP_SHAPE, dtype=np.float32))
+    except RuntimeError:
+        return  # The reader already noticed the exit
+    try:
+        future.result(timeout=10)
+        assert False, "Expected the request to fail"
+    except RuntimeError:
+        pass
+
+
+def test_worker_exit_fails_requests():
+    """A worker that dies fails waiting requests and is restarted; inference then works again"""
+    inference = InferenceProcess(MODEL_OPTIONS, CLIP_SHAPE, num_slots=1, restart_delay=0.1)
+    try:
+        first_pid = inference.get_stats()['pid']
+        _kill_worker_and_submit(inference)
+
+        deadline = time.time() + 120
+        while inference.get_stats()['restarts'] == 0 and time.time() < deadline:
+            time.sleep(0.2)
+        stats = inference.get_stats()
+        assert stats['restarts'] == 1 and stats['alive'] and stats['pid'] != first_pid
+        assert stats['free_slots'] == 1, "the dead worker's slot is free again"
+        prediction = inference.predict(np.zeros(CLIP_SHAPE, dtype=np.float32), timeout=60)
+        assert prediction is not None and not inference.failed
+    finally:
+        inference.close()
+    print("✅ Dead worker restarted and serving again")
+
+
+def test_worker_restart_gives_up():
+    """Without restarts left, the process is marked failed and refuses requests"""
+    inference = InferenceProcess(MODEL_OPTIONS, CLIP_SHAPE, num_slots=1, max_restarts=0)
+    try:
+        _kill_worker_and_submit(inference)
+        deadline = time.time() + 10
+        while not inference.failed and time.time() < deadline:
+            time.sleep(0.1)
+        assert inference.failed
+        try:
+            inference.submit(np.zeros(CLIP_SHAPE, dtype=np.float32))
+            assert False, "Expected RuntimeError once the worker failed for good"
+        except RuntimeError:
+            pass
+    finally:
+        inference.close()
+    print("✅ Worker marked failed when it cannot be restarted")
+
+
+if __name__ == "__main__":
+    test_worker_predictions()
+    test_worker_exit_fails_requests()
+    test_worker_restart_gives_up()
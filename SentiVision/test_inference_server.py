@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test dynamic batching across cameras
+
+A recording model interface shows which batches the InferenceServer forms;
+the last test runs real batches through the model (the mock model if no
+trained model is present) to check they match one-clip-at-a-time inference.
+"""
+
+import time
+import threading
+import numpy as np
+from inference_server import InferenceServer
+from model_interface import ModelInterface
+
+
+class RecordingModelInterface:
+    """Returns each clip's mean value as its prediction and records the batch sizes"""
+
+    def __init__(self, pad_batches=False):
+        self.batch_sizes = []
+        self.pad_batches = pad_batches
+
+    def predict_inputs(self, video_tensors):
+        self.batch_sizes.append(len(video_tensors))
+        return [{'value': float(clip.mean())} for clip in video_tensors]
+
+
+def _clip(value):
+    return np.full((1, 2, 4, 4, 3), value, dtype=np.float32)
+
+
+def test_full_batch():
+    """Clips from several cameras share one forward pass and each gets its own result back"""
+    model = RecordingModelInterface()
+    server = InferenceServer(model, max_batch_size=4, max_wait=5.0)
+    results = {}
+
+    def room(value):
+        results[value] = server.predict(_clip(value), timeout=5.0)['value']
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=room, args=(float(value),)) for value in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.close()
+
+    assert model.batch_sizes == [4], model.batch_sizes
+    assert results == {value: value for value in results} and len(results) == 4
+    assert elapsed < 5.0, "A full batch must not wait for max_wait"
+    print(f"✅ Full batch dispatched in {elapsed * 1000:.1f}ms")
+
+
+def test_max_wait():
+    """A lone clip waits at most max_wait for company"""
+    model = RecordingModelInterface()
+    server = InferenceServer(model, max_batch_size=4, max_wait=0.05)
+
+    start = time.perf_counter()
+    prediction = server.predict(_clip(7.0), timeout=5.0)
+    elapsed = time.perf_counter() - start
+    stats = server.get_stats()
+    server.close()
+
+    assert prediction == {'value': 7.0}
+    assert model.batch_sizes == [1]
+    assert 0.04 <= elapsed < 1.0, elapsed
+    assert stats == {'clips': 1, 'batches': 1, 'mean_batch_size': 1.0}
+
+    try:
+        server.submit(_clip(1.0))
+        assert False, "Expected RuntimeError after close"
+    except RuntimeError:
+        pass
+    print(f"✅ Lone clip dispatched after {elapsed * 1000:.1f}ms")
+
+
+def test_padded_batches():
+    """With pad_batches every forward pass has max_batch_size rows; padding results are dropped"""
+    model = RecordingModelInterface(pad_batches=True)
+    server = InferenceServer(model, max_batch_size=4, max_wait=0.01)
+
+    first = server.predict(_clip(3.0), timeout=5.0)
+    futures = [server.submit(_clip(value)) for value in (5.0, 6.0)]
+    later = [future.result(timeout=5.0) for future in futures]
+    server.close()
+
+    assert first == {'value': 3.0} and later == [{'value': 5.0}, {'value': 6.0}]
+    assert set(model.batch_sizes) == {4}, model.batch_sizes
+    assert server.get_stats()['clips'] == 3
+    print(f"✅ Partial batches padded to {model.batch_sizes}")
+
+
+def test_batched_model_matches_single_clips():
+    """One batched forward pass gives the same predictions as one clip at a time"""
+    model_interface = ModelInterface(min_confidence=0.0)
+    rng = np.random.default_rng(0)
+    clips = rng.random((3, 20, 224, 224, 3), dtype=np.float32)
+
+    batched = model_interface.predict_inputs(clips)
+    single = [model_interface.predict_input(clips[index:index + 1]) for index in range(3)]
+
+    for batch_prediction, single_prediction in zip(batched, single):
+        assert batch_prediction['raw_class'] == single_prediction['raw_class']
+        assert np.allclose(batch_prediction['probabilities'], single_prediction['probabilities'], atol=1e-5)
+    print("✅ Batched predictions match single-clip predictions")
+
+
+if __name__ == "__main__":
+    test_full_batch()
+    test_max_wait()
+    test_padded_batches()
+    test_batched_model_matches_single_clips()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test the logging setup
+
+Checks per-call-site rate limiting, that a blocked console never blocks the
+logging thread, and that the Keras backend no longer touches sys.stdout.
+"""
+
+import io
+import sys
+import time
+import logging
+import threading
+from logging_setup import RateLimitFilter, configure_logging, shutdown_logging
+from scheduler import ManualClock
+
+
+def make_record(name, lineno, msg, *args, level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, lineno, msg, args, None)
+
+
+def test_rate_limit():
+    """Each call site gets burst records, then rate per second; suppressed records are counted"""
+    clock = ManualClock()
+    rate_filter = RateLimitFilter(rate=2.0, burst=3, clock=clock)
+
+    passed = [rate_filter.filter(make_record('camera', 10, "Failed to grab frame")) for _ in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+    assert rate_filter.filter(make_record('camera', 20, "Other call site"))  # Separate bucket
+
+    clock.advance(0.5)  # One token back at 2 records/s
+    record = make_record('camera', 10, "Failed to grab frame %d", 11)
+    assert rate_filter.filter(record)
+    assert record.getMessage() == "Failed to grab frame 11 (7 similar messages suppressed)"
+    assert not rate_filter.filter(make_record('camera', 10, "Failed to grab frame"))
+
+    # CRITICAL records are never suppressed
+    assert all(rate_filter.filter(make_record('camera', 10, "x", level=logging.CRITICAL)) for _ in range(5))
+    assert rate_filter.suppressed_count == 8
+    print("✅ Rate limiting per call site")
+
+
+class BlockedStream(io.StringIO):
+    """Console that blocks every write until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+
+    def write(self, text):
+        self.released.wait()
+        return super().write(text)
+
+
+def test_async_handler():
+    """Logging calls return immediately while the console is blocked; records are written later"""
+    stream = BlockedStream()
+    handler = configure_logging(logging.DEBUG, rate=1000, burst=1000, queue_size=50, stream=stream)
+    logger = logging.getLogger('model_interface')
+    try:
+        start = time.perf_counter()
+        for index in range(200):
+            logger.debug("WALKING (%d%%)", index)
+        elapsed = time.perf_counter() - start
+        assert elapsed < 0.5, elapsed
+        assert handler.dropped_count > 0  # The bounded queue dropped records instead of blocking
+    finally:
+        stream.released.set()
+        shutdown_logging()
+
+    output = stream.getvalue()
+    assert "model_interface: WALKING (0%)" in output
+    print(f"✅ Async handler: 200 records in {elapsed * 1000:.1f} ms with a blocked console "
+          f"({handler.dropped_count} dropped)")
+
+
+def test_keras_backend_keeps_stdout():
+    """Eager Keras inference no longer redirects sys.stdout"""
+    import numpy as np
+    from inference_backends import create_backend
+
+    backend = create_backend('keras', None, clip_length=4, input_size=(32, 32), compile_inference=False)
+    original_stdout = sys.stdout
+    seen = []
+
+    class Probe(io.StringIO):
+        def write(self, text):
+            seen.append(sys.stdout is self)
+            return super().write(text)
+
+    probe = Probe()
+    sys.stdout = probe
+    try:
+        probabilities, classes = backend.predict_batch(np.zeros((1, 4, 32, 32, 3), dtype=np.float32))
+        assert sys.stdout is probe
+    finally:
+        sys.stdout = original_stdout
+    assert probabilities.shape[0] == 1 and classes.shape == (1,)
+    print("✅ Keras backend leaves sys.stdout alone")
+
+
+if __name__ == "__main__":
+    print("Logging Test")
+    print("=" * 40)
+    test_rate_limit()
+    test_async_handler()
+    test_keras_backend_keeps_stdout()
+    print("\n🎉 All logging tests passed!")
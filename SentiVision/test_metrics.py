@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test metrics collection and export
+
+Checks histogram bucketing and quantile estimates, the Prometheus text and
+JSON exports, the HTTP endpoint, the periodic JSON dump, and the lock wait
+time recorded by ActivityStateMachine.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+import urllib.request
+from metrics import MetricsRegistry, MetricsServer, MetricsDumper, TimedLock, LOCK_WAIT_BUCKETS
+from scheduler import Scheduler, ManualClock
+from state_machine import ActivityStateMachine
+from test_scheduler import RecordingFirebaseClient
+
+
+def test_histogram():
+    """Observations land in the right buckets; quantiles interpolate within buckets"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', 'Test latency', buckets=(0.1, 0.2, 0.4))
+    for value in (0.05, 0.1, 0.15, 0.3, 1.0):
+        histogram.observe(value)
+
+    cumulative, count, total = histogram.snapshot()
+    assert cumulative == [2, 3, 4, 5]
+    assert count == 5 and abs(total - 1.6) < 1e-9
+    assert abs(histogram.quantile(0.5) - 0.15) < 1e-9  # Rank 2.5 of 5: halfway through (0.1, 0.2]
+    assert histogram.quantile(0.99) == 0.4  # Above the largest bucket
+    assert registry.histogram('test_seconds', 'Test latency') is histogram
+    print("✅ Histogram buckets and quantiles")
+
+
+def test_exports():
+    """Prometheus text groups labelled metrics into one family; JSON carries the same values"""
+    registry = MetricsRegistry()
+    registry.counter('frames', 'Frames').inc(3)
+    registry.gauge('depth', 'Depth', callback=lambda: 7)
+    registry.histogram('stage_seconds', 'Stage time', {'stage': 'inference'}, buckets=(0.5,)).observe(0.2)
+    registry.histogram('stage_seconds', 'Stage time', {'stage': 'publish'}, buckets=(0.5,)).observe(0.7)
+
+    text = registry.render_prometheus()
+    assert 'frames_total 3.0' in text
+    assert 'depth 7.0' in text
+    assert text.count('# TYPE stage_seconds histogram') == 1
+    assert 'stage_seconds_bucket{stage="inference",le="0.5"} 1' in text
+    assert 'stage_seconds_bucket{stage="publish",le="+Inf"} 1' in text
+    assert 'stage_seconds_count{stage="publish"} 1' in text
+
+    data = registry.to_dict()
+    assert data['frames'] == 3 and data['depth'] == 7
+    assert [entry['labels']['stage'] for entry in data['stage_seconds']] == ['inference', 'publish']
+    assert data['stage_seconds'][0]['value']['count'] == 1
+    print("✅ Prometheus text and JSON exports")
+
+
+def test_server_and_dump():
+    """The HTTP endpoint serves both formats; the dumper writes a JSON file"""
+    registry = MetricsRegistry()
+    registry.counter('requests', 'Requests').inc()
+
+    server = MetricsServer(registry, port=0)
+    server.start()
+    try:
+        base = f"http://127.0.0.1:{server.port}"
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            assert 'requests_total 1.0' in response.read().decode('utf-8')
+        with urllib.request.urlopen(f"{base}/metrics.json", timeout=5) as response:
+            assert json.loads(response.read())['requests'] == 1
+    finally:
+        server.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'metrics', 'metrics.json')
+        clock = ManualClock()
+        dumper = MetricsDumper(path, registry, interval=60, scheduler=Scheduler(clock=clock))
+        dumper.start()
+        clock.advance(60)
+        dumper.scheduler.run_pending()
+        with open(path) as f:
+            assert json.load(f)['metrics']['requests'] == 1
+        dumper.stop()
+    print("✅ Metrics endpoint and JSON dump")
+
+
+def test_state_machine_lock_wait():
+    """Waiting for a held ActivityStateMachine lock shows up in the lock wait histogram"""
+    registry = MetricsRegistry()
+    state_machine = ActivityStateMachine(
+        RecordingFirebaseClient(), scheduler=Scheduler(clock=ManualClock()), metrics=registry
+    )
+    histogram = registry.get('senticare_state_machine_lock_wait_seconds')
+
+    with state_machine._lock:
+        reader = threading.Thread(target=state_machine.get_current_state)
+        reader.start()
+        time.sleep(0.05)
+    reader.join()
+
+    assert histogram.count >= 1
+    assert histogram.to_dict()['p99'] >= 0.01
+    assert isinstance(state_machine._lock, TimedLock) and histogram.buckets == LOCK_WAIT_BUCKETS
+    state_machine.outbox.close()
+    print(f"✅ State machine lock wait recorded ({histogram.count} acquisitions)")
+
+
+if __name__ == "__main__":
+    print("Metrics Test")
+    print("=" * 40)
+    test_histogram()
+    test_exports()
+    test_server_and_dump()
+    test_state_machine_lock_wait()
+    print("\n🎉 All metrics tests passed!")
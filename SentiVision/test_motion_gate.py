@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test the motion gate's adaptive inference rate
+"""
+
+import numpy as np
+from motion_gate import MotionGate
+
+
+def static_frame():
+    return np.full((480, 640, 3), 90, dtype=np.uint8)
+
+
+def moving_frame(step):
+    """A bright block that moves across the frame"""
+    frame = static_frame()
+    x = (step * 40) % 560
+    frame[200:320, x:x + 80] = 230
+    return frame
+
+
+def count_inferences(gate, frames, poll_interval=0.1, start=0.0):
+    """Poll the gate once per frame; returns how many frames passed"""
+    passed = 0
+    for step, frame in enumerate(frames):
+        if gate.should_infer(frame, start + step * poll_interval):
+            passed += 1
+    return passed
+
+
+def test_static_scene_throttled():
+    """A static scene drops to the minimum rate but never below it"""
+    gate = MotionGate(min_interval=0.1, max_interval=2.0)
+    passed = count_inferences(gate, [static_frame()] * 600)  # 60 s
+    assert gate.interval == 2.0
+    assert 30 <= passed <= 40, passed
+    print(f"✅ Static scene: {passed} inferences in 60 s")
+
+
+def test_motion_restores_rate():
+    """Motion brings the full inference rate back on the next clip"""
+    gate = MotionGate(min_interval=0.1, max_interval=2.0)
+    count_inferences(gate, [static_frame()] * 100)
+    assert gate.interval == 2.0
+
+    moving = [moving_frame(step) for step in range(50)]
+    passed = count_inferences(gate, moving, start=10.0)
+    assert gate.interval == 0.1
+    assert passed >= 45, passed
+    print(f"✅ Motion: {passed} of 50 clips inferred")
+
+
+if __name__ == "__main__":
+    print("Motion Gate Test")
+    print("=" * 40)
+    test_static_scene_throttled()
+    test_motion_restores_rate()
+    print("\n🎉 All motion gate tests passed!")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test running several rooms in one Monitor
+
+Two rooms replay different synthetic .npz recordings through one shared
+model (the mock model if no trained model is present) and one Firestore
+writer backed by a LocalFirestore.
+"""
+
+import os
+import json
+import time
+import tempfile
+import numpy as np
+from local_firestore import LocalFirestore
+from firebase_client import FirebaseClient
+from monitoring import Monitor, room_configs
+
+
+ROOMS = ('Kitchen', 'Bedroom')
+
+
+def test_room_configs():
+    """Rooms override the top-level settings and merge their capture section"""
+    config = {'patientId': 'p1', 'roomId': 'Hall', 'clip_stride': 3,
+              'capture': {'width': 320, 'height': 240},
+              'rooms': [{'roomId': 'Kitchen', 'capture': {'source': 1}},
+                        {'roomId': 'Bedroom', 'patientId': 'p2', 'clip_stride': 1}]}
+    kitchen, bedroom = room_configs(config)
+    assert kitchen['roomId'] == 'Kitchen' and kitchen['patientId'] == 'p1'
+    assert kitchen['capture'] == {'width': 320, 'height': 240, 'source': 1}
+    assert bedroom['patientId'] == 'p2' and bedroom['clip_stride'] == 1
+    assert 'rooms' not in kitchen
+
+    single = {'roomId': 'Hall'}
+    assert room_configs(single) == [single]
+
+    try:
+        room_configs({'rooms': [{'roomId': 'Kitchen'}, {'roomId': 'Kitchen'}]})
+        assert False, "Expected ValueError for a duplicate roomId"
+    except ValueError:
+        pass
+
+    # One patient in every room
+    shared = room_configs({'patientId': 'p1', 'rooms': [{'roomId': 'Kitchen'}, {'roomId': 'Bedroom'}]})
+    assert [room['patientId'] for room in shared] == ['p1', 'p1']
+    print("✅ Room configuration")
+
+
+def test_shared_patient_status():
+    """With one patient in two rooms, the room that sees the patient writes patientStatus"""
+    with tempfile.TemporaryDirectory() as directory:
+        # Synchronous, uncoalesced writes so every update lands at once
+        config = {'patientId': 'p1', 'roomId': 'Hall', 'async_writes': False, 'coalesce_status_updates': False}
+        config_path = os.path.join(directory, 'config.json')
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+        db = LocalFirestore()
+        client = FirebaseClient(config_path, db=db)
+        kitchen, bedroom = (client.for_room(room) for room in room_configs(
+            dict(config, rooms=[{'roomId': 'Kitchen'}, {'roomId': 'Bedroom'}])))
+
+        def status():
+            document = db.documents['patientStatus/p1']
+            return document['roomId'], document['currentState']
+
+        kitchen.update_patient_status('WALKING', None, 0.9)
+        bedroom.update_patient_status('NOT_PRESENT', None, 0.9)
+        assert status() == ('Kitchen', 'WALKING'), "an empty room must not overwrite the patient's state"
+
+        # The patient walks into the bedroom and sits down; the kitchen empties
+        bedroom.update_patient_status('SITTING', None, 0.9)
+        kitchen.update_patient_status('NOT_PRESENT', None, 0.9)
+        kitchen.update_patient_status('NOT_PRESENT', None, 0.9)  # Heartbeat
+        assert status() == ('Bedroom', 'SITTING')
+
+        # Back in the kitchen; a bedroom heartbeat does not take the document back
+        kitchen.update_patient_status('WALKING', None, 0.9)
+        bedroom.update_patient_status('SITTING', None, 0.9)
+        assert status() == ('Kitchen', 'WALKING')
+
+        # A newer bedroom state takes over; once it turns idle the kitchen's state is written again
+        bedroom.update_patient_status('STANDING', None, 0.9)
+        assert status() == ('Bedroom', 'STANDING')
+        bedroom.update_patient_status('NOT_PRESENT', None, 0.9)
+        assert status() == ('Kitchen', 'WALKING')
+
+        kitchen.close()
+        bedroom.close()
+        client.close()
+    print("✅ Shared patient status written by the room that sees the patient")
+
+
+def test_multi_room_monitor():
+    """Each room writes under its own roomId and patientId through the shared writer"""
+    with open('config.json', 'r') as f:
+        config = json.load(f)
+
+    with tempfile.TemporaryDirectory() as directory:
+        rooms = []
+        for index, room_id in enumerate(ROOMS):
+            path = os.path.join(directory, f'{index}.npz')
+            rng = np.random.default_rng(index)
+            np.savez(path, frames=rng.random((60, 120, 160, 3), dtype=np.float32))
+            rooms.append({'roomId': room_id, 'patientId': f'patient-{index}',
+                          'capture': {'source': path, 'pace': 'realtime'}})
+
+        config.pop('write_ahead_log_path', None)
+        config.update({'rooms': rooms, 'clip_stride': 1, 'temporal_filter': False, 'min_confidence': 0.0,
+                       'confidence_threshold': 0.0, 'motion_gate': False})
+        config_path = os.path.join(directory, 'config.json')
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+
+        db = LocalFirestore()
+        monitor = Monitor(config_path, firebase_client=FirebaseClient(config_path, db=db))
+        assert [room.room_id for room in monitor.rooms] == list(ROOMS)
+        assert all(room.firebase_client.writer is monitor.firebase_client.writer for room in monitor.rooms)
+
+        # start_monitoring() blocks until stopped; run the rooms directly
+        monitor.running = True
+        for room in monitor.rooms:
+            room.start()
+        deadline = time.time() + 60
+        while time.time() < deadline and any(room.thread.is_alive() for room in monitor.rooms):
+            time.sleep(0.1)
+        status = monitor.get_status()
+        preview_lines = monitor.rooms[0]._preview_status()
+        monitor.stop_monitoring()
+
+    assert set(status['rooms']) == set(ROOMS)
+    assert monitor.prediction_count > 0
+    # The preview overlay shows the room's state and its latest prediction
+    assert preview_lines[0].startswith("State: ") and preview_lines[-1].startswith("Prediction: "), preview_lines
+    written_rooms = {data.get('roomId') for data in db.documents.values()}
+    assert written_rooms == set(ROOMS), written_rooms
+
+    # The shared preprocessing cache keeps the rooms' frames apart
+    cached_sources = {source for source, _ in monitor.model_interface._frame_cache}
+    assert cached_sources == set(ROOMS), cached_sources
+    frames = [np.full((120, 160, 3), value, dtype=np.float32) for value in (0.2, 0.8)]
+    sequence_ids = np.arange(10_000, 10_020)
+    kitchen = monitor.model_interface.preprocess_clip([frames[0]] * 20, sequence_ids, source='Kitchen').copy()
+    bedroom = monitor.model_interface.preprocess_clip([frames[1]] * 20, sequence_ids, source='Bedroom')
+    assert not np.allclose(kitchen, bedroom)
+    print(f"✅ Multi-room monitor: {status['prediction_count']} predictions, {db.written_documents} documents")
+
+
+if __name__ == "__main__":
+    test_room_configs()
+    test_shared_patient_status()
+    test_multi_room_monitor()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test the staged pipeline's drop-oldest queues
+
+Covers DropOldestQueue on its own, and the queues MonitoringPipeline builds:
+dropped inference inputs go back to the model interface's buffer pool, and
+critical predictions are never dropped from the publish queue. Also checks
+that a disabled frame cache falls back to plain batched preprocessing.
+"""
+
+import numpy as np
+from pipeline import DropOldestQueue, MonitoringPipeline
+from model_interface import ModelInterface
+from metrics import MetricsRegistry
+
+
+def _prediction(number, critical=False):
+    return {'prediction': {'state': 'FALL_DETECTED' if critical else 'SITTING',
+                           'is_critical': critical, 'number': number}}
+
+
+def _numbers(items):
+    return [item['prediction']['number'] for item in items]
+
+
+def test_drop_oldest():
+    """A full queue drops its oldest droppable item, counts it and reports it to on_drop"""
+    metrics = MetricsRegistry()
+    dropped = []
+    queue = DropOldestQueue(2, on_drop=dropped.append, can_drop=lambda item: not item['prediction']['is_critical'],
+                            drop_counter=metrics.counter('dropped', 'Dropped items'))
+
+    queue.put(_prediction(0, critical=True))
+    queue.put(_prediction(1))
+    queue.put(_prediction(2))  # Full: 1 is the oldest item that may go
+    queue.put(_prediction(3))  # Full: 2 goes
+
+    assert _numbers(dropped) == [1, 2]
+    assert queue.dropped_count == 2 and metrics.counter('dropped', 'Dropped items').value == 2
+    assert _numbers([queue.get(timeout=0), queue.get(timeout=0)]) == [0, 3]
+    assert queue.get(timeout=0) is None
+
+    # Without can_drop the plain oldest item goes
+    plain = DropOldestQueue(1)
+    plain.put('old')
+    plain.put('new')
+    assert plain.drain() == ['new'] and plain.dropped_count == 1
+    print("✅ Drop-oldest queue")
+
+
+def test_critical_items_exceed_maxsize():
+    """Only a queue holding nothing but critical items grows past maxsize"""
+    queue = DropOldestQueue(2, can_drop=lambda item: not item['prediction']['is_critical'])
+    for number in range(4):
+        queue.put(_prediction(number, critical=True))
+    assert queue.qsize() == 4 and queue.dropped_count == 0
+
+    # A routine prediction only displaces other routine ones
+    queue.put(_prediction(4))
+    queue.put(_prediction(5))
+    assert _numbers(queue.drain()) == [0, 1, 2, 3, 5]
+    print("✅ Critical items never dropped")
+
+
+def test_pipeline_queues():
+    """The pipeline returns dropped input buffers to the pool and keeps critical predictions"""
+    model_interface = ModelInterface(backend=None)
+    pipeline = MonitoringPipeline(webcam=None, model_interface=model_interface, state_machine=None,
+                                  queue_size=1, publish_queue_size=2, metrics=MetricsRegistry())
+
+    clip = np.random.default_rng(0).random((20, 120, 160, 3), dtype=np.float32)
+    first = model_interface.preprocess_clip(clip, pooled=True)
+    second = model_interface.preprocess_clip(clip, pooled=True)
+    assert first is not second and not model_interface._input_pool
+
+    pipeline.inference_queue.put({'input': first, 'captured_at': 0.0})
+    pipeline.inference_queue.put({'input': second, 'captured_at': 1.0})
+    assert pipeline.inference_queue.dropped_count == 1
+    assert [buffer is first for buffer in model_interface._input_pool] == [True]
+    # The next pooled clip reuses the dropped buffer instead of allocating
+    assert model_interface.preprocess_clip(clip, pooled=True) is first
+
+    for number, critical in enumerate([True, False, True, False, True]):
+        pipeline.publish_queue.put(dict(_prediction(number, critical), captured_at=0.0))
+    assert _numbers(pipeline.publish_queue.drain()) == [0, 2, 4]
+    print("✅ Pipeline queues release buffers and keep critical predictions")
+
+
+def test_frame_cache_disabled():
+    """With frame_cache_size 0, clips with sequence IDs are preprocessed without the cache"""
+    clip = np.random.default_rng(1).random((20, 120, 160, 3), dtype=np.float32)
+    expected = ModelInterface(backend=None).preprocess_clip(clip).copy()
+
+    model_interface = ModelInterface(backend=None, frame_cache_size=0)
+    for start in (0, 10):
+        result = model_interface.preprocess_clip(clip, sequence_ids=np.arange(start, start + 20))
+        assert np.array_equal(result, expected)
+    assert not model_interface._frame_cache
+    assert model_interface.frame_cache_hits == model_interface.frame_cache_misses == 0
+    print("✅ Disabled frame cache")
+
+
+def test_stage_roles():
+    """Stage names carry the room; roles are the same in every room's pipeline"""
+    pipeline = MonitoringPipeline(webcam=None, model_interface=ModelInterface(backend=None), state_machine=None,
+                                  metrics=MetricsRegistry(), room_id='kitchen')
+    assert [stage.name for stage in pipeline.stages] == ['kitchen-preprocess', 'kitchen-inference', 'kitchen-publish']
+    assert [stage.role for stage in pipeline.stages] == ['preprocess', 'inference', 'publish']
+    print("✅ Stage roles without the room prefix")
+
+
+if __name__ == "__main__":
+    test_drop_oldest()
+    test_critical_items_exceed_maxsize()
+    test_pipeline_queues()
+    test_frame_cache_disabled()
+    test_stage_roles()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test the camera preview consumer without a display
+
+Checks the display buffer reuse and the status overlay on a replayed
+recording, and the preview thread's frame rate cap with the window
+drawing left out, so the tests run on headless machines.
+"""
+
+import os
+import time
+import tempfile
+import numpy as np
+from camera import Webcam
+from preview import PreviewWindow
+
+
+class CountingPreview(PreviewWindow):
+    """PreviewWindow that counts display attempts instead of opening a window"""
+
+    def _show_latest_frame(self):
+        self.frames_shown += 1
+        return True
+
+
+def _replayed_webcam(directory, frames=8):
+    path = os.path.join(directory, 'recording.npz')
+    np.savez(path, frames=np.full((frames, 120, 160, 3), 0.5, dtype=np.float32))
+    webcam = Webcam(clip_length=4, capture={'source': path, 'pace': 'fast'})
+    for _ in range(frames):
+        webcam.capture_frame()
+    return webcam
+
+
+def test_display_buffer_and_overlay():
+    """The preview reuses one display buffer and draws the status lines onto it"""
+    with tempfile.TemporaryDirectory() as directory:
+        webcam = _replayed_webcam(directory)
+        try:
+            preview = PreviewWindow(webcam, status=lambda: ["State: SITTING", "Prediction: Sitting (91%)"])
+            display = webcam.get_frame()
+            assert webcam.get_frame(out=display) is display
+            # A buffer of another shape is not used
+            assert webcam.get_frame(out=np.empty((10, 10, 3), dtype=np.uint8)).shape == (120, 160, 3)
+
+            plain = display.copy()
+            preview._draw_overlay(display)
+            assert not np.array_equal(display, plain)
+            # The overlay only touches the display copy, never the ring
+            assert np.array_equal(webcam.get_frame(), plain)
+        finally:
+            webcam.release_camera()
+
+    try:
+        Webcam(show_preview=True)
+        assert False, "Webcam should no longer draw a preview itself"
+    except TypeError:
+        pass
+    print("✅ Preview display buffer and overlay")
+
+
+def test_frame_rate_cap():
+    """The preview thread displays at most max_fps frames per second and stops promptly"""
+    preview = CountingPreview(webcam=None, max_fps=20, niceness=0)
+    preview.start()
+    time.sleep(0.5)
+    started = time.perf_counter()
+    preview.stop()
+    stop_time = time.perf_counter() - started
+
+    assert not preview.is_running()
+    assert 5 <= preview.frames_shown <= 12, preview.frames_shown
+    assert stop_time < 0.5
+    print(f"✅ Preview capped at 20 fps ({preview.frames_shown} frames in 0.5 s)")
+
+
+if __name__ == "__main__":
+    test_display_buffer_and_overlay()
+    test_frame_rate_cap()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test the scheduler, the state machine's debounce and periodic jobs, and
+that Firebase writes happen outside the state machine lock
+
+Uses a ManualClock, so nothing sleeps and no Firebase connection is needed.
+"""
+
+import time
+from scheduler import Scheduler, ManualClock
+from state_machine import ActivityStateMachine
+
+
+class RecordingFirebaseClient:
+    """Records the calls the state machine makes"""
+
+    def __init__(self):
+        self.events = []
+        self.alerts = []
+        self.status_updates = []
+
+    def write_event(self, event_type, duration_seconds, confidence_score, metadata=None):
+        self.events.append(event_type)
+
+    def write_alert(self, alert_type, confidence_score):
+        self.alerts.append(alert_type)
+
+    def update_patient_status(self, current_state, state_start_time, confidence_score):
+        self.status_updates.append(current_state)
+
+
+def prediction(state, confidence=0.9):
+    return {'state': state, 'confidence': confidence, 'is_critical': False, 'raw_class': 0}
+
+
+def test_call_later_and_cancel():
+    """Calls run in deadline order once due; cancelled calls never run"""
+    scheduler = Scheduler(clock=ManualClock())
+    ran = []
+    scheduler.call_later(2, ran.append, 'second')
+    scheduler.call_later(1, ran.append, 'first')
+    cancelled = scheduler.call_later(1.5, ran.append, 'cancelled')
+    cancelled.cancel()
+
+    assert scheduler.run_pending() == 0
+    scheduler.clock.advance(2)
+    assert scheduler.run_pending() == 2
+    assert ran == ['first', 'second']
+    assert scheduler.pending_count() == 0
+    print("✅ call_later runs due calls in order and honours cancel()")
+
+
+def test_call_every():
+    """Periodic calls repeat at a fixed rate and skip runs missed while behind"""
+    scheduler = Scheduler(clock=ManualClock())
+    ticks = []
+    job = scheduler.call_every(10, lambda: ticks.append(scheduler.clock()))
+
+    for _ in range(3):
+        scheduler.clock.advance(10)
+        scheduler.run_pending()
+    scheduler.clock.advance(35)
+    scheduler.run_pending()
+    assert ticks == [10, 20, 30, 65], ticks
+
+    job.cancel()
+    scheduler.clock.advance(100)
+    assert scheduler.run_pending() == 0
+    print("✅ call_every repeats until cancelled")
+
+
+def test_state_machine_debounce():
+    """Flickering predictions never confirm; a stable new state confirms after the debounce"""
+    scheduler = Scheduler(clock=ManualClock())
+    firebase_client = RecordingFirebaseClient()
+    state_machine = ActivityStateMachine(firebase_client, debounce_duration=7,
+                                         status_update_interval=3600, scheduler=scheduler)
+
+    state_machine.process_prediction(prediction('SITTING'))
+    for _ in range(20):
+        state_machine.process_prediction(prediction('WALKING'))
+        scheduler.clock.advance(1)
+        state_machine.process_prediction(prediction('SITTING'))
+        scheduler.clock.advance(1)
+        scheduler.run_pending()
+    assert state_machine.current_state == 'SITTING'
+
+    state_machine.process_prediction(prediction('WALKING'))
+    scheduler.clock.advance(7)
+    scheduler.run_pending()
+    assert state_machine.current_state == 'WALKING'
+    state_machine.outbox.flush(timeout=1.0)
+    assert firebase_client.status_updates == ['SITTING', 'WALKING']
+    state_machine.shutdown()
+    print("✅ Debounce confirms only stable state changes")
+
+
+def test_state_machine_periodic_jobs():
+    """Periodic status updates and event logging run on the scheduler"""
+    scheduler = Scheduler(clock=ManualClock())
+    firebase_client = RecordingFirebaseClient()
+    state_machine = ActivityStateMachine(firebase_client, max_event_duration=600,
+                                         status_update_interval=30, scheduler=scheduler)
+
+    state_machine.process_prediction(prediction('IN_BED'))
+    for _ in range(20):
+        scheduler.clock.advance(30)
+        scheduler.run_pending()
+
+    state_machine.outbox.flush(timeout=1.0)
+    assert firebase_client.status_updates == ['IN_BED'] * 21
+    assert firebase_client.events == ['IN_BED']
+
+    state_machine.shutdown()
+    assert scheduler.pending_count() == 0
+    print("✅ Periodic jobs scheduled and cancelled on shutdown")
+
+
+class SlowFirebaseClient(RecordingFirebaseClient):
+    """Every call takes as long as a slow network round-trip"""
+
+    def write_alert(self, alert_type, confidence_score):
+        time.sleep(0.2)
+        super().write_alert(alert_type, confidence_score)
+
+    def write_event(self, event_type, duration_seconds, confidence_score, metadata=None):
+        time.sleep(0.2)
+        super().write_event(event_type, duration_seconds, confidence_score, metadata)
+
+
+def test_firebase_writes_outside_lock():
+    """process_prediction and get_current_state never wait for Firebase"""
+    scheduler = Scheduler(clock=ManualClock())
+    firebase_client = SlowFirebaseClient()
+    state_machine = ActivityStateMachine(firebase_client, scheduler=scheduler)
+
+    critical = {'state': 'FALL_DETECTED', 'confidence': 0.97, 'is_critical': True, 'raw_class': 1}
+    start = time.perf_counter()
+    for _ in range(3):
+        state_machine.process_prediction(critical)
+        state_machine.get_current_state()
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.05, f"state machine blocked for {elapsed:.3f}s"
+
+    state_machine.shutdown()
+    assert firebase_client.alerts == ['FALL_DETECTED'] * 3
+    assert firebase_client.events == ['FALL_DETECTED'] * 3
+    print(f"✅ State machine returned in {elapsed * 1000:.2f} ms while Firebase calls took 1.2 s")
+
+
+if __name__ == "__main__":
+    print("Scheduler Test")
+    print("=" * 40)
+    test_call_later_and_cancel()
+    test_call_every()
+    test_state_machine_debounce()
+    test_state_machine_periodic_jobs()
+    test_firebase_writes_outside_lock()
+    print("\n🎉 All scheduler tests passed!")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test coalescing of patientStatus updates
+"""
+
+import time
+from datetime import datetime
+from google.cloud import firestore
+from status_publisher import StatusPublisher
+
+
+def status(state, confidence, started=datetime(2024, 1, 1, 8, 0)):
+    return {
+        'currentState': state,
+        'stateStartTime': started,
+        'lastSeen': firestore.SERVER_TIMESTAMP,
+        'roomId': 'room-1',
+        'confidenceScore': confidence
+    }
+
+
+def test_state_changes_written_immediately():
+    """First update and every state change are written without waiting for the window"""
+    written = []
+    publisher = StatusPublisher(written.append, coalesce_window=60.0, liveness_interval=600.0)
+
+    publisher.publish(status('SITTING', 0.9))
+    assert publisher.flush(timeout=1.0)
+    publisher.publish(status('WALKING', 0.9, started=datetime(2024, 1, 1, 8, 5)))
+    assert publisher.flush(timeout=1.0)
+
+    assert [data['currentState'] for data in written] == ['SITTING', 'WALKING']
+    publisher.close()
+    print("✅ State changes written immediately")
+
+
+def test_redundant_updates_saved():
+    """Unchanged updates are skipped and confidence-only updates are coalesced"""
+    written = []
+    publisher = StatusPublisher(written.append, coalesce_window=0.2, liveness_interval=600.0)
+
+    publisher.publish(status('SITTING', 0.90))
+    publisher.flush(timeout=1.0)
+
+    # Periodic updates and heartbeats that only refresh lastSeen
+    for _ in range(5):
+        publisher.publish(status('SITTING', 0.91))
+        time.sleep(0.01)
+
+    # A burst of confidence changes inside one window: only the newest is written
+    for confidence in (0.70, 0.60, 0.50):
+        publisher.publish(status('SITTING', confidence))
+    time.sleep(0.4)
+    publisher.close()
+
+    assert [data['confidenceScore'] for data in written] == [0.90, 0.50], written
+    stats = publisher.get_stats()
+    assert stats['received'] == 9 and stats['written'] == 2
+    assert stats['saved'] == 7, stats
+    print(f"✅ Redundant updates saved: {stats}")
+
+
+def test_liveness_deadline():
+    """An unchanged update is still written once the liveness interval has passed"""
+    written = []
+    publisher = StatusPublisher(written.append, coalesce_window=0.0, liveness_interval=0.2)
+
+    publisher.publish(status('IN_BED', 0.95))
+    publisher.flush(timeout=1.0)
+    publisher.publish(status('IN_BED', 0.95))
+    publisher.flush(timeout=1.0)
+    time.sleep(0.25)
+    publisher.publish(status('IN_BED', 0.95))
+    publisher.close()
+
+    assert len(written) == 2, written
+    print("✅ Liveness deadline forces a write")
+
+
+if __name__ == "__main__":
+    print("Patient Status Coalescing Test")
+    print("=" * 40)
+    test_state_changes_written_immediately()
+    test_redundant_updates_saved()
+    test_liveness_deadline()
+    print("\n🎉 All status publisher tests passed!")
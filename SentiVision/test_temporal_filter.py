@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test temporal smoothing of model predictions
+"""
+
+import numpy as np
+from temporal_filter import TemporalFilter
+
+LABEL_MAPPING = {
+    0: "WALKING", 1: "FALL_DETECTED", 2: "IDLE", 3: "SITTING", 4: "SITTING",
+    5: "IN_BED", 6: "IN_BED", 7: "STANDING", 8: "STANDING", 9: "IDLE"
+}
+
+
+def one_hot(index, confidence=0.9):
+    """Probability vector with most mass on one raw class"""
+    probabilities = np.full(10, (1.0 - confidence) / 9)
+    probabilities[index] = confidence
+    return probabilities
+
+
+def run(temporal_filter, classes, interval, start=0.0):
+    """Feed one clip per class at a fixed interval; returns the emitted states"""
+    states = []
+    for step, index in enumerate(classes):
+        prediction = temporal_filter.update(one_hot(index), start + step * interval)
+        states.append(prediction['state'] if prediction else None)
+    return states
+
+
+def test_flicker_suppressed():
+    """Single stray clips do not change the held state"""
+    temporal_filter = TemporalFilter(LABEL_MAPPING, {1})
+    states = run(temporal_filter, [0, 0, 0, 4, 0, 0, 8, 0, 0], interval=0.5)
+    assert states == ['WALKING'] * 9, states
+    print("✅ Flicker suppressed")
+
+
+def test_transition_classes_aggregated():
+    """'sit_down' and 'sitting' clips together establish SITTING"""
+    temporal_filter = TemporalFilter(LABEL_MAPPING, {1}, enter_threshold=0.6)
+    mixed = np.zeros(10)
+    mixed[3], mixed[4], mixed[0] = 0.35, 0.35, 0.3
+    prediction = temporal_filter.update(mixed, 0.0)
+    assert prediction['state'] == 'SITTING'
+    assert abs(prediction['confidence'] - 0.7) < 1e-9
+    assert len(prediction['probabilities']) == 10
+    print("✅ Raw classes aggregated per state")
+
+
+def test_responsiveness_independent_of_rate():
+    """A real activity change is followed within a similar time at 10 Hz and at 1 Hz"""
+    switch_times = []
+    for interval in (0.1, 1.0):
+        temporal_filter = TemporalFilter(LABEL_MAPPING, {1}, time_constant=1.5)
+        steps = int(20 / interval)
+        states = run(temporal_filter, [0] * steps + [6] * steps, interval)
+        switch_step = states.index('IN_BED')
+        switch_times.append((switch_step - steps) * interval)
+
+    assert all(0 < seconds <= 3 for seconds in switch_times), switch_times
+    assert abs(switch_times[0] - switch_times[1]) <= 1.0, switch_times
+    print(f"✅ State follows a change after {switch_times[0]:.1f}s at 10 Hz and {switch_times[1]:.1f}s at 1 Hz")
+
+
+def test_critical_bypass():
+    """One confident fall clip is emitted immediately"""
+    temporal_filter = TemporalFilter(LABEL_MAPPING, {1})
+    run(temporal_filter, [0] * 10, interval=0.1)
+    prediction = temporal_filter.update(one_hot(1, 0.95), 1.0)
+    assert prediction['state'] == 'FALL_DETECTED' and prediction['is_critical']
+    assert prediction['confidence'] == 0.95
+    print("✅ Critical events bypass the filter")
+
+
+def test_no_state_until_confident():
+    """Nothing is emitted while no state reaches the enter threshold"""
+    temporal_filter = TemporalFilter(LABEL_MAPPING, {1})
+    assert temporal_filter.update(np.full(10, 0.1), 0.0) is None
+    print("✅ No state emitted before the enter threshold is reached")
+
+
+if __name__ == "__main__":
+    print("Temporal Filter Test")
+    print("=" * 40)
+    test_flicker_suppressed()
+    test_transition_classes_aggregated()
+    test_responsiveness_independent_of_rate()
+    test_critical_bypass()
+    test_no_state_until_confident()
+    print("\n🎉 All temporal filter tests passed!")
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Test the Firestore write-ahead log and offline replay
+
+Uses a fake Firestore client that can be switched offline, so no
+credentials or network access are needed.
+"""
+
+import os
+import time
+import tempfile
+import threading
+from datetime import datetime, timezone
+from google.api_core import exceptions as api_exceptions
+from google.cloud import firestore
+from write_ahead_log import WriteAheadLog
+from firestore_writer import FirestoreWriter
+
+
+class FakeDocument:
+    def __init__(self, collection, document_id):
+        self.collection = collection
+        self.id = document_id or f"auto-{id(self)}"
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, document_id=None):
+        return FakeDocument(self.name, document_id)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, doc_ref, data):
+        self.writes.append((doc_ref.collection, doc_ref.id, data))
+
+    def commit(self):
+        if self.db.commit_gate is not None:
+            self.db.commit_gate.wait()
+        if not self.db.online:
+            raise ConnectionError("Firestore unreachable")
+        for _, _, data in self.writes:
+            if data.get('number') in self.db.rejected_numbers:
+                raise api_exceptions.InvalidArgument(f"invalid event {data['number']}")
+        for collection, document_id, data in self.writes:
+            self.db.documents[(collection, document_id)] = data
+            self.db.commit_order.append(document_id)
+
+
+class FakeFirestore:
+    """Minimal stand-in for firestore.Client that can go offline or reject writes"""
+
+    def __init__(self):
+        self.online = True
+        self.rejected_numbers = set()  # Events with these numbers fail with InvalidArgument
+        self.commit_gate = None  # Event every commit waits for, to simulate a hanging round-trip
+        self.documents = {}
+        self.commit_order = []
+
+    def collection(self, name):
+        return FakeCollection(name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+def event(number):
+    return {
+        'type': 'add',
+        'collection': 'events',
+        'data': {'eventType': 'sitting', 'number': number, 'timestamp': firestore.SERVER_TIMESTAMP}
+    }
+
+
+def test_log_round_trip():
+    """Records keep order, sentinels and datetimes, and are removed once acknowledged"""
+    with tempfile.TemporaryDirectory() as directory:
+        log = WriteAheadLog(os.path.join(directory, 'wal', 'writes.sqlite3'), compact_threshold=2)
+        moment = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+        first = log.append({'type': 'set', 'collection': 'patientStatus', 'document': 'p1',
+                            'data': {'stateStartTime': moment, 'lastSeen': firestore.SERVER_TIMESTAMP}})
+        second = log.append(event(1))
+        alert = log.append(event(2), priority=True)
+
+        routine = log.pending(10, priority=False)
+        assert [record['id'] for record in routine] == [first, second]
+        assert routine[0]['operation']['data']['stateStartTime'] == moment
+        assert routine[0]['operation']['data']['lastSeen'] is firestore.SERVER_TIMESTAMP
+        assert routine[1]['operation']['document'], "add operations get a fixed document ID"
+        assert [record['id'] for record in log.pending(10, priority=True)] == [alert]
+
+        log.acknowledge([first, second])
+        assert log.pending_count() == 1
+        assert log.routine_stats() == (0, None)
+        log.close()
+
+        # The unacknowledged alert survives a restart
+        log = WriteAheadLog(os.path.join(directory, 'wal', 'writes.sqlite3'))
+        assert [record['id'] for record in log.pending(10, priority=True)] == [alert]
+        log.close()
+    print("✅ Write-ahead log round trip works")
+
+
+def test_offline_replay():
+    """Writes made while offline are kept on disk and replayed in order"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'writes.sqlite3')
+        db = FakeFirestore()
+        db.online = False
+
+        writer = FirestoreWriter(db, log=WriteAheadLog(path), batch_size=5, flush_interval=0.05,
+                                 retry_interval=0.05, max_retry_interval=0.1, stale_after=0.0)
+        futures = [writer.submit(event(number)) for number in range(12)]
+        time.sleep(0.3)
+        assert not writer.online
+        assert writer.pending_count() == 12
+        assert not any(future.done() for future in futures)
+
+        # Simulate a restart while still offline: the next writer replays the log
+        assert not writer.flush(timeout=0.2)
+        writer.close(timeout=0.1)
+        writer = FirestoreWriter(db, log=WriteAheadLog(path), batch_size=5, flush_interval=0.05,
+                                 retry_interval=0.05, max_retry_interval=0.1, stale_after=0.0)
+
+        db.online = True
+        assert writer.flush(timeout=5.0)
+        numbers = [db.documents[('events', document_id)]['number'] for document_id in db.commit_order]
+        assert numbers == list(range(12)), numbers
+        timestamps = [data['timestamp'] for data in db.documents.values()]
+        assert all(isinstance(timestamp, datetime) for timestamp in timestamps), \
+            "replayed writes keep their original time"
+        writer.close()
+    print("✅ Offline writes replayed in order after restart")
+
+
+def test_rejected_write_does_not_block():
+    """A write Firestore rejects is dead-lettered; the writes around it still commit"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'writes.sqlite3')
+        db = FakeFirestore()
+        db.rejected_numbers = {3}
+
+        writer = FirestoreWriter(db, log=WriteAheadLog(path), batch_size=10, flush_interval=0.05,
+                                 retry_interval=0.05, max_retry_interval=0.1)
+        futures = [writer.submit(event(number)) for number in range(6)]
+        assert writer.flush(timeout=5.0)
+        assert writer.pending_count() == 0 and writer.online
+
+        numbers = [db.documents[('events', document_id)]['number'] for document_id in db.commit_order]
+        assert numbers == [0, 1, 2, 4, 5], numbers
+        assert isinstance(futures[3].exception(timeout=1), api_exceptions.InvalidArgument)
+        assert all(futures[number].result(timeout=1) for number in (0, 1, 2, 4, 5))
+        assert writer.rejected_operations == 1
+        assert writer.failed_operations == 1, "only the rejected write counts as failed"
+
+        # Connection errors are still retried, not rejected
+        db.online = False
+        retried = writer.submit(event(6))
+        time.sleep(0.3)
+        assert not writer.online and not retried.done() and writer.pending_count() == 1
+        db.online = True
+        assert writer.flush(timeout=5.0) and retried.result(timeout=1)
+
+        dead_letters = writer.log.dead_letters()
+        writer.close()
+
+        # The rejected record is not replayed after a restart
+        log = WriteAheadLog(path)
+        assert log.pending_count() == 0
+        log.close()
+
+    assert [record['operation']['data']['number'] for record in dead_letters] == [3]
+    assert dead_letters[0]['error'].startswith('InvalidArgument')
+    print("✅ Rejected write moved to dead letters without blocking later writes")
+
+
+def test_close_during_commit():
+    """close() leaves the log open for a commit still waiting on Firestore"""
+    with tempfile.TemporaryDirectory() as directory:
+        db = FakeFirestore()
+        db.commit_gate = threading.Event()
+        writer = FirestoreWriter(db, log=WriteAheadLog(os.path.join(directory, 'writes.sqlite3')),
+                                 batch_size=1, flush_interval=0.01)
+        future = writer.submit(event(1))
+        time.sleep(0.1)  # The writer thread is now inside commit()
+
+        writer.close(timeout=0.1)
+        assert writer._thread.is_alive()
+
+        # The hanging commit returns and acknowledges through the still-open log
+        db.commit_gate.set()
+        assert future.result(timeout=5.0)
+        writer._thread.join(5.0)
+        assert not writer._thread.is_alive() and writer.pending_count() == 0
+        writer.log.close()
+    print("✅ Log kept open for a commit in flight at close")
+
+
+if __name__ == "__main__":
+    print("Firestore Write-Ahead Log Test")
+    print("=" * 40)
+    test_log_round_trip()
+    test_offline_replay()
+    test_rejected_write_does_not_block()
+    test_close_during_commit()
+    print("\n🎉 All write-ahead log tests passed!")
@@ -0,0 +1,294 @@
+"""
+Logs of pending Firestore operations for FirestoreWriter
+
+Every write FirebaseClient queues is appended to a log first; the writer
+reads pending records from the log in order, commits them, and only then
+acknowledges them. Records Firestore rejects outright (invalid data, denied
+permission) are rejected instead, so they cannot block the writes behind
+them. Two implementations share the same interface:
+
+- WriteAheadLog: durable SQLite file. Records survive connection outages and
+  restarts, so nothing is lost while the edge box is offline, and memory use
+  stays bounded no matter how long the outage lasts. Acknowledged records are
+  deleted in compaction passes; rejected records are moved to a dead_letters
+  table for inspection.
+- MemoryLog: in-process only, used when no WAL path is configured. Failed
+  and rejected writes are dropped instead of retried.
+
+Records are dicts with 'id', 'operation', 'priority' and 'created_at'.
+Operation data may contain Firestore SERVER_TIMESTAMP sentinels and
+datetimes; both are preserved through the JSON encoding used on disk.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import secrets
+import string
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from google.cloud import firestore
+
+
+_DOCUMENT_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def new_document_id():
+    """Random 20-character ID in the same format as Firestore auto IDs"""
+    return ''.join(secrets.choice(_DOCUMENT_ID_ALPHABET) for _ in range(20))
+
+
+def _encode_value(value):
+    """json.dumps default hook for Firestore sentinels and datetimes"""
+    if value is firestore.SERVER_TIMESTAMP:
+        return {'__firestore__': 'SERVER_TIMESTAMP'}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in the write-ahead log")
+
+
+def _decode_object(obj):
+    """json.loads object hook reversing _encode_value"""
+    if obj.get('__firestore__') == 'SERVER_TIMESTAMP':
+        return firestore.SERVER_TIMESTAMP
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+def encode_operation(operation):
+    """Serialize an operation dict to JSON"""
+    return json.dumps(operation, default=_encode_value)
+
+
+def decode_operation(text):
+    """Deserialize an operation dict from JSON"""
+    return json.loads(text, object_hook=_decode_object)
+
+
+def _with_document_id(operation):
+    """Give 'add' operations a fixed document ID so replaying them is idempotent"""
+    if operation['type'] == 'add' and not operation.get('document'):
+        operation = dict(operation, document=new_document_id())
+    return operation
+
+
+class MemoryLog:
+    """Non-durable, in-memory log of pending operations"""
+
+    durable = False
+
+    def __init__(self):
+        self._records = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def append(self, operation, priority=False):
+        """Add an operation and return its record ID"""
+        with self._lock:
+            record_id = self._next_id
+            self._next_id += 1
+            self._records[record_id] = {
+                'id': record_id,
+                'operation': _with_document_id(operation),
+                'priority': priority,
+                'created_at': time.time()
+            }
+            return record_id
+
+    def pending(self, limit, priority):
+        """Oldest unacknowledged records of the given lane, in append order"""
+        with self._lock:
+            records = [record for record in self._records.values() if record['priority'] == priority]
+            return records[:limit]
+
+    def routine_stats(self):
+        """(count, oldest created_at) of unacknowledged routine records"""
+        with self._lock:
+            routine = [record for record in self._records.values() if not record['priority']]
+            if not routine:
+                return 0, None
+            return len(routine), routine[0]['created_at']
+
+    def pending_count(self):
+        """Number of unacknowledged records"""
+        with self._lock:
+            return len(self._records)
+
+    def acknowledge(self, record_ids):
+        """Remove committed (or abandoned) records"""
+        with self._lock:
+            for record_id in record_ids:
+                self._records.pop(record_id, None)
+
+    def reject(self, record_ids, error):
+        """Remove records Firestore will never accept"""
+        self.acknowledge(record_ids)
+
+    def close(self):
+        """Nothing to release for the in-memory log"""
+        pass
+
+
+class WriteAheadLog:
+    """Durable SQLite log of pending Firestore operations"""
+
+    durable = True
+
+    def __init__(self, path, compact_threshold=500):
+        """
+        Args:
+            path: SQLite file; created (with parent directories) if missing
+            compact_threshold: Delete acknowledged records once this many accumulate
+        """
+        self.path = path
+        self.compact_threshold = compact_threshold
+        self._acknowledged_since_compaction = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")  # An appended write survives power loss
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS operations ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " operation TEXT NOT NULL,"
+            " priority INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " acknowledged INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pending_operations"
+            " ON operations (acknowledged, priority, id)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            " id INTEGER PRIMARY KEY,"
+            " operation TEXT NOT NULL,"
+            " priority INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " rejected_at REAL NOT NULL,"
+            " error TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+        # Leftovers from a previous run are compacted right away
+        self.compact()
+
+    def append(self, operation, priority=False):
+        """Durably add an operation and return its record ID"""
+        text = encode_operation(_with_document_id(operation))
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO operations (operation, priority, created_at) VALUES (?, ?, ?)",
+                (text, int(priority), time.time())
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def pending(self, limit, priority):
+        """Oldest unacknowledged records of the given lane, in append order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, operation, priority, created_at FROM operations"
+                " WHERE acknowledged = 0 AND priority = ? ORDER BY id LIMIT ?",
+                (int(priority), limit)
+            ).fetchall()
+
+        return [
+            {
+                'id': record_id,
+                'operation': decode_operation(text),
+                'priority': bool(record_priority),
+                'created_at': created_at
+            }
+            for record_id, text, record_priority, created_at in rows
+        ]
+
+    def routine_stats(self):
+        """(count, oldest created_at) of unacknowledged routine records"""
+        with self._lock:
+            count, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM operations"
+                " WHERE acknowledged = 0 AND priority = 0"
+            ).fetchone()
+        return count, oldest
+
+    def pending_count(self):
+        """Number of unacknowledged records"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM operations WHERE acknowledged = 0"
+            ).fetchone()[0]
+
+    def acknowledge(self, record_ids):
+        """Mark committed records; compacts once enough have accumulated"""
+        if not record_ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE operations SET acknowledged = 1 WHERE id = ?",
+                [(record_id,) for record_id in record_ids]
+            )
+            self._conn.commit()
+            self._acknowledged_since_compaction += len(record_ids)
+            should_compact = self._acknowledged_since_compaction >= self.compact_threshold
+
+        if should_compact:
+            self.compact()
+
+    def reject(self, record_ids, error):
+        """Move records Firestore will never accept to the dead_letters table"""
+        if not record_ids:
+            return
+        rejected_at = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dead_letters (id, operation, priority, created_at, rejected_at, error)"
+                " SELECT id, operation, priority, created_at, ?, ? FROM operations WHERE id = ?",
+                [(rejected_at, str(error), record_id) for record_id in record_ids]
+            )
+            self._conn.executemany(
+                "UPDATE operations SET acknowledged = 1 WHERE id = ?",
+                [(record_id,) for record_id in record_ids]
+            )
+            self._conn.commit()
+            self._acknowledged_since_compaction += len(record_ids)
+
+    def dead_letters(self):
+        """Rejected records, oldest first, with their 'error' and 'rejected_at'"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, operation, priority, created_at, rejected_at, error FROM dead_letters ORDER BY id"
+            ).fetchall()
+        return [
+            {
+                'id': record_id,
+                'operation': decode_operation(text),
+                'priority': bool(priority),
+                'created_at': created_at,
+                'rejected_at': rejected_at,
+                'error': error
+            }
+            for record_id, text, priority, created_at, rejected_at, error in rows
+        ]
+
+    def compact(self):
+        """Delete acknowledged records and return their pages to the filesystem"""
+        with self._lock:
+            self._conn.execute("DELETE FROM operations WHERE acknowledged = 1")
+            self._conn.commit()
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._acknowledged_since_compaction = 0
+
+    def close(self):
+        """Compact and close the database"""
+        self.compact()
+        with self._lock:
+            self._conn.close()